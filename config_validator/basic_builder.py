@@ -45,9 +45,36 @@ class RulesBuilder(BaseBuilder):
         rule_id = len(self._rules_list) - 1
         return rule_id
 
+    def add_alternative(self, parent_id, build_alternative):
+        """Adds an alternative to the meta rule. 'build_alternative()'
+        returns the rule of the alternative, it is called only when the meta
+        rule tries the alternative. Returns False, if the rule can not build
+        alternatives on demand, then the alternative should be built and
+        added as usual."""
+        add_alternative = getattr(self._rules_list[parent_id],
+                                  'add_alternative', None)
+        if add_alternative is None:
+            return False
+        add_alternative(build_alternative)
+        return True
+
     def clean(self):
         self._rules_list = []
 
+    def suspend(self):
+        """Sets aside rules of the tree being built and returns them, so
+        the builder builds another tree as a fresh one. 'resume()' brings
+        them back. Alternatives of meta rules are built this way, because
+        a rules tree may be validated while the builder builds another
+        one."""
+        rules_list = self._rules_list
+        self._rules_list = []
+        return rules_list
+
+    def resume(self, rules_list):
+        """Brings back rules, set aside by 'suspend()'."""
+        self._rules_list = rules_list
+
     def get_product(self):
         if len(self._rules_list) > 0:
             product = self._rules_list[0]
@@ -116,6 +143,25 @@ class BasicRulesBuilderMixIn(RulesBuilderMixIn):
         rule = basic_rules.MetaNode(value, path)
         return self._add_new_rule(rule, parent_id)
 
+    def build_cycle(self, value, parent_id, ancestor_path, path=''):
+        rule = basic_rules.CycleNode(value, path, ancestor_path)
+        return self._add_new_rule(rule, parent_id)
+
+    def build_shared(self, value, parent_id, rule_id, owner_id, path=''):
+        """Builds a rule for one more place of the value, that is validated
+        by the rule 'rule_id' (a child of the rule 'owner_id'). Each place
+        gets a SharedNode of that rule. Returns None, if the rule can not
+        be shared."""
+        if owner_id is None:
+            return None
+        owner = self._rules_list[owner_id]
+        share_child = getattr(owner, 'share_child', None)
+        first_node = share_child and share_child(self._rules_list[rule_id])
+        if first_node is None:
+            return None
+        rule = basic_rules.SharedNode(value, path, first_node.shared)
+        return self._add_new_rule(rule, parent_id)
+
 
 class BasicRulesBuilder(RulesBuilder, BasicRulesBuilderMixIn):
 
@@ -8,7 +8,39 @@
 # Here we introduce the 'Director' class.
 
 
+from collections import deque
+from functools import partial
+
 import basic_director_handlers
+from compiled_rules import ValidationResult
+from config_paths import render_path
+
+
+# Orders of rules definitions handling. Breadth-first order handles
+# definitions level by level. Depth-first order handles each definition with
+# all of its nested definitions before the next one, i.e. in document order.
+BFS_ORDER = 'bfs'
+DFS_ORDER = 'dfs'
+
+
+def _value_key(message):
+    """Returns the key of container value (dictionary or list) of the
+    message and its rule definition, they are identified by their ids.
+    Returns None for the rest of values."""
+    value = message['value']
+    if isinstance(value, (dict, list)):
+        return id(value), id(message['rule_definition'])
+    return None
+
+
+def _find_ancestor_path(path, paths):
+    """Returns the first of parent paths of the path, that is in 'paths'
+    (a dictionary of paths by their ids), or None."""
+    while not isinstance(path, basestring):
+        path = path[0]
+        if id(path) in paths:
+            return path
+    return None
 
 
 class BaseDirector(object):
@@ -22,6 +54,10 @@ class BaseDirector(object):
         self._rules_scheme = rules_scheme
         self._builder = builder
 
+    @property
+    def rules_scheme(self):
+        return self._rules_scheme
+
     def build_rules_tree(self, value):
         """This is the main method of the director class. It should return
         config validator callable
@@ -44,12 +80,20 @@ class HandledDirector(BaseDirector):
     in the chain to construct the validator callable.
     It is a basic class and it's chain has no handlers.
     Should not be used directly. Define your own set of handlers and
-    add them to the chain in a subclass of HandledDirector."""
+    add them to the chain in a subclass of HandledDirector.
+    'traversal_order' (BFS_ORDER or DFS_ORDER) sets the order of handling
+    nested rules definitions."""
+
+    traversal_order = BFS_ORDER
 
     def __init__(self, rules_scheme, builder):
         super(HandledDirector, self).__init__(rules_scheme, builder)
         self._head_handler = None
         self._tail_handler = None
+        self._handlers_registry = {}
+        # ids of rules definitions -> (rule definition, True if it is
+        # checked, see '_is_checked_definition()')
+        self._checked_definitions = {}
 
     def push_handler(self, handler):
         if self._head_handler is None:
@@ -58,6 +102,7 @@ class HandledDirector(BaseDirector):
         else:
             handler.next_handler = self._head_handler
             self._head_handler = handler
+        self._update_handlers_registry()
 
     def append_handler(self, handler):
         if self._tail_handler is None:
@@ -66,6 +111,7 @@ class HandledDirector(BaseDirector):
         else:
             self._tail_handler.next_handler = handler
             self._tail_handler = handler
+        self._update_handlers_registry()
 
     def pop_handler(self):
         if self._tail_handler is None:
@@ -74,6 +120,7 @@ class HandledDirector(BaseDirector):
             handler = self._tail_handler
             self._head_handler = None
             self._tail_handler = None
+            self._update_handlers_registry()
             return handler
         else:
             handler = self._head_handler
@@ -83,7 +130,9 @@ class HandledDirector(BaseDirector):
                     handler = self._tail_handler
                     self._tail_handler = new_tail_handler
                     self._tail_handler.next_handler = None
+                    self._update_handlers_registry()
                     return handler
+                handler = handler.next_handler
 
     def shift_handler(self):
         if self._head_handler is None:
@@ -92,41 +141,413 @@ class HandledDirector(BaseDirector):
             handler = self._head_handler
             self._head_handler = None
             self._tail_handler = None
+            self._update_handlers_registry()
             return handler
         else:
             handler = self._head_handler
             self._head_handler = self._head_handler.next_handler
+            self._update_handlers_registry()
             return handler
 
+    def _update_handlers_registry(self):
+        """Maps each rule type to the first handler in the chain,
+        that declares it in 'rule_types'. Handlers closer to the head of
+        the chain have priority, just like in the chain itself.
+        A handler without 'rule_types' may take any rule definition, so
+        types of handlers after it are not registered: their messages
+        are passed through the chain. Checked definitions are checked
+        again with the new handlers."""
+        self._handlers_registry = {}
+        handler = self._head_handler
+        while handler is not None:
+            if not handler.rule_types:
+                break
+            for rule_type in handler.rule_types:
+                self._handlers_registry.setdefault(rule_type, handler)
+            if handler is self._tail_handler:
+                break
+            handler = handler.next_handler
+        self._checked_definitions = {}
+
+    def _find_handler(self, message):
+        """Returns the registered handler for the message's rule definition
+        or None, if the message should be passed through the chain."""
+        rule_definition = message['rule_definition']
+        if isinstance(rule_definition, dict):
+            rule_type = rule_definition.get('type')
+            if isinstance(rule_type, basestring):
+                return self._handlers_registry.get(rule_type)
+        elif isinstance(rule_definition, list):
+            return self._handlers_registry.get(
+                basic_director_handlers.META_RULE)
+        return None
+
     def build_rules_tree(self, value):
+        return self.build_rules_subtree(self._rules_scheme, value, '')
+
+    def build_rules_subtree(self, rule_definition, value, path,
+                            parents=()):
+        """Builds the rules tree of a part of config: the value at the path
+        (see 'config_paths'), with its rule definition. 'parents' are
+        (rule definition, value, path) of places of parent values, so
+        values, that contain their parents, are found (see
+        '_handle_value_message()')."""
         self._builder.clean()
 
-        root_message = {
-            'rule_definition': self._rules_scheme,
-            'parent_rule_id': None,
-            'value': value,
-            'path': ''
-        }
+        root_message = basic_director_handlers.RuleMessage(
+            rule_definition, None, value, path)
+
+        values_paths = {}
+        for parent_definition, parent_value, parent_path in parents:
+            if isinstance(parent_value, (dict, list)):
+                values_paths[(id(parent_value), id(parent_definition))] = \
+                    parent_path
+        self._handle_messages(root_message, values_paths)
+
+        return self._builder.get_product()
+
+    def nested_definition(self, rule_definition, key):
+        """Returns the rule definition of the nested value 'key' of values
+        of the rule definition, or None, if it has no rule (see
+        'RuleParseHandler.nested_definition()'). Raises
+        NotImplementedError, if its handler can not tell it."""
+        handler = self._find_handler(basic_director_handlers.RuleMessage(
+            rule_definition, None, None, ''))
+        if handler is None:
+            raise NotImplementedError()
+        return handler.nested_definition(rule_definition, key)
+
+    def is_valid(self, value):
+        """Returns 'ok' for the value without error messages. Rules tree is
+        still built for the value, prefer compiled schemas for yes/no
+        checks."""
+        rules = self.build_rules_tree(value)
+        return rules is not None and rules.is_valid()
+
+    def validate_rules_tree(self, value, max_errors=None):
+        """Single pass validation: each rule is built and validated when
+        the director reaches its value, and rules of valid values are
+        discarded right away, so the whole rules tree is never kept in
+        memory. Rules must implement 'check_value()' and 'check_nested()'.
+        Returns the list of error messages, like 'get_all_errors()' of the
+        root rule: None, if the value is valid. See 'validate()' for
+        'max_errors'.
+        Containers, that are referenced from several places of config, are
+        validated once, if they are valid, and containers, that contain
+        themselves, are reported (see '_handle_value_message()').
+        Raises ValueError on the first bad rule definition."""
+        return self.validate(value, max_errors).get_all_errors()
+
+    def validate(self, value, max_errors=None):
+        """Validates the value in a single pass (see
+        'validate_rules_tree()') and returns ValidationResult, like
+        compiled schemas do. If 'max_errors' is given, validation stops as
+        soon as there are more errors, than 'max_errors', and the result is
+        marked as truncated. An alternative of meta rule, that has more
+        errors, is just not valid, like with compiled schemas."""
+        root_message = basic_director_handlers.RuleMessage(
+            self._rules_scheme, None, value, '')
+
+        errors = []
+        # frames of rules, that wait for their nested rules:
+        # (rule, nested messages iterator, nested results, index of the
+        # first error of nested rules, key of the value)
+        stack = []
+        message = root_message
+        # paths of containers of rules on the stack and containers, that
+        # are valid, by their keys (see '_value_key()')
+        active_paths = {}
+        valid_keys = set()
+        memoize = hasattr(self._builder, 'build_cycle')
+        is_valid = False
+        truncated = False
+
+        try:
+            while True:
+                if message is not None:
+                    key = _value_key(message) if memoize else None
+                    if key in valid_keys:
+                        # the same value is valid at another place
+                        stack[-1][2].append(True)
+                    else:
+                        rule, new_messages = self._build_detached_rule(
+                            message, active_paths.get(key))
+                        if rule.check_value():
+                            stack.append((rule, iter(new_messages), [],
+                                          len(errors), key))
+                            if key is not None:
+                                active_paths[key] = message['path']
+                        else:
+                            errors.extend(rule.errors)
+                            if not stack:
+                                break
+                            stack[-1][2].append(False)
+
+                if (max_errors is not None and len(errors) > max_errors
+                        and self._cut_errors(stack, errors, active_paths,
+                                             max_errors)):
+                    truncated = True
+                    break
+
+                rule, messages, valid_children, first_error, key = stack[-1]
+                if (valid_children and valid_children[-1]
+                        and getattr(rule, '_deciding_result', False)):
+                    # a valid alternative decides the result of meta rule
+                    message = None
+                else:
+                    message = next(messages, None)
+                if message is not None:
+                    continue
+
+                stack.pop()
+                is_valid = rule.check_nested(valid_children)
+                if is_valid:
+                    # errors of alternatives of valid meta rules
+                    del errors[first_error:]
+                else:
+                    errors[first_error:first_error] = rule.errors
+                if key is not None:
+                    del active_paths[key]
+                    if is_valid:
+                        valid_keys.add(key)
+                if not stack:
+                    break
+                stack[-1][2].append(is_valid)
+        finally:
+            self._builder.clean()
+
+        if max_errors is not None and len(errors) > max_errors:
+            truncated = True
+            del errors[max_errors:]
+        return ValidationResult(is_valid and not truncated, errors, truncated)
+
+    def _cut_errors(self, stack, errors, active_paths, max_errors):
+        """Errors of single pass validation are over the budget. If there
+        is no meta rule on the stack, errors are final: rules on the stack
+        are closed as not valid and True is returned to stop validation.
+        Otherwise errors may be errors of an alternative, that is not
+        chosen: if the current alternative of the nearest meta rule has
+        more errors, than the budget, it is closed as not valid."""
+        depth = len(stack) - 1
+        while depth >= 0 and not getattr(stack[depth][0], '_deciding_result',
+                                         False):
+            depth -= 1
+        if depth >= 0 and (len(stack) == depth + 1
+                           or len(errors) - stack[depth + 1][3]
+                           <= max_errors):
+            return False
+
+        while len(stack) > depth + 1:
+            # the last of nested rules of the rule is not valid
+            rule, _, valid_children, first_error, key = stack.pop()
+            rule.check_nested(valid_children)
+            errors[first_error:first_error] = rule.errors
+            if key is not None:
+                del active_paths[key]
+            if stack:
+                stack[-1][2].append(False)
+        return depth < 0
+
+    def _build_detached_rule(self, message, ancestor_path=None):
+        """Builds the rule of the message alone, without its parent rule.
+        The builder is cleaned before, so it keeps only this rule.
+        If the value of the message is the same object as the value at
+        'ancestor_path' (with the same rule definition), a cycle rule is
+        built instead."""
+        self._builder.clean()
+        message['parent_rule_id'] = None
+
+        if ancestor_path is not None:
+            rule_id = self._builder.build_cycle(
+                message['value'], None, ancestor_path, message['path'])
+            new_messages = []
+        else:
+            rule_id, new_messages = self._handle_message_lazily(message)
+
+        if rule_id is None:
+            raise ValueError('Got bad rule definition in rules scheme at %s.'
+                             % (render_path(message['path']) or '/'))
+
+        return self._builder.get_product(), new_messages
+
+    def _handle_messages(self, root_message, values_paths=None):
+        """Passes the root message and all the messages produced while
+        handling it to the handlers. Messages with registered rule types
+        go straight to their handlers, the rest go through the chain.
+        Alternatives of meta rules are given to the builder, if it can
+        build them on demand (see '_defer_alternatives()').
+        If 'values_paths' is given, messages of containers are handled by
+        '_handle_value_message()', it keeps paths of containers of
+        the whole rules tree.
+        Raises ValueError if some rules definitions could not be parsed."""
+        if self.traversal_order == BFS_ORDER:
+            messages = deque([root_message])
+            next_message = messages.popleft
+        elif self.traversal_order == DFS_ORDER:
+            messages = [root_message]
+            next_message = messages.pop
+        else:
+            raise ValueError('Unknown traversal order: %r.'
+                             % (self.traversal_order,))
 
-        messages_queue = [root_message]
         bad_messages = []
+        add_alternative = getattr(self._builder, 'add_alternative', None)
+        if not (hasattr(self._builder, 'build_shared')
+                and hasattr(self._builder, 'build_cycle')):
+            values_paths = None
+        values_rules = {}
 
-        while len(messages_queue) > 0:
-            message = messages_queue.pop(0)
-            rule_id, new_messages = self._head_handler.handle_message(message)
+        while messages:
+            message = next_message()
+            if (values_paths is not None
+                    and isinstance(message.get('value'), (dict, list))):
+                rule_id, new_messages = self._handle_value_message(
+                    message, values_paths, values_rules)
+            else:
+                rule_id, new_messages = self._handle_message(message)
 
             if rule_id is None:
                 # 'Oups! Non-parseble rule definition!'
                 bad_messages.append(message)
+            elif add_alternative is not None and new_messages:
+                new_messages = self._defer_alternatives(new_messages,
+                                                        values_paths)
 
-            messages_queue.extend(new_messages)
+            if self.traversal_order == DFS_ORDER:
+                # the stack pops the first of new messages first
+                messages.extend(reversed(new_messages))
+            else:
+                messages.extend(new_messages)
 
         if len(bad_messages) > 0:
             error_msg = ('Got %d bad rules definitions in rules scheme.'
                          % len(bad_messages))
             raise ValueError(error_msg)
 
-        return self._builder.get_product()
+    def _handle_message(self, message):
+        """Builds the rule of the message with its handler. Returns the rule
+        id (None for bad definition) and nested messages."""
+        handler = self._find_handler(message)
+        if handler is not None:
+            return handler.build_rule(message)
+        return self._head_handler.handle_message(message)
+
+    def _handle_message_lazily(self, message):
+        """Like '_handle_message()', but nested messages may be an iterator
+        (see 'RuleParseHandler.build_rule_lazily()')."""
+        handler = self._find_handler(message)
+        if handler is not None:
+            return handler.build_rule_lazily(message)
+        return self._head_handler.handle_message(message)
+
+    def _handle_value_message(self, message, values_paths, values_rules):
+        """Handles the message of container value (dictionary or list)
+        like '_handle_message()', but containers, that are referenced from
+        several places of config (like YAML aliases), are validated once:
+        the rest of places share the rule of the first one. A container,
+        that contains itself, gets a cycle rule instead of endless nested
+        rules. Containers are identified by ids of the value and the rule
+        definition (see '_value_key()'). 'values_paths' keeps paths of
+        places of each container (the path of the only place or
+        a dictionary of paths by their ids), 'values_rules' keeps ids of
+        their rules and parent rules, built by the current builder."""
+        value = message['value']
+        key = (id(value), id(message['rule_definition']))
+        path = message['path']
+        paths = values_paths.setdefault(key, path)
+        if paths is path:
+            # the first place of the container, most of containers have
+            # only one place
+            rule_id, new_messages = self._handle_message(message)
+            if rule_id is not None:
+                values_rules[key] = (rule_id, message['parent_rule_id'])
+            return rule_id, new_messages
+
+        if type(paths) is not dict:
+            paths = values_paths[key] = {id(paths): paths}
+        ancestor_path = _find_ancestor_path(path, paths)
+        if ancestor_path is not None:
+            return self._builder.build_cycle(
+                value, message['parent_rule_id'], ancestor_path, path), []
+        paths[id(path)] = path
+
+        if key in values_rules:
+            rule_id, owner_id = values_rules[key]
+            shared_id = self._builder.build_shared(
+                value, message['parent_rule_id'], rule_id, owner_id, path)
+            if shared_id is not None:
+                return shared_id, []
+
+        rule_id, new_messages = self._handle_message(message)
+        if rule_id is not None and key not in values_rules:
+            values_rules[key] = (rule_id, message['parent_rule_id'])
+        return rule_id, new_messages
+
+    def _is_checked_definition(self, rule_definition):
+        """Returns True, if the rule definition and all of its nested
+        definitions have registered handlers, that tell their nested
+        definitions (see 'RuleParseHandler.nested_definitions()'). Rules of
+        such definitions are always built, whatever the value is."""
+        entry = self._checked_definitions.get(id(rule_definition))
+        if entry is not None and entry[0] is rule_definition:
+            return entry[1]
+
+        is_checked = True
+        definitions = [rule_definition]
+        seen = set()
+        while definitions and is_checked:
+            definition = definitions.pop()
+            if id(definition) in seen:
+                # recursive rules schemes
+                continue
+            seen.add(id(definition))
+            handler = self._find_handler(basic_director_handlers.RuleMessage(
+                definition, None, None, ''))
+            if handler is None:
+                is_checked = False
+                continue
+            try:
+                definitions.extend(handler.nested_definitions(definition))
+            except NotImplementedError:
+                is_checked = False
+        self._checked_definitions[id(rule_definition)] = (rule_definition,
+                                                          is_checked)
+        return is_checked
+
+    def _defer_alternatives(self, new_messages, values_paths=None):
+        """Gives alternatives messages to the builder to be built only when
+        their meta rules try them. Returns the rest of messages.
+        Only alternatives with checked definitions are deferred (see
+        '_is_checked_definition()'), so bad definitions of alternatives
+        and their nested values are still found by 'build_rules_tree()'
+        and never by 'validate()' of the rules tree."""
+        rest_messages = []
+        for message in new_messages:
+            if not (isinstance(message,
+                               basic_director_handlers.AlternativeMessage)
+                    and self._is_checked_definition(
+                        message['rule_definition'])
+                    and self._builder.add_alternative(
+                        message['parent_rule_id'],
+                        partial(self._build_alternative, message,
+                                values_paths))):
+                rest_messages.append(message)
+        return rest_messages
+
+    def _build_alternative(self, message, values_paths=None):
+        """Builds rules of the alternative, when its meta rule tries it.
+        The rules tree may be validated while the builder builds another
+        tree, so the rules of that tree are set aside (see
+        'RulesBuilder.suspend()') and the alternative is built by
+        the fresh builder."""
+        builder = self._builder
+        rules_list = builder.suspend()
+        message['parent_rule_id'] = None
+        try:
+            self._handle_messages(message, values_paths)
+            return builder.get_product()
+        finally:
+            builder.resume(rules_list)
 
 
 class BasicRulesDirector(HandledDirector):
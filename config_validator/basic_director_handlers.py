@@ -5,12 +5,81 @@
 # the OOP pattern 'Chain Of Responsibility'.
 # This file contains implementations of basic rules definition parsers -
 # chain messages handlers.
+# Handlers also declare the rules types they handle ('rule_types'), so that
+# the director can dispatch a message straight to its handler by the type
+# and call 'build_rule()' without walking the chain.
+
+
+from config_paths import ITEM, ALTERNATIVE
+
+
+# Key of meta rules (rules definitions, that are lists) in 'rule_types'.
+META_RULE = list
+
+
+class Message(object):
+    """Base class for messages of the handlers chain. Messages are compact
+    records with attributes, but they also support 'message[key]' access,
+    so handlers can treat them (and plain dictionaries) alike."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % (key, getattr(self, key))
+                                     for key in self.__slots__))
+
+
+class RuleMessage(Message):
+    """Message with a rule definition to parse for the value at the path.
+    Paths are linked to the paths of parent values (see 'config_paths'),
+    the root path is ''."""
+
+    __slots__ = ('rule_definition', 'parent_rule_id', 'value', 'path')
+
+    def __init__(self, rule_definition, parent_rule_id, value, path):
+        self.rule_definition = rule_definition
+        self.parent_rule_id = parent_rule_id
+        self.value = value
+        self.path = path
+
+
+class AlternativeMessage(RuleMessage):
+    """Message with a rule definition of an alternative of the meta rule
+    (the parent rule). Director may build the rule of the alternative
+    only when the meta rule tries it (see 'RulesBuilder.add_alternative()'),
+    so alternatives, that are never tried, are never built."""
+
+    __slots__ = ()
 
 
 class RuleParseHandler(object):
     """Base rule definition parser class. It is condfigured with builder via
     a constructor argument. And it also can have a 'next' handler
-    in the 'chain of responsibility'. It has a base 'handle_message' method."""
+    in the 'chain of responsibility'. It has a base 'handle_message' method.
+    Subclasses may list the values of 'type' of rules definitions they
+    handle in 'rule_types' (META_RULE for meta rules) and implement
+    'build_rule()' to be registered in the director's dispatch registry."""
+
+    rule_types = ()
 
     def __init__(self, builder):
         self.builder = builder
@@ -28,71 +97,120 @@ class RuleParseHandler(object):
         else:
             return None, []
 
+    def build_rule(self, message):
+        """Handles the message, that is known to have a rule definition of
+        one of 'rule_types'. Returns rule_id and a list of new messages."""
+        raise NotImplementedError()
+
+    def build_rule_lazily(self, message):
+        """Like 'build_rule()', but new messages may be an iterator, that
+        makes them one at a time. Single pass validation uses it to keep
+        only a cursor over items of each container, instead of messages
+        for all of items."""
+        return self.build_rule(message)
+
+    def nested_definition(self, rule_definition, key):
+        """Returns the rule definition of the nested value 'key' (a key of
+        dictionary or an index of list) of values of the rule definition,
+        or None, if the nested value has no rule. Raises
+        NotImplementedError, if nested values do not have rules of their
+        own (like alternatives of meta rules)."""
+        raise NotImplementedError()
+
+    def nested_definitions(self, rule_definition):
+        """Returns a list of all rules definitions of nested values of
+        values of the rule definition (and of alternatives of meta rules),
+        so rules schemes are checked without values. Raises
+        NotImplementedError, if the handler can not tell them."""
+        raise NotImplementedError()
+
 
 class SimpleRuleParseHandler(RuleParseHandler):
     """Rules definitions parser for simple rules types.
     These rules definition do not contain nested definitions,
-    and use simple builder's methods, that have the same arguments list."""
+    and use simple builder's methods, that have the same arguments list.
+    Builder methods are resolved once, in the constructor."""
+
+    simple_rule_types = ('integer', 'string', 'not_empty_string',
+                         'string_of_unsigned_integers', 'boolean')
+
+    def __init__(self, builder):
+        super(SimpleRuleParseHandler, self).__init__(builder)
+        self._build_methods = {}
+        for rule_type in self.simple_rule_types:
+            build_method = getattr(self.builder, 'build_' + rule_type, None)
+            if build_method and callable(build_method):
+                self._build_methods[rule_type] = build_method
+        self.rule_types = tuple(self._build_methods)
 
     def handle_message(self, message):
         if (isinstance(message['rule_definition'], dict)
-                and 'type' in message['rule_definition']):
-
-            rule_type = message['rule_definition']['type']
-            if rule_type in ('integer', 'string', 'not_empty_string',
-                             'string_of_unsigned_integers', 'boolean'):
-                build_method = getattr(self.builder, 'build_' + rule_type)
-                if build_method and callable(build_method):
-                    rule_id = build_method(message['value'],
-                                           message['parent_rule_id'],
-                                           message['path'] if message['path'] else '/')
-                    return rule_id, []
+                and message['rule_definition'].get('type')
+                in self.rule_types):
+            return self.build_rule(message)
 
         return super(SimpleRuleParseHandler, self).handle_message(message)
 
+    def build_rule(self, message):
+        build_method = self._build_methods[message['rule_definition']['type']]
+        rule_id = build_method(message['value'],
+                               message['parent_rule_id'],
+                               message['path'] if message['path'] else '/')
+        return rule_id, []
+
+    def nested_definitions(self, rule_definition):
+        return []
+
 
 class ListRuleParseHandler(RuleParseHandler):
     """Rule definition parser, that recognizes definition of validation rules
      for values of the 'list' type.
      List value rule's definition may contain nested rules definitions."""
 
+    rule_types = ('list',)
+
     def handle_message(self, message):
         if (isinstance(message['rule_definition'], dict)
                 and 'type' in message['rule_definition']
                 and message['rule_definition']['type'] == 'list'):
+            return self.build_rule(message)
 
-            rule_id = self.builder.build_list(
-                message['value'],
-                message['parent_rule_id'],
-                min_length=message['rule_definition'].get('min_length'),
-                max_length=message['rule_definition'].get('max_length'),
-                path=message['path'] if message['path'] else '/'
-            )
+        return super(ListRuleParseHandler, self).handle_message(message)
 
-            new_messages = []
+    def build_rule(self, message):
+        rule_id, new_messages = self.build_rule_lazily(message)
+        return rule_id, list(new_messages)
 
-            if isinstance(message['value'], list):
-                inner_index = 0
+    def build_rule_lazily(self, message):
+        rule_id = self.builder.build_list(
+            message['value'],
+            message['parent_rule_id'],
+            min_length=message['rule_definition'].get('min_length'),
+            max_length=message['rule_definition'].get('max_length'),
+            path=message['path'] if message['path'] else '/'
+        )
 
-                for inner_value in message['value']:
+        inner_rule_definition = message['rule_definition'].get('allowed')
 
-                    newpath = message['path'] + "/" + str(inner_index)
+        if (isinstance(message['value'], list)
+                and inner_rule_definition is not None):
+            return rule_id, self._nested_messages(
+                inner_rule_definition, rule_id, message['value'],
+                message['path'])
 
-                    inner_rule_definition = message['rule_definition']\
-                        .get('allowed')
+        return rule_id, []
 
-                    if inner_rule_definition is not None:
-                        new_messages.append({
-                            'value': inner_value,
-                            'rule_definition': inner_rule_definition,
-                            'parent_rule_id': rule_id,
-                            'path': newpath,
-                        })
-                        inner_index += 1
+    def _nested_messages(self, inner_rule_definition, rule_id, value, path):
+        for inner_index, inner_value in enumerate(value):
+            yield RuleMessage(inner_rule_definition, rule_id, inner_value,
+                              (path, ITEM, inner_index))
 
-            return rule_id, new_messages
+    def nested_definition(self, rule_definition, key):
+        return rule_definition.get('allowed')
 
-        return super(ListRuleParseHandler, self).handle_message(message)
+    def nested_definitions(self, rule_definition):
+        allowed = rule_definition.get('allowed')
+        return [] if allowed is None else [allowed]
 
 
 class DictRuleParseHandler(RuleParseHandler):
@@ -100,87 +218,131 @@ class DictRuleParseHandler(RuleParseHandler):
      for values of the 'dictionary' type.
      Dict value rule's definition may contain nested rules definitions."""
 
+    rule_types = ('dictionary',)
+
+    def __init__(self, builder):
+        super(DictRuleParseHandler, self).__init__(builder)
+        # rule definition id -> (rule definition, mandatory keys,
+        # optional keys); rules of all values of one rule definition
+        # share the same sets of keys, while the definition is not changed.
+        self._keys_sets = {}
+
     def handle_message(self, message):
 
         if (isinstance(message['rule_definition'], dict)
                 and 'type' in message['rule_definition']
                 and message['rule_definition']['type'] == 'dictionary'):
-
-            mandatory = message['rule_definition'].get('mandatory', {})
-            mandatory_keys = set(mandatory.iterkeys())
-
-            optional = message['rule_definition'].get('optional', {})
-            optional_keys = set(optional.iterkeys())
-
-            strict_keys = message['rule_definition']\
-                .get('strict_keys_set', True)
-
-            rule_id = self.builder.build_dictionary(
-                message['value'],
-                message['parent_rule_id'],
-                mandatory_keys=mandatory_keys,
-                optional_keys=optional_keys,
-                strict_keys_set=strict_keys,
-                path=message['path'] if message['path'] else '/')
-
-            new_messages = []
-
-            if isinstance(message['value'], dict):
-
-                for key in message['value']:
-
-                    if key in mandatory:
-                        inner_rule_definition = mandatory[key]
-
-                    elif key in optional:
-                        inner_rule_definition = optional[key]
-
-                    elif not strict_keys:
-                        inner_rule_definition = message['rule_definition']\
-                            .get('allowed')
-
-                    else:
-                        inner_rule_definition = None
-
-                    if inner_rule_definition is not None:
-                        newpath = message['path'] + '/' + key
-
-                        new_messages.append({
-                            'value': message['value'][key],
-                            'rule_definition': inner_rule_definition,
-                            'parent_rule_id': rule_id,
-                            'path': newpath
-                        })
-
-            return rule_id, new_messages
+            return self.build_rule(message)
 
         return super(DictRuleParseHandler, self).handle_message(message)
 
+    def _get_keys_sets(self, rule_definition, mandatory, optional):
+        keys_sets = self._keys_sets.get(id(rule_definition))
+        if (keys_sets is None or keys_sets[0] is not rule_definition
+                or keys_sets[1] != mandatory.viewkeys()
+                or keys_sets[2] != optional.viewkeys()):
+            keys_sets = (rule_definition, frozenset(mandatory),
+                         frozenset(optional))
+            self._keys_sets[id(rule_definition)] = keys_sets
+        return keys_sets[1], keys_sets[2]
+
+    def build_rule(self, message):
+        rule_id, new_messages = self.build_rule_lazily(message)
+        return rule_id, list(new_messages)
+
+    def build_rule_lazily(self, message):
+        mandatory = message['rule_definition'].get('mandatory', {})
+        optional = message['rule_definition'].get('optional', {})
+        mandatory_keys, optional_keys = self._get_keys_sets(
+            message['rule_definition'], mandatory, optional)
+
+        strict_keys = message['rule_definition']\
+            .get('strict_keys_set', True)
+
+        rule_id = self.builder.build_dictionary(
+            message['value'],
+            message['parent_rule_id'],
+            mandatory_keys=mandatory_keys,
+            optional_keys=optional_keys,
+            strict_keys_set=strict_keys,
+            path=message['path'] if message['path'] else '/')
+
+        if isinstance(message['value'], dict):
+            return rule_id, self._nested_messages(
+                message['rule_definition'], mandatory, optional, strict_keys,
+                rule_id, message['value'], message['path'])
+
+        return rule_id, []
+
+    def _nested_messages(self, rule_definition, mandatory, optional,
+                         strict_keys, rule_id, value, path):
+        for key in value:
+
+            if key in mandatory:
+                inner_rule_definition = mandatory[key]
+
+            elif key in optional:
+                inner_rule_definition = optional[key]
+
+            elif not strict_keys:
+                inner_rule_definition = rule_definition.get('allowed')
+
+            else:
+                inner_rule_definition = None
+
+            if inner_rule_definition is not None:
+                yield RuleMessage(inner_rule_definition, rule_id, value[key],
+                                  (path, ITEM, key))
+
+    def nested_definition(self, rule_definition, key):
+        mandatory = rule_definition.get('mandatory', {})
+        if key in mandatory:
+            return mandatory[key]
+        optional = rule_definition.get('optional', {})
+        if key in optional:
+            return optional[key]
+        if not rule_definition.get('strict_keys_set', True):
+            return rule_definition.get('allowed')
+        return None
+
+    def nested_definitions(self, rule_definition):
+        definitions = (rule_definition.get('mandatory', {}).values()
+                       + rule_definition.get('optional', {}).values())
+        if not rule_definition.get('strict_keys_set', True):
+            definitions.append(rule_definition.get('allowed'))
+        return [definition for definition in definitions
+                if definition is not None]
+
 
 class MetaRuleParseHandler(RuleParseHandler):
     """Rule definition parser, that recognizes definition of 'meta' rules.
     'Meta' rule's definition may contain nested rules definitions."""
 
+    rule_types = (META_RULE,)
+
     def handle_message(self, message):
         if isinstance(message['rule_definition'], list):
-            # meta rule: a list of alternative rules
-            rule_id = self.builder.build_meta_rule(
-                message['value'],
-                message['parent_rule_id'],
-                message['path'] if message['path'] else '/')
-
-            new_messages = []
-
-            index = 1
-            for inner_rule_definition in message['rule_definition']:
-                new_messages.append({
-                    'value': message['value'],
-                    'rule_definition': inner_rule_definition,
-                    'parent_rule_id': rule_id,
-                    'path': message['path'] + ('(alt.#%d)' % index)
-                })
-                index += 1
-
-            return rule_id, new_messages
+            return self.build_rule(message)
 
         return super(MetaRuleParseHandler, self).handle_message(message)
+
+    def build_rule(self, message):
+        # meta rule: a list of alternative rules
+        rule_id = self.builder.build_meta_rule(
+            message['value'],
+            message['parent_rule_id'],
+            message['path'] if message['path'] else '/')
+
+        new_messages = []
+
+        index = 1
+        for inner_rule_definition in message['rule_definition']:
+            new_messages.append(AlternativeMessage(
+                inner_rule_definition, rule_id, message['value'],
+                (message['path'], ALTERNATIVE, index)))
+            index += 1
+
+        return rule_id, new_messages
+
+    def nested_definitions(self, rule_definition):
+        return list(rule_definition)
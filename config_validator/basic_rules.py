@@ -7,119 +7,481 @@
 # Good aproach to implement this is to use OOP pattern 'Composite'.
 # We will define simple and complex validation rules
 # as components in terms of that pattern.
+# Rules keep errors as records (see 'config_errors'), text of messages is
+# rendered by 'get_all_errors()'.
+
+from collections import deque
+from itertools import islice
+
+from config_errors import record, records, render_error, render_errors
+from config_paths import rebase_path, render_path
+import config_errors
+
+
+# Kinds of rules for CompositeNode, that walks nested rules: walked
+# composite rules, rules with errors collected by 'Node._collect_errors()',
+# places of shared rules (see SharedNode) and other rules (see
+# CompositeNode).
+_WALKED = 'walked'
+_SIMPLE = 'simple'
+_SHARED = 'shared'
+_OTHER = 'other'
+
+
+class _RuleType(type):
+    """Metaclass of rules, it sets '_rule_kind' of rules classes.
+    Rules, that override 'validate()', 'is_valid()' or '_collect_errors()'
+    of walked composite rules, are not walked, their methods are called
+    as is. Rules, that override '_collect_errors()', are not simple."""
+
+    def __init__(cls, name, bases, attrs):
+        super(_RuleType, cls).__init__(name, bases, attrs)
+        if '_rule_kind' in attrs:
+            return
+        if '_collect_errors' in attrs:
+            cls._rule_kind = _OTHER
+        elif cls._rule_kind is _WALKED and ('validate' in attrs
+                                            or 'is_valid' in attrs):
+            cls._rule_kind = _OTHER
 
 
 class Node(object):
     """Base component of Composite pattern.
-    Shouldn't be used."""
+    Shouldn't be used.
+    Rules trees may have a node for each value of a big config, so rules
+    keep their attributes in slots, and the list of errors is created
+    only when the first error is added.
+    Path may be linked to the parent's path (see 'config_paths'), it is
+    rendered to text by the 'path' property."""
+
+    __metaclass__ = _RuleType
+    __slots__ = ('value', '_path', '_errors')
+    _rule_kind = _SIMPLE
+
     def __init__(self, value, path):
         """value is a subtree of config dict,
         that shuld be validated by this rule (Node instance)."""
         self.value = value
-        self.path = path
-        self.errors = []
+        self._path = path
+        self._errors = None
+
+    @property
+    def path(self):
+        return render_path(self._path)
+
+    @path.setter
+    def path(self, path):
+        self._path = path
+
+    @property
+    def errors(self):
+        if self._errors is None:
+            self._errors = []
+        return self._errors
+
+    @errors.setter
+    def errors(self, errors):
+        self._errors = errors
+
+    def _add_error(self, error):
+        if self._errors is None:
+            self._errors = [error]
+        else:
+            self._errors.append(error)
 
     def validate(self):
         raise NotImplementedError()
 
+    def is_valid(self):
+        """Fast path of 'validate()': returns 'ok' without error messages
+        and stops on the first failure. Rules should override it,
+        by default it just calls 'validate()'."""
+        return self.validate()
+
+    def check_value(self):
+        """Checks the value itself, but not the nested values.
+        Returns True, if nested values should be checked.
+        Simple rules have no nested values, so it is just 'validate()'."""
+        return self.validate()
+
+    def check_nested(self, valid_children):
+        """Gets validation results of child rules (a list of booleans)
+        and returns validation result of this rule.
+        'check_value()' and 'check_nested()' let the director validate
+        the rules one by one without building the whole rules tree."""
+        return not self._errors
+
     def add_child(self, node):
         raise NotImplementedError()
 
     def remove_child(self, node):
         raise NotImplementedError()
 
-    def get_all_errors(self):
-        if self.errors:
-            return self.errors
+    def get_all_errors(self, max_errors=None):
+        """Returns a list of error messages of this rule and nested rules
+        or None. If 'max_errors' is given, not more than 'max_errors'
+        messages are collected. It does not stop 'validate()' of the rules
+        tree, use 'validate()' of the director to stop validation on
+        the errors budget."""
+        errors = []
+        self._collect_errors(errors, max_errors)
+        if errors:
+            return render_errors(errors)
         else:
             return None
 
+    def get_all_error_records(self, max_errors=None):
+        """Like 'get_all_errors()', but returns error records
+        (config_errors.ConfigError) without rendering them."""
+        errors = []
+        self._collect_errors(errors, max_errors)
+        if errors:
+            return records(errors)
+        else:
+            return None
+
+    def iter_errors(self):
+        """Yields error messages of this rule and nested rules, in the
+        order of 'get_all_errors()'. Complex rules yield errors while they
+        walk nested rules, so errors may be written to a file or a log
+        without building the whole list of them."""
+        paths_texts = {}
+        for error in self._iter_records():
+            yield render_error(error, paths_texts)
+
+    def iter_error_records(self):
+        """Like 'iter_errors()', but yields error records
+        (config_errors.ConfigError)."""
+        paths_texts = {}
+        for error in self._iter_records():
+            yield record(error, paths_texts)
+
+    def _iter_records(self):
+        """Returns an iterator of errors of this rule and nested rules."""
+        kind = self._rule_kind
+        if kind is _WALKED or kind is _SHARED:
+            return self._walk_errors()
+        if kind is _SIMPLE:
+            return iter(self._errors or ())
+        errors = []
+        self._collect_errors(errors, None)
+        return iter(errors)
+
+    def _collect_errors(self, errors, max_errors):
+        """Appends errors of this rule and nested rules to the list.
+        Returns False, if the list is full."""
+        if not self._errors:
+            return max_errors is None or len(errors) < max_errors
+        if max_errors is None:
+            errors.extend(self._errors)
+            return True
+        errors.extend(self._errors[:max_errors - len(errors)])
+        return len(errors) < max_errors
+
 
 class IntegerNode(Node):
     """Simple rule, to validate integer values."""
+
+    __slots__ = ()
+
+    def is_valid(self):
+        return type(self.value) == int
+
     def validate(self):
         if not type(self.value) == int:
-            self.errors.append("Config Error at %s : value must be integer."
-                               % self.path)
-        return not self.errors
+            self._add_error((config_errors.INTEGER, self._path, ()))
+        return not self._errors
 
 
 class BooleanNode(Node):
     """Simple rule, to validate boolean values."""
+
+    __slots__ = ()
+
+    def is_valid(self):
+        return isinstance(self.value, bool)
+
     def validate(self):
         if not isinstance(self.value, bool):
-            self.errors.append("Config Error at %s : value must be boolean."
-                               % self.path)
-        return not self.errors
+            self._add_error((config_errors.BOOLEAN, self._path, ()))
+        return not self._errors
 
 
 class StringNode(Node):
     """Simple rule, to validate string values."""
+
+    __slots__ = ()
+
+    def is_valid(self):
+        return isinstance(self.value, basestring)
+
     def validate(self):
         if not isinstance(self.value, basestring):
-            self.errors.append("Config Error at %s : value must be string."
-                               % self.path)
-        return not self.errors
+            self._add_error((config_errors.STRING, self._path, ()))
+        return not self._errors
 
 
 class NotEmptyStringNode(StringNode):
     """Simple rule, to validate non-empty string values."""
+
+    __slots__ = ()
+
+    def is_valid(self):
+        return (super(NotEmptyStringNode, self).is_valid()
+                and len(self.value) > 0)
+
     def validate(self):
         super(NotEmptyStringNode, self).validate()
-        if not self.errors and len(self.value) == 0:
-            self.errors.append("Config Error at %s : value must "
-                               "be not empty string." % self.path)
-        return not self.errors
+        if not self._errors and len(self.value) == 0:
+            self._add_error((config_errors.NOT_EMPTY_STRING, self._path, ()))
+        return not self._errors
 
 
 class StringOfUnsignedInteger(NotEmptyStringNode):
     """Simple rule, to validate strings of unsigned integer values."""
+
+    __slots__ = ()
+
+    def is_valid(self):
+        return (super(StringOfUnsignedInteger, self).is_valid()
+                and self.value.isdigit())
+
     def validate(self):
         super(StringOfUnsignedInteger, self).validate()
-        if not self.errors and not self.value.isdigit():
-            self.errors.append("Config Error at %s : value must be not empty"
-                               " string representing unsigned integer."
-                               % self.path)
-        return not self.errors
+        if not self._errors and not self.value.isdigit():
+            self._add_error((config_errors.STRING_OF_UNSIGNED_INTEGERS,
+                             self._path, ()))
+        return not self._errors
+
+
+class CycleNode(Node):
+    """Rule of a value, that contains itself: it is the same object as the
+    value of a parent rule with the same rule definition (at the
+    'ancestor_path'), so nested rules would never end. It is never valid."""
+
+    __slots__ = ('ancestor_path',)
+
+    def __init__(self, value, path, ancestor_path=''):
+        super(CycleNode, self).__init__(value, path)
+        self.ancestor_path = ancestor_path
+
+    def is_valid(self):
+        return False
+
+    def validate(self):
+        self._add_error((config_errors.CYCLE, self._path,
+                         (render_path(self.ancestor_path) or '/',)))
+        return False
 
 
 class CompositeNode(Node):
     """Base complex rule: a 'composite' in terms of 'Composite pattern'.
-    Shouldn't be used directly."""
+    Shouldn't be used directly.
+    Children are kept in the order they were added, so errors of nested
+    rules are reported in the same order on each run. Most of rules have
+    no children (rules of simple values), so the list of children is
+    created by the first 'add_child()'."""
+
+    __slots__ = ('_children',)
+
     def __init__(self, value, path):
         super(CompositeNode, self).__init__(value, path)
-        self._children = set()
+        self._children = ()
 
     def add_child(self, node):
-        self._children.add(node)
+        if not self._children:
+            self._children = [node]
+        else:
+            self._children.append(node)
 
     def remove_child(self, node):
-        self._children.discard(node)
+        for index, child in enumerate(self._children):
+            if child is node:
+                del self._children[index]
+                return
+
+    def share_child(self, node):
+        """Replaces the child with a SharedNode, so the child rule may be
+        shared by other places of config. Returns the SharedNode of
+        the child or None, if the node is not a child."""
+        children = self._children
+        for index in xrange(len(children)):
+            child = children[index]
+            if child is node:
+                children[index] = SharedNode(node.value, node._path,
+                                             _SharedRule(node))
+                return children[index]
+            if type(child) is SharedNode and child.shared.rule is node:
+                return child
+        return None
+
+    # Nested rules are walked with an explicit stack instead of recursion,
+    # so deeply nested configs do not hit the recursion limit. Rules, that
+    # override 'validate()', 'is_valid()' or '_collect_errors()', are not
+    # walked, their methods are called as is (see '_RuleType').
+    _rule_kind = _WALKED
+
+    # Result of a child rule, that decides the result of this rule:
+    # one invalid child makes the rule invalid.
+    _deciding_result = False
 
     def validate(self):
         """This rule returns 'ok',
         if all of it's inner rules also returns 'ok'."""
-        valid_children = True
-        for node in self._children:
-            valid_children = node.validate() and valid_children
-        if not valid_children:
-            self.errors.append("Config Error at %s : each of nested values"
-                               " must be valid." % self.path)
-
-        return not self.errors
-
-    def get_all_errors(self):
-        errors = []
-        if self.errors:
-            errors += self.errors
-        for child in self._children:
-            child_errors = child.get_all_errors()
-            if child_errors:
-                errors += child_errors
-        if errors:
-            return errors
+        if not self.check_value():
+            return not self._errors
+
+        # frames: (rule, children iterator, results of children)
+        stack = [(self, iter(self._children), [])]
+        while True:
+            rule, children, valid_children = stack[-1]
+            # a valid alternative of a meta rule decides its result, so
+            # the rest of alternatives are not validated
+            if not (rule._deciding_result and valid_children
+                    and valid_children[-1]):
+                for child in children:
+                    if child._rule_kind is not _WALKED:
+                        is_valid = child.validate()
+                    elif child.check_value():
+                        stack.append((child, iter(child._children), []))
+                        break
+                    else:
+                        is_valid = not child._errors
+                    valid_children.append(is_valid)
+                    if is_valid and rule._deciding_result:
+                        break
+                if stack[-1][0] is not rule:
+                    # a nested rule is pushed
+                    continue
+
+            stack.pop()
+            is_valid = rule.check_nested(valid_children)
+            if not stack:
+                return is_valid
+            stack[-1][2].append(is_valid)
+
+    def is_valid(self):
+        if not self.is_value_valid():
+            return False
+
+        # result of the last finished rule
+        result = None
+        stack = [(self, iter(self._children))]
+        while stack:
+            rule, children = stack[-1]
+            deciding_result = rule._deciding_result
+            if result is not deciding_result:
+                result = not deciding_result
+                for child in children:
+                    if child._rule_kind is not _WALKED:
+                        child_result = True if child.is_valid() else False
+                    elif child.is_value_valid():
+                        stack.append((child, iter(child._children)))
+                        result = None
+                        break
+                    else:
+                        child_result = False
+                    if child_result is deciding_result:
+                        result = deciding_result
+                        break
+                if result is None:
+                    continue
+            stack.pop()
+        return result
+
+    def is_value_valid(self):
+        """Fast path of 'check_value()': returns 'ok' for the value itself,
+        without error messages."""
+        return True
+
+    def check_value(self):
+        return True
+
+    def check_nested(self, valid_children):
+        if not all(valid_children):
+            self._add_error((config_errors.NESTED, self._path, ()))
+
+        return not self._errors
+
+    def _shows_nested_errors(self):
+        """Returns True, if errors of nested rules should be collected.
+        Invalid nested rules make the rule invalid (see 'check_nested()'),
+        so nested rules of valid rules have no errors and are not walked."""
+        return bool(self._errors)
+
+    def _collect_errors(self, errors, max_errors):
+        if max_errors is None:
+            errors.extend(self._walk_errors())
+            return True
+        if len(errors) < max_errors:
+            errors.extend(islice(self._walk_errors(),
+                                 max_errors - len(errors)))
+        return len(errors) < max_errors
+
+    def _walk_errors(self):
+        """Yields errors of this rule and nested rules: errors of each rule
+        go before errors of its nested rules. Errors are never copied to
+        intermediate lists, so it takes the same time for each error on any
+        depth of nesting."""
+        if self._errors:
+            for error in self._errors:
+                yield error
+        if self._children and self._shows_nested_errors():
+            for error in _walk_nested_errors(self._children):
+                yield error
+
+
+def _rebased(error, rebases):
+    """Returns the error of a shared rule with its path at the place of
+    the rule (see '_walk_nested_errors()')."""
+    if isinstance(error, basestring):
+        return error
+    code, path, params = error
+    while rebases is not None:
+        base, new_base, rebases = rebases
+        path = rebase_path(path, base, new_base)
+    return (code, path, params)
+
+
+def _walk_nested_errors(rules):
+    """Yields errors of the rules and their nested rules, like
+    'CompositeNode._walk_errors()'. Shared rules are walked at each place
+    (see SharedNode), their errors are rebased to the path of the place
+    one at a time, so the errors budget and 'iter_errors()' stop the walk
+    early. Frames of the stack keep the chain of rebases of their rules:
+    (base path, path of the place, rebases of the place) or None."""
+    stack = [(iter(rules), None)]
+    while stack:
+        rules, rebases = stack[-1]
+        for rule in rules:
+            kind = rule._rule_kind
+            if kind is _SHARED:
+                shared = rule.shared
+                if shared._validated:
+                    base = shared.rule._path
+                    if rule._path is not base:
+                        rebases = (base, rule._path, rebases)
+                    stack.append((iter((shared.rule,)), rebases))
+                    break
+                continue
+            if kind is _OTHER:
+                errors = []
+                rule._collect_errors(errors, None)
+            else:
+                # most of rules have no errors
+                errors = rule._errors or ()
+            if rebases is None:
+                for error in errors:
+                    yield error
+            else:
+                for error in errors:
+                    yield _rebased(error, rebases)
+            if (kind is _WALKED and rule._children
+                    and rule._shows_nested_errors()):
+                stack.append((iter(rule._children), rebases))
+                break
         else:
-            return None
+            stack.pop()
 
 
 # To reduce the number of classes for complex rules,
@@ -128,113 +490,226 @@ class CompositeNode(Node):
 # It is better to declare the rules scheme, than to develop many new classes.
 # Parameters should be set properly during the construction of rules tree.
 
+_NO_KEYS = frozenset()
+
 
 class ListNode(CompositeNode):
     """Complex rule, to validate a list of inner rules."""
+
+    __slots__ = ('min_length', 'max_length')
+
     def __init__(self, value, path):
         super(ListNode, self).__init__(value, path)
         self.min_length = None
         self.max_length = None
 
-    def validate(self):
+    def is_value_valid(self):
+        if not isinstance(self.value, list):
+            return False
+        if self.min_length is not None and len(self.value) < self.min_length:
+            return False
+        if self.max_length is not None and len(self.value) > self.max_length:
+            return False
+        return True
+
+    def check_value(self):
         """This rule returns 'ok', if:
          - the number of list items is between min_length and max_length;
-         - all child rules, for all elements of value-list returns 'ok'."""
+         - all child rules, for all elements of value-list returns 'ok'
+         (they are checked by 'validate()' after this method)."""
 
         if not isinstance(self.value, list):
-            self.errors.append("Config Error at %s : value must be list."
-                               % self.path)
+            self._add_error((config_errors.LIST, self._path, ()))
         else:
             if self.min_length is not None and len(self.value) < self.min_length:
-                self.errors.append("Config Error at %s : the value must have "
-                                   "at list %d items."
-                                   % (self.path, self.min_length))
+                self._add_error((config_errors.MIN_LENGTH,
+                                 self._path, (self.min_length,)))
 
             if self.max_length is not None and len(self.value) > self.max_length:
-                self.errors.append("Config Error at %s : the value must have "
-                                   "not more than %d items."
-                                   % (self.path, self.max_length))
-
-        if not self.errors:
-            super(ListNode, self).validate()
+                self._add_error((config_errors.MAX_LENGTH,
+                                 self._path, (self.max_length,)))
 
-        return not self.errors
+        return not self._errors
 
 
 class DictNode(CompositeNode):
-    """Complex rule, to validate a dictionary of inner rules."""
+    """Complex rule, to validate a dictionary of inner rules.
+    Sets of keys are not changed by the rule, so one set may be shared by
+    all of rules, that are built by the same rule definition."""
+
+    __slots__ = ('mandatory_keys', 'optional_keys', 'strict_keys_set')
+
     def __init__(self, value, path):
         super(DictNode, self).__init__(value, path)
-        self.mandatory_keys = set()
-        self.optional_keys = set()
+        self.mandatory_keys = _NO_KEYS
+        self.optional_keys = _NO_KEYS
         self.strict_keys_set = True
 
-    def validate(self):
+    def is_value_valid(self):
+        if not isinstance(self.value, dict):
+            return False
+        for key in self.mandatory_keys:
+            if key not in self.value:
+                return False
+        if self.strict_keys_set:
+            for key in self.value:
+                if (key not in self.mandatory_keys
+                        and key not in self.optional_keys):
+                    return False
+        return True
+
+    def check_value(self):
         """This rule is 'ok', if:
         - all mandatory keys exists in value;
         - there is no unknown keys (not in mandatory or optional),
         if they are on allowed,
-        - all rules for all keys says 'ok'."""
+        - all rules for all keys says 'ok'
+        (they are checked by 'validate()' after this method)."""
         if not isinstance(self.value, dict):
-            self.errors.append("Config Error at %s : value must be dictionary."
-                               % self.path)
+            self._add_error((config_errors.DICTIONARY, self._path, ()))
         else:
             dict_keys = set(self.value.keys())
             missed_keys = self.mandatory_keys.difference(dict_keys)
             if len(missed_keys) > 0:
-                self.errors.append("Config Error at %s :"
-                                   " missing key(s): %s."
-                                   % (self.path, list(missed_keys)))
+                self._add_error((config_errors.MISSING_KEYS,
+                                 self._path, (sorted(missed_keys),)))
 
             if self.strict_keys_set:
                 valid_keys_set = self.mandatory_keys.union(self.optional_keys)
                 unknown_keys = dict_keys.difference(valid_keys_set)
                 if len(unknown_keys) > 0:
-                    self.errors.append("Config Error at %s :"
-                                       " unknown key(s): %s."
-                                       % (self.path, list(unknown_keys)))
+                    self._add_error((config_errors.UNKNOWN_KEYS,
+                                     self._path, (sorted(unknown_keys),)))
+
+        return not self._errors
+
 
-        if not self.errors:
-            super(DictNode, self).validate()
+class _Alternatives(list):
+    """Children of a meta rule, that are built on demand: 'pending' keeps
+    functions, that build the rest of alternatives. Iteration builds them
+    one by one, when it reaches them, and keeps the built rules."""
 
-        return not self.errors
+    __slots__ = ('pending',)
+
+    def __init__(self, children=()):
+        super(_Alternatives, self).__init__(children)
+        self.pending = deque()
+
+    def __nonzero__(self):
+        return len(self) > 0 or len(self.pending) > 0
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index < len(self):
+                yield self[index]
+            elif self.pending:
+                rule = self.pending.popleft()()
+                self.append(rule)
+                yield rule
+            else:
+                return
+            index += 1
 
 
 class MetaNode(CompositeNode):
     """Complex rule, to validate a set of alternative rules.
     Should be used carefully.
     Child rules are treated as alternatives to each other.
-    Each child rule should validate the same value: the parent's value."""
-    def __init__(self, value, path):
-        super(MetaNode, self).__init__(value, path)
+    Each child rule should validate the same value: the parent's value.
+    Alternatives are validated in the order they were added, until the first
+    valid one: the rest of them are not validated and have no errors."""
 
-    def validate(self):
-        """Validation mechanism fully replaces the baseclass validatioin logic.
+    __slots__ = ()
+
+    # one valid alternative makes the rule valid
+    _deciding_result = True
+
+    def add_child(self, node):
+        if type(self._children) is _Alternatives and self._children.pending:
+            # keep the order of alternatives
+            self._children.pending.append(lambda: node)
+        else:
+            super(MetaNode, self).add_child(node)
+
+    def add_alternative(self, build_alternative):
+        """Adds an alternative, that is built by 'build_alternative()' only
+        when the rule tries it: alternatives after the first valid one are
+        never built."""
+        if type(self._children) is not _Alternatives:
+            self._children = _Alternatives(self._children)
+        self._children.pending.append(build_alternative)
+
+    def check_nested(self, valid_children):
+        """Replaces the baseclass validatioin logic.
         In case of alternative rules, this rule is 'ok',
         if even one of alternatives says 'ok'."""
-        is_valid = False
-        for alternate in self._children:
-            valid_alternate = alternate.validate()
-            is_valid = is_valid or valid_alternate
+        is_valid = any(valid_children)
 
         if not is_valid:
-            self.errors.append("Config Error at %s : All allowed alternatives "
-                               "are not valid." % self.path)
+            self._add_error((config_errors.ALTERNATIVES, self._path, ()))
 
         return is_valid
 
-    def get_all_errors(self):
-        # Almost like at the base class, but showing errors only if
-        # all alternatives are not valid (in this case validate() on meta-node
-        # will add error to self).
-        errors = []
-        if self.errors:
-            errors += self.errors
-            for child in self._children:
-                child_errors = child.get_all_errors()
-                if child_errors:
-                    errors += child_errors
-        if errors:
-            return errors
-        else:
-            return None
+    def _shows_nested_errors(self):
+        # Like at the base class: errors of alternatives are shown only if
+        # all alternatives are not valid (in this case validate() on
+        # meta-node will add error to self). But here alternatives of valid
+        # rule may have errors.
+        return bool(self._errors)
+
+
+class _SharedRule(object):
+    """Rule of a value, that is shared by several SharedNodes. It keeps
+    the result of the rule, so the rule is validated only once."""
+
+    __slots__ = ('rule', 'valid', '_validated')
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.valid = None
+        self._validated = False
+
+    def validate(self):
+        if not self._validated:
+            self.valid = bool(self.rule.validate())
+            self._validated = True
+        return self.valid
+
+    def is_valid(self):
+        if self.valid is None:
+            self.valid = bool(self.rule.is_valid())
+        return self.valid
+
+
+class SharedNode(Node):
+    """Rule of a value, that is referenced from several places of config
+    (like YAML aliases or objects reused by a program): the places share
+    the rule of the value, so it is built and validated once. Errors of
+    the shared rule are reported at the path of each place, they are
+    walked again for each place (see '_walk_nested_errors()')."""
+
+    __slots__ = ('shared',)
+    _rule_kind = _SHARED
+
+    def __init__(self, value, path, shared):
+        super(SharedNode, self).__init__(value, path)
+        self.shared = shared
+
+    def is_valid(self):
+        return self.shared.is_valid()
+
+    def validate(self):
+        return self.shared.validate()
+
+    def _walk_errors(self):
+        return _walk_nested_errors((self,))
+
+    def _collect_errors(self, errors, max_errors):
+        if max_errors is None:
+            errors.extend(self._walk_errors())
+            return True
+        if len(errors) < max_errors:
+            errors.extend(islice(self._walk_errors(),
+                                 max_errors - len(errors)))
+        return len(errors) < max_errors
@@ -0,0 +1,577 @@
+# Code generation backend for the rules scheme compilation.
+# Instead of a tree of rule objects, this builder constructs python source
+# of validator functions specialised for the rules scheme: type checks of
+# simple rules are inlined into the code of complex rules, keys sets are
+# precomputed and checks of mandatory keys are unrolled.
+# The source is compiled with 'exec' once, when the product is requested.
+# Generated validators produce the same error records as basic rules.
+
+import compiled_rules
+import config_errors
+from config_paths import ITEM, ALTERNATIVE
+from compiled_builder import SchemaRulesBuilder
+from basic_builder import RulesBuilderMixIn
+
+
+SIMPLE_RULES_TYPES = ('integer', 'boolean', 'string', 'not_empty_string',
+                      'string_of_unsigned_integers')
+
+# Types of keys, that can be written in generated source as literals.
+LITERAL_KEYS_TYPES = (str, unicode, int, long, bool)
+
+
+class RuleSpec(object):
+    """Description of a rule for code generator: rule type, parameters and
+    nested rules descriptions with their slots."""
+
+    def __init__(self, rule_type, **params):
+        self.rule_type = rule_type
+        self.params = params
+        self.children = []
+
+    def add_child(self, rule, slot):
+        self.children.append((slot, rule))
+
+
+def _accepts_type(spec, value_type):
+    """Returns False, if values of the type are never valid for the rule."""
+    rule_type = spec.rule_type
+    if rule_type == 'integer':
+        return value_type is int
+    if rule_type == 'boolean':
+        return issubclass(value_type, bool)
+    if rule_type in SIMPLE_RULES_TYPES:
+        return issubclass(value_type, basestring)
+    if rule_type == 'list':
+        return issubclass(value_type, list)
+    if rule_type == 'dictionary':
+        return issubclass(value_type, dict)
+    for slot, rule in spec.children:
+        if _accepts_type(rule, value_type):
+            return True
+    return False
+
+
+def _accepts_key(spec, key, present):
+    """Returns False, if dictionaries with the key (present is True) or
+    without it are never valid for the rule."""
+    if spec.rule_type == 'dictionary':
+        if present:
+            return (key in spec.params['mandatory_keys']
+                    or key in spec.params['optional_keys']
+                    or not spec.params['strict_keys_set'])
+        return key not in spec.params['mandatory_keys']
+    if spec.rule_type == 'meta':
+        for slot, rule in spec.children:
+            if _accepts_type(rule, dict) and _accepts_key(rule, key, present):
+                return True
+        return False
+    return True
+
+
+class CodeGenerator(object):
+    """Generates source of validator functions for a tree of RuleSpecs.
+    Each complex rule gets its own function, simple rules are inlined.
+    Functions have the same signature as 'Rule.check()' of compiled rules:
+    (value, path, errors). Each of them has a twin predicate function,
+    like 'Rule.is_valid()': (value), that only returns 'ok'."""
+
+    def __init__(self):
+        self._lines = []
+        self._constants = {}
+        self._functions_names = {}
+        self._pending_specs = []
+
+    def generate(self, root_spec):
+        """Returns a tuple: source, a dict of constants used by the source,
+        the name of root validator function and the name of root predicate
+        function."""
+        root_name = self._function_name(root_spec)
+        root_predicate_name = self._predicate_name(root_spec)
+        index = 0
+        while index < len(self._pending_specs):
+            spec = self._pending_specs[index]
+            self._emit_function(spec, self._function_name(spec))
+            self._emit_predicate(spec, self._predicate_name(spec))
+            index += 1
+        return ('\n'.join(self._lines) + '\n', self._constants, root_name,
+                root_predicate_name)
+
+    def _function_index(self, spec):
+        if id(spec) not in self._functions_names:
+            self._functions_names[id(spec)] = len(self._functions_names)
+            self._pending_specs.append(spec)
+        return self._functions_names[id(spec)]
+
+    def _function_name(self, spec):
+        return '_check_%d' % self._function_index(spec)
+
+    def _predicate_name(self, spec):
+        return '_valid_%d' % self._function_index(spec)
+
+    def _constant(self, name, value):
+        name = '%s_%d' % (name, len(self._constants))
+        self._constants[name] = value
+        return name
+
+    def _literal(self, key):
+        if type(key) in LITERAL_KEYS_TYPES:
+            return repr(key)
+        return self._constant('KEY', key)
+
+    def _emit(self, indent, line):
+        self._lines.append('    ' * indent + line)
+
+    def _emit_error(self, indent, errors, code, path, *args):
+        assert code in config_errors.MESSAGES
+        self._emit(indent, '%s.append((%r, %s, (%s)))'
+                   % (errors, code, path,
+                      ''.join(arg + ', ' for arg in args)))
+
+    def _emit_function(self, spec, name):
+        self._emit(0, 'def %s(value, path, errors):' % name)
+        if spec.rule_type == 'list':
+            self._emit_list_body(spec)
+        elif spec.rule_type == 'dictionary':
+            self._emit_dict_body(spec)
+        elif spec.rule_type == 'meta':
+            self._emit_meta_body(spec)
+        else:
+            self._emit_check(spec, 1, 'value', 'path', 'errors', 'ok')
+            self._emit(1, 'return ok')
+        self._emit(0, '')
+
+    def _emit_check(self, spec, indent, value, path, errors, ok):
+        """Emits code, that checks the value with the rule and sets the
+        'ok' variable. Path expression is evaluated only on errors of
+        simple rules."""
+        rule_type = spec.rule_type
+        if rule_type not in SIMPLE_RULES_TYPES:
+            self._emit(indent, '%s = %s(%s, %s, %s)'
+                       % (ok, self._function_name(spec), value, path, errors))
+            return
+
+        if rule_type == 'integer':
+            condition = 'type(%s) == int' % value
+        elif rule_type == 'boolean':
+            condition = 'isinstance(%s, bool)' % value
+        else:
+            condition = 'isinstance(%s, basestring)' % value
+
+        self._emit(indent, 'if not %s:' % condition)
+        self._emit_error(indent + 1, errors,
+                         'boolean' if rule_type == 'boolean' else
+                         'integer' if rule_type == 'integer' else 'string',
+                         path)
+        self._emit(indent + 1, '%s = False' % ok)
+        if rule_type in ('not_empty_string', 'string_of_unsigned_integers'):
+            self._emit(indent, 'elif len(%s) == 0:' % value)
+            self._emit_error(indent + 1, errors, 'not_empty_string', path)
+            self._emit(indent + 1, '%s = False' % ok)
+        if rule_type == 'string_of_unsigned_integers':
+            self._emit(indent, 'elif not %s.isdigit():' % value)
+            self._emit_error(indent + 1, errors,
+                             'string_of_unsigned_integers', path)
+            self._emit(indent + 1, '%s = False' % ok)
+        self._emit(indent, 'else:')
+        self._emit(indent + 1, '%s = True' % ok)
+
+    def _emit_nested_summary(self, indent):
+        self._emit(indent, 'if not valid_items:')
+        self._emit(indent + 1, 'errors.insert(first_error, (%r, path, ()))'
+                   % config_errors.NESTED)
+        self._emit(indent + 1, 'return False')
+        self._emit(indent, 'return True')
+
+    def _emit_list_body(self, spec):
+        min_length = spec.params.get('min_length')
+        max_length = spec.params.get('max_length')
+        allowed = [rule for slot, rule in spec.children]
+
+        self._emit(1, 'if not isinstance(value, list):')
+        self._emit_error(2, 'errors', 'list', 'path')
+        self._emit(2, 'return False')
+
+        if min_length is not None or max_length is not None:
+            self._emit(1, 'valid = True')
+            if min_length is not None:
+                self._emit(1, 'if len(value) < %r:' % min_length)
+                self._emit_error(2, 'errors', 'min_length', 'path',
+                                 repr(min_length))
+                self._emit(2, 'valid = False')
+            if max_length is not None:
+                self._emit(1, 'if len(value) > %r:' % max_length)
+                self._emit_error(2, 'errors', 'max_length', 'path',
+                                 repr(max_length))
+                self._emit(2, 'valid = False')
+            self._emit(1, 'if not valid:')
+            self._emit(2, 'return False')
+
+        if not allowed:
+            self._emit(1, 'return True')
+            return
+
+        self._emit(1, 'first_error = len(errors)')
+        self._emit(1, 'valid_items = True')
+        self._emit(1, 'for index, item in enumerate(value):')
+        self._emit_check(allowed[-1], 2, 'item',
+                         "(path, %r, index)" % ITEM, 'errors', 'ok')
+        self._emit(2, 'if not ok:')
+        self._emit(3, 'valid_items = False')
+        self._emit_nested_summary(1)
+
+    def _emit_dict_body(self, spec):
+        mandatory_keys = spec.params['mandatory_keys']
+        valid_keys = mandatory_keys.union(spec.params['optional_keys'])
+        strict_keys_set = spec.params['strict_keys_set']
+
+        keys_rules = {}
+        allowed = None
+        for (kind, key), rule in spec.children:
+            if kind == 'allowed':
+                allowed = rule
+            elif kind == 'optional':
+                keys_rules.setdefault(key, rule)
+            else:
+                keys_rules[key] = rule
+        if strict_keys_set:
+            allowed = None
+
+        self._emit(1, 'if not isinstance(value, dict):')
+        self._emit_error(2, 'errors', 'dictionary', 'path')
+        self._emit(2, 'return False')
+
+        checks_keys = mandatory_keys or strict_keys_set
+        if checks_keys:
+            self._emit(1, 'valid = True')
+        if mandatory_keys:
+            mandatory_name = self._constant('MANDATORY', mandatory_keys)
+            self._emit(1, 'if not (%s):' % ' and '.join(
+                '%s in value' % self._literal(key)
+                for key in sorted(mandatory_keys)))
+            self._emit(2, 'missed_keys = %s.difference(set(value.keys()))'
+                       % mandatory_name)
+            self._emit_error(2, 'errors', 'missing_keys', 'path',
+                             'sorted(missed_keys)')
+            self._emit(2, 'valid = False')
+        if strict_keys_set:
+            valid_name = self._constant('VALID', valid_keys)
+            self._emit(1, 'if not %s.issuperset(value):' % valid_name)
+            self._emit(2, 'unknown_keys = set(value.keys()).difference(%s)'
+                       % valid_name)
+            self._emit_error(2, 'errors', 'unknown_keys', 'path',
+                             'sorted(unknown_keys)')
+            self._emit(2, 'valid = False')
+        if checks_keys:
+            self._emit(1, 'if not valid:')
+            self._emit(2, 'return False')
+
+        if not keys_rules and allowed is None:
+            self._emit(1, 'return True')
+            return
+
+        self._emit(1, 'first_error = len(errors)')
+        self._emit(1, 'valid_items = True')
+        self._emit(1, 'for key, item in value.iteritems():')
+        statement = 'if'
+        for key in sorted(keys_rules):
+            self._emit(2, '%s key == %s:' % (statement, self._literal(key)))
+            self._emit_check(keys_rules[key], 3, 'item',
+                             "(path, %r, key)" % ITEM, 'errors', 'ok')
+            statement = 'elif'
+        if allowed is None:
+            self._emit(2, 'else:')
+            self._emit(3, 'continue')
+        elif keys_rules:
+            self._emit(2, 'else:')
+            self._emit_check(allowed, 3, 'item',
+                             "(path, %r, key)" % ITEM, 'errors', 'ok')
+        else:
+            self._emit_check(allowed, 2, 'item',
+                             "(path, %r, key)" % ITEM, 'errors', 'ok')
+        self._emit(2, 'if not ok:')
+        self._emit(3, 'valid_items = False')
+        self._emit_nested_summary(1)
+
+    def _meta_branches(self, spec):
+        """Returns a list of (type name, alternatives, discriminator) for
+        the types of values, that only some of alternatives of the meta rule
+        accept. Dictionaries are told apart by the discriminator (see
+        'compiled_rules.find_discriminator()'), if there is one."""
+        alternatives = [alternative for slot, alternative in spec.children]
+        types_index = compiled_rules.index_alternatives(alternatives,
+                                                        _accepts_type)
+        dict_alternatives = types_index.get(dict, alternatives)
+        discriminator = compiled_rules.find_discriminator(
+            dict_alternatives,
+            compiled_rules.discriminator_keys(
+                spec.params.get('discriminator'),
+                [alternative.params['mandatory_keys']
+                 for alternative in dict_alternatives
+                 if alternative.rule_type == 'dictionary']),
+            _accepts_key)
+
+        branches = []
+        for value_type in compiled_rules.INDEXED_TYPES:
+            if value_type is dict and discriminator is not None:
+                branches.append(('dict', None, discriminator))
+            elif value_type in types_index:
+                branches.append((value_type.__name__,
+                                 types_index[value_type], None))
+        return branches
+
+    def _conditions(self, alternatives):
+        return ' or '.join(self._condition(alternative, 'value')
+                           for alternative in alternatives)
+
+    def _emit_meta_body(self, spec):
+        # Alternatives, that accept the value, are tried with predicates.
+        # If none of them is valid, all of alternatives are checked to
+        # report errors.
+        branches = [branch for branch in self._meta_branches(spec)
+                    if branch[1] or branch[2]]
+        if branches:
+            self._emit(1, 'value_type = type(value)')
+        statement = 'if'
+        for type_name, candidates, discriminator in branches:
+            self._emit(1, '%s value_type is %s:' % (statement, type_name))
+            statement = 'elif'
+            if discriminator is None:
+                self._emit(2, 'if %s:' % self._conditions(candidates))
+                self._emit(3, 'return True')
+                continue
+            key, with_key, without_key = discriminator
+            self._emit(2, 'if %s in value:' % self._literal(key))
+            if with_key:
+                self._emit(3, 'if %s:' % self._conditions(with_key))
+                self._emit(4, 'return True')
+            else:
+                self._emit(3, 'pass')
+            if without_key:
+                self._emit(2, 'elif %s:' % self._conditions(without_key))
+                self._emit(3, 'return True')
+
+        self._emit(1, 'alternatives_errors = new_errors_buffer(errors)')
+        index = 1
+        for slot, alternative in spec.children:
+            # an alternative, that overflows the errors budget, is not valid
+            self._emit(1, 'try:')
+            self._emit_check(alternative, 2, 'value',
+                             "(path, %r, %d)" % (ALTERNATIVE, index),
+                             'alternatives_errors', 'ok')
+            self._emit(1, 'except ErrorsLimitReached as error:')
+            self._emit(2, 'if error.collector is not alternatives_errors:')
+            self._emit(3, 'raise')
+            self._emit(2, 'ok = False')
+            self._emit(1, 'if ok:')
+            self._emit(2, 'return True')
+            index += 1
+        self._emit_error(1, 'errors', 'alternatives', 'path')
+        self._emit(1, 'errors.extend(alternatives_errors)')
+        self._emit(1, 'return False')
+
+    def _condition(self, spec, value):
+        """Returns an expression, that is true, if the value is valid.
+        Simple rules are inlined, complex rules call predicate functions."""
+        rule_type = spec.rule_type
+        if rule_type == 'integer':
+            return 'type(%s) == int' % value
+        if rule_type == 'boolean':
+            return 'isinstance(%s, bool)' % value
+        if rule_type == 'string':
+            return 'isinstance(%s, basestring)' % value
+        if rule_type == 'not_empty_string':
+            return ('(isinstance(%s, basestring) and len(%s) > 0)'
+                    % (value, value))
+        if rule_type == 'string_of_unsigned_integers':
+            # isdigit() is False for empty strings
+            return ('(isinstance(%s, basestring) and %s.isdigit())'
+                    % (value, value))
+        return '%s(%s)' % (self._predicate_name(spec), value)
+
+    def _emit_predicate(self, spec, name):
+        self._emit(0, 'def %s(value):' % name)
+        if spec.rule_type == 'list':
+            self._emit_list_predicate_body(spec)
+        elif spec.rule_type == 'dictionary':
+            self._emit_dict_predicate_body(spec)
+        elif spec.rule_type == 'meta':
+            branches = self._meta_branches(spec)
+            if branches:
+                self._emit(1, 'value_type = type(value)')
+            for type_name, candidates, discriminator in branches:
+                self._emit(1, 'if value_type is %s:' % type_name)
+                if discriminator is None:
+                    self._emit(2, 'return %s'
+                               % (self._conditions(candidates) or 'False'))
+                    continue
+                key, with_key, without_key = discriminator
+                self._emit(2, 'if %s in value:' % self._literal(key))
+                self._emit(3, 'return %s'
+                           % (self._conditions(with_key) or 'False'))
+                self._emit(2, 'return %s'
+                           % (self._conditions(without_key) or 'False'))
+            self._emit(1, 'return %s' % (' or '.join(
+                self._condition(alternative, 'value')
+                for slot, alternative in spec.children) or 'False'))
+        else:
+            self._emit(1, 'return %s' % self._condition(spec, 'value'))
+        self._emit(0, '')
+
+    def _emit_list_predicate_body(self, spec):
+        min_length = spec.params.get('min_length')
+        max_length = spec.params.get('max_length')
+        allowed = [rule for slot, rule in spec.children]
+
+        self._emit(1, 'if not isinstance(value, list):')
+        self._emit(2, 'return False')
+        if min_length is not None:
+            self._emit(1, 'if len(value) < %r:' % min_length)
+            self._emit(2, 'return False')
+        if max_length is not None:
+            self._emit(1, 'if len(value) > %r:' % max_length)
+            self._emit(2, 'return False')
+        if allowed:
+            self._emit(1, 'for item in value:')
+            self._emit(2, 'if not %s:' % self._condition(allowed[-1], 'item'))
+            self._emit(3, 'return False')
+        self._emit(1, 'return True')
+
+    def _emit_dict_predicate_body(self, spec):
+        mandatory_keys = spec.params['mandatory_keys']
+        valid_keys = mandatory_keys.union(spec.params['optional_keys'])
+        strict_keys_set = spec.params['strict_keys_set']
+
+        keys_rules = {}
+        allowed = None
+        for (kind, key), rule in spec.children:
+            if kind == 'allowed':
+                allowed = rule
+            elif kind == 'optional':
+                keys_rules.setdefault(key, rule)
+            else:
+                keys_rules[key] = rule
+        if strict_keys_set:
+            allowed = None
+
+        self._emit(1, 'if not isinstance(value, dict):')
+        self._emit(2, 'return False')
+        if mandatory_keys:
+            self._emit(1, 'if not (%s):' % ' and '.join(
+                '%s in value' % self._literal(key)
+                for key in sorted(mandatory_keys)))
+            self._emit(2, 'return False')
+
+        if not keys_rules and allowed is None and not strict_keys_set:
+            self._emit(1, 'return True')
+            return
+
+        self._emit(1, 'for key, item in value.iteritems():')
+        statement = 'if'
+        for key in sorted(keys_rules):
+            self._emit(2, '%s key == %s:' % (statement, self._literal(key)))
+            self._emit(3, 'if not %s:' % self._condition(keys_rules[key],
+                                                           'item'))
+            self._emit(4, 'return False')
+            statement = 'elif'
+        if strict_keys_set:
+            # keys without rules are unknown keys
+            self._emit(2, '%s key not in %s:'
+                       % ('elif' if keys_rules else 'if',
+                          self._constant('VALID', valid_keys)))
+            self._emit(3, 'return False')
+        elif allowed is not None:
+            self._emit(2, '%s key not in %s:'
+                       % ('elif' if keys_rules else 'if',
+                          self._constant('VALID', valid_keys)))
+            self._emit(3, 'if not %s:' % self._condition(allowed, 'item'))
+            self._emit(4, 'return False')
+        self._emit(1, 'return True')
+
+
+class GeneratedSchema(compiled_rules.CompiledSchema):
+    """Compiled schema, that is a generated python function and its
+    predicate twin."""
+
+    def __init__(self, source, constants, function_name, predicate_name):
+        self.source = source
+        self.constants = constants
+        self.function_name = function_name
+        self.predicate_name = predicate_name
+        self._compile_functions()
+
+    def _compile_functions(self):
+        namespace = dict(self.constants)
+        namespace['new_errors_buffer'] = compiled_rules.new_errors_buffer
+        namespace['ErrorsLimitReached'] = compiled_rules.ErrorsLimitReached
+        code = compile(self.source, '<config_validator generated>', 'exec')
+        exec code in namespace
+        self._check = namespace[self.function_name]
+        self.is_valid = namespace[self.predicate_name]
+
+    def __getstate__(self):
+        # Functions can not be pickled, so only the source is saved.
+        return (self.source, self.constants, self.function_name,
+                self.predicate_name)
+
+    def __setstate__(self, state):
+        (self.source, self.constants, self.function_name,
+         self.predicate_name) = state
+        self._compile_functions()
+
+
+class CodegenRulesBuilderMixIn(RulesBuilderMixIn):
+
+    """A collection of build methods with the same signatures as in
+    CompiledRulesBuilderMixIn, that collect descriptions of rules
+    for code generator."""
+
+    def build_integer(self, parent_id, slot=None):
+        return self._add_new_rule(RuleSpec('integer'), parent_id, slot)
+
+    def build_boolean(self, parent_id, slot=None):
+        return self._add_new_rule(RuleSpec('boolean'), parent_id, slot)
+
+    def build_string(self, parent_id, slot=None):
+        return self._add_new_rule(RuleSpec('string'), parent_id, slot)
+
+    def build_string_of_unsigned_integers(self, parent_id, slot=None):
+        return self._add_new_rule(RuleSpec('string_of_unsigned_integers'),
+                                  parent_id, slot)
+
+    def build_not_empty_string(self, parent_id, slot=None):
+        return self._add_new_rule(RuleSpec('not_empty_string'),
+                                  parent_id, slot)
+
+    def build_dictionary(self, parent_id, slot=None,
+                         mandatory_keys=frozenset(),
+                         optional_keys=frozenset(),
+                         strict_keys_set=True):
+        rule = RuleSpec('dictionary',
+                        mandatory_keys=frozenset(mandatory_keys),
+                        optional_keys=frozenset(optional_keys),
+                        strict_keys_set=strict_keys_set)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_list(self, parent_id, slot=None, min_length=None,
+                   max_length=None):
+        rule = RuleSpec('list', min_length=min_length, max_length=max_length)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_meta_rule(self, parent_id, slot=None, discriminator=None):
+        return self._add_new_rule(RuleSpec('meta',
+                                           discriminator=discriminator),
+                                  parent_id, slot)
+
+
+class CodegenRulesBuilder(SchemaRulesBuilder, CodegenRulesBuilderMixIn):
+
+    """A concrete builder implementation. Its product is a compiled schema
+    made of generated python code. Use it with CompiledRulesDirector
+    instead of CompiledRulesBuilder."""
+
+    def get_product(self):
+        root_spec = super(CodegenRulesBuilder, self).get_product()
+        if root_spec is None:
+            return None
+        return GeneratedSchema(*CodeGenerator().generate(root_spec))
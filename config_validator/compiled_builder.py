@@ -0,0 +1,93 @@
+# Builder part of the rules scheme compilation.
+# Unlike basic rules builder, builders defined here do not get the value
+# to be validated: they construct value-independent validators, that can be
+# used for any number of values. Instead of the value and the path they get
+# a 'slot' of the parent rule, that tells which of nested values should be
+# checked by the new rule:
+#  - ('mandatory', key) or ('optional', key) for a value of dictionary key;
+#  - ('allowed', None) for the rest of dictionary values or list items;
+#  - ('alternative', index) for an alternative of meta rule.
+
+import compiled_rules
+from basic_builder import RulesBuilder, RulesBuilderMixIn
+
+
+class SchemaRulesBuilder(RulesBuilder):
+
+    """Template class for builder that constructs a value-independent
+    validator as a heirarchy of simple objects.
+    Should not be used directly."""
+
+    def _add_new_rule(self, rule, parent_id, slot=None):
+        self._rules_list.append(rule)
+        if parent_id is not None and parent_id < len(self._rules_list):
+            self._rules_list[parent_id].add_child(rule, slot)
+
+        rule_id = len(self._rules_list) - 1
+        return rule_id
+
+    def add_shared_rule(self, parent_id, rule_id, slot=None):
+        """Adds the rule, that is already built, to one more parent rule.
+        The rule object is shared by both of parents, so the product is
+        not a tree, but a graph. Returns the rule id."""
+        if parent_id is not None and parent_id < len(self._rules_list):
+            self._rules_list[parent_id].add_child(self._rules_list[rule_id],
+                                                  slot)
+        return rule_id
+
+
+class CompiledRulesBuilderMixIn(RulesBuilderMixIn):
+
+    """A collection of build methods that reflects basic rules,
+    but constructs value-independent compiled rules.
+    All of that build methods gets 'parent rule_id' and a 'slot'
+    for the new rule object as arguments and returns its rule id."""
+
+    def build_integer(self, parent_id, slot=None):
+        return self._add_new_rule(compiled_rules.IntegerRule(),
+                                  parent_id, slot)
+
+    def build_boolean(self, parent_id, slot=None):
+        return self._add_new_rule(compiled_rules.BooleanRule(),
+                                  parent_id, slot)
+
+    def build_string(self, parent_id, slot=None):
+        return self._add_new_rule(compiled_rules.StringRule(),
+                                  parent_id, slot)
+
+    def build_string_of_unsigned_integers(self, parent_id, slot=None):
+        return self._add_new_rule(compiled_rules.StringOfUnsignedIntegerRule(),
+                                  parent_id, slot)
+
+    def build_not_empty_string(self, parent_id, slot=None):
+        return self._add_new_rule(compiled_rules.NotEmptyStringRule(),
+                                  parent_id, slot)
+
+    def build_dictionary(self, parent_id, slot=None,
+                         mandatory_keys=frozenset(),
+                         optional_keys=frozenset(),
+                         strict_keys_set=True):
+        rule = compiled_rules.DictRule(mandatory_keys, optional_keys,
+                                       strict_keys_set)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_list(self, parent_id, slot=None, min_length=None,
+                   max_length=None):
+        rule = compiled_rules.ListRule(min_length, max_length)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_meta_rule(self, parent_id, slot=None, discriminator=None):
+        return self._add_new_rule(compiled_rules.MetaRule(discriminator),
+                                  parent_id, slot)
+
+
+class CompiledRulesBuilder(SchemaRulesBuilder, CompiledRulesBuilderMixIn):
+
+    """A concrete builder implementation. Its product is a compiled schema
+    made of value-independent rules."""
+
+    def get_product(self):
+        root_rule = super(CompiledRulesBuilder, self).get_product()
+        if root_rule is None:
+            return None
+        return compiled_rules.RulesTreeSchema(root_rule)
@@ -0,0 +1,156 @@
+# Basic rules director builds a new rules tree for each value. Here we
+# introduce directors, that parse the rules scheme only once and get
+# a value-independent validator - the compiled schema. Then the compiled
+# schema is used to validate any number of values.
+
+
+from basic_director import HandledDirector
+import compiled_director_handlers
+from schema_cache import (default_schema_cache, schema_fingerprint,
+                          subschemas_fingerprints)
+
+
+class SchemaDirector(HandledDirector):
+
+    """Director, that compiles its rules scheme with the use of the chain
+    of rules definitions compilers and a schema builder.
+    Compilation is made once, on the first use of the director.
+    Compiled schemas are shared through the 'schema_cache' (process-wide
+    by default) by all of directors of the same class with the same type
+    of builder, the same classes of handlers in the chain and structurally
+    equal rules schemes. Set 'schema_cache' to None to compile each time.
+    If 'persistent_schema_cache' is set (for example to DiskSchemaCache),
+    it is used when the compiled schema is not found in 'schema_cache'.
+    Should not be used directly. Define your own set of handlers and
+    add them to the chain in a subclass of SchemaDirector."""
+
+    schema_cache = default_schema_cache
+    persistent_schema_cache = None
+
+    def __init__(self, rules_scheme, builder):
+        super(SchemaDirector, self).__init__(rules_scheme, builder)
+        self._compiled_schema = None
+        self._fingerprints = None
+        self._interned_rules = None
+
+    def compile_schema(self):
+        """Returns the compiled schema, compiles it if needed."""
+        if self._compiled_schema is not None:
+            return self._compiled_schema
+
+        caches = [cache for cache in (self.schema_cache,
+                                      self.persistent_schema_cache)
+                  if cache is not None]
+        if caches:
+            cache_key = ((schema_fingerprint(self._rules_scheme),
+                          type(self), type(self._builder))
+                         + self._handlers_classes())
+
+        missed_caches = []
+        for cache in caches:
+            self._compiled_schema = cache.get(cache_key)
+            if self._compiled_schema is not None:
+                break
+            missed_caches.append(cache)
+
+        if self._compiled_schema is None:
+            self._compiled_schema = self._compile()
+
+        for cache in missed_caches:
+            cache.put(cache_key, self._compiled_schema)
+
+        return self._compiled_schema
+
+    def _handlers_classes(self):
+        """Returns classes of handlers in the chain, in order: handlers
+        pushed to (or appended to) the chain of a director change its
+        compiled schemas."""
+        classes = []
+        handler = self._head_handler
+        while handler is not None:
+            classes.append(type(handler))
+            if handler is self._tail_handler:
+                break
+            handler = handler.next_handler
+        return tuple(classes)
+
+    def _compile(self):
+        self._builder.clean()
+
+        root_message = compiled_director_handlers.SchemaMessage(
+            self._rules_scheme, None, None)
+
+        if getattr(self._builder, 'add_shared_rule', None) is not None:
+            self._fingerprints = subschemas_fingerprints(self._rules_scheme)
+            self._interned_rules = {}
+        try:
+            self._handle_messages(root_message)
+            compiled_schema = self._builder.get_product()
+        finally:
+            self._fingerprints = self._interned_rules = None
+            self._builder.clean()
+        return compiled_schema
+
+    def _handle_message(self, message):
+        """Structurally equal subschemas are compiled only once: the rule
+        of the first of them is shared by the rest (it is interned by the
+        fingerprint of the subschema). Rules are value-independent, so
+        the rule does not depend on the place of subschema."""
+        if self._interned_rules is None:
+            return super(SchemaDirector, self)._handle_message(message)
+
+        fingerprint = self._fingerprints.get(
+            id(message['rule_definition']))
+        rule_id = self._interned_rules.get(fingerprint)
+        if rule_id is not None:
+            return (self._builder.add_shared_rule(message['parent_rule_id'],
+                                                  rule_id, message['slot']),
+                    [])
+
+        rule_id, new_messages = \
+            super(SchemaDirector, self)._handle_message(message)
+        if fingerprint is not None and rule_id is not None:
+            self._interned_rules[fingerprint] = rule_id
+        return rule_id, new_messages
+
+    def validate(self, value, max_errors=None, error_sink=None):
+        """Validates the value with the compiled schema
+        and returns ValidationResult. See 'CompiledSchema.validate()'
+        for 'max_errors' and 'error_sink'."""
+        return self.compile_schema().validate(value, max_errors, error_sink)
+
+    def is_valid(self, value):
+        """Returns 'ok' for the value. It stops on the first failure and
+        never formats error messages or paths."""
+        return self.compile_schema().is_valid(value)
+
+    def validate_rules_tree(self, value, max_errors=None):
+        """Compatibility with basic rules director: compiled schemas never
+        build rules trees for values, so it is just 'validate()'."""
+        return self.validate(value, max_errors).get_all_errors()
+
+    def build_rules_tree(self, value):
+        """Compatibility with basic rules director: returns an object
+        with 'validate()' and 'get_all_errors()' methods for the value."""
+        return self.compile_schema().bind(value)
+
+
+class CompiledRulesDirector(SchemaDirector):
+    """SchemaDirector with a chain of basic rules definitions compilers.
+    It reflects a set of basic rules, so it can be used with the same
+    rules schemes as BasicRulesDirector."""
+
+    def __init__(self, rules_scheme, builder):
+        super(CompiledRulesDirector, self).__init__(rules_scheme, builder)
+
+        self.append_handler(
+            compiled_director_handlers.SimpleRuleCompileHandler(self._builder))
+
+        self.append_handler(
+            compiled_director_handlers.ListRuleCompileHandler(self._builder))
+
+        self.append_handler(
+            compiled_director_handlers.DictRuleCompileHandler(self._builder))
+
+        self.append_handler(
+            compiled_director_handlers.MetaRuleCompileHandler(self._builder))
@@ -0,0 +1,138 @@
+# Rules definitions parsers for the compilation of rules scheme.
+# They work like basic rules definitions parsers, but messages have no
+# value and path. Nested rules definitions are parsed once for each 'slot'
+# of the parent rule, not once for each nested value.
+# Messages are records with fields: 'rule_definition', 'parent_rule_id'
+# and 'slot'.
+
+from basic_director_handlers import (Message, RuleParseHandler,
+                                     SimpleRuleParseHandler, META_RULE)
+
+
+class SchemaMessage(Message):
+    """Message with a rule definition to compile for the slot
+    of the parent rule."""
+
+    __slots__ = ('rule_definition', 'parent_rule_id', 'slot')
+
+    def __init__(self, rule_definition, parent_rule_id, slot):
+        self.rule_definition = rule_definition
+        self.parent_rule_id = parent_rule_id
+        self.slot = slot
+
+
+class SimpleRuleCompileHandler(SimpleRuleParseHandler):
+    """Rules definitions compiler for simple rules types."""
+
+    def build_rule(self, message):
+        build_method = self._build_methods[message['rule_definition']['type']]
+        rule_id = build_method(message['parent_rule_id'], message['slot'])
+        return rule_id, []
+
+
+class ListRuleCompileHandler(RuleParseHandler):
+    """Rule definition compiler for values of the 'list' type."""
+
+    rule_types = ('list',)
+
+    def handle_message(self, message):
+        if (isinstance(message['rule_definition'], dict)
+                and 'type' in message['rule_definition']
+                and message['rule_definition']['type'] == 'list'):
+            return self.build_rule(message)
+
+        return super(ListRuleCompileHandler, self).handle_message(message)
+
+    def build_rule(self, message):
+        rule_id = self.builder.build_list(
+            message['parent_rule_id'],
+            message['slot'],
+            min_length=message['rule_definition'].get('min_length'),
+            max_length=message['rule_definition'].get('max_length')
+        )
+
+        new_messages = []
+
+        inner_rule_definition = message['rule_definition'].get('allowed')
+        if inner_rule_definition is not None:
+            new_messages.append(SchemaMessage(
+                inner_rule_definition, rule_id, ('allowed', None)))
+
+        return rule_id, new_messages
+
+
+class DictRuleCompileHandler(RuleParseHandler):
+    """Rule definition compiler for values of the 'dictionary' type."""
+
+    rule_types = ('dictionary',)
+
+    def handle_message(self, message):
+        if (isinstance(message['rule_definition'], dict)
+                and 'type' in message['rule_definition']
+                and message['rule_definition']['type'] == 'dictionary'):
+            return self.build_rule(message)
+
+        return super(DictRuleCompileHandler, self).handle_message(message)
+
+    def build_rule(self, message):
+        mandatory = message['rule_definition'].get('mandatory', {})
+        optional = message['rule_definition'].get('optional', {})
+        strict_keys = message['rule_definition']\
+            .get('strict_keys_set', True)
+
+        rule_id = self.builder.build_dictionary(
+            message['parent_rule_id'],
+            message['slot'],
+            mandatory_keys=set(mandatory.iterkeys()),
+            optional_keys=set(optional.iterkeys()),
+            strict_keys_set=strict_keys)
+
+        new_messages = []
+
+        for kind, definitions in (('mandatory', mandatory),
+                                  ('optional', optional)):
+            for key, inner_rule_definition in definitions.iteritems():
+                new_messages.append(SchemaMessage(
+                    inner_rule_definition, rule_id, (kind, key)))
+
+        inner_rule_definition = message['rule_definition'].get('allowed')
+        if not strict_keys and inner_rule_definition is not None:
+            new_messages.append(SchemaMessage(
+                inner_rule_definition, rule_id, ('allowed', None)))
+
+        return rule_id, new_messages
+
+
+class MetaRuleCompileHandler(RuleParseHandler):
+    """Rule definition compiler for 'meta' rules: lists of alternatives."""
+
+    rule_types = (META_RULE,)
+
+    def handle_message(self, message):
+        if isinstance(message['rule_definition'], list):
+            return self.build_rule(message)
+
+        return super(MetaRuleCompileHandler, self).handle_message(message)
+
+    def build_rule(self, message):
+        # the first discriminator key declared by dictionary alternatives
+        discriminator = None
+        for inner_rule_definition in message['rule_definition']:
+            if (isinstance(inner_rule_definition, dict)
+                    and 'discriminator' in inner_rule_definition):
+                discriminator = inner_rule_definition['discriminator']
+                break
+
+        rule_id = self.builder.build_meta_rule(message['parent_rule_id'],
+                                               message['slot'],
+                                               discriminator=discriminator)
+
+        new_messages = []
+
+        index = 1
+        for inner_rule_definition in message['rule_definition']:
+            new_messages.append(SchemaMessage(
+                inner_rule_definition, rule_id, ('alternative', index)))
+            index += 1
+
+        return rule_id, new_messages
@@ -0,0 +1,641 @@
+# Basic rules are bound to the value they validate, so a new tree of rules
+# has to be built for each config that should be checked.
+# When the same rules scheme is used to check many configs, it is better
+# to parse the scheme only once and to get a tree of rules, that do not depend
+# on the value. Each rule of such a tree gets the value and it's path as
+# arguments of 'check()' method.
+# We still use the OOP pattern 'Composite' here, but complex rules keep
+# the nested rules for each 'slot' of the value (dict key, list item or
+# alternative) instead of a nested rule for each nested value.
+# Errors are reported as records (see 'config_errors'), paths of values
+# are linked to the paths of parents (see 'config_paths').
+
+from config_paths import ITEM, ALTERNATIVE
+import config_errors
+
+
+class ErrorsLimitReached(Exception):
+    """Raised by ErrorsCollector, when there is no room for one more error
+    message. It stops the validation."""
+
+    def __init__(self, collector):
+        super(ErrorsLimitReached, self).__init__()
+        self.collector = collector
+
+
+class ErrorsCollector(list):
+    """List of error messages, that holds not more than 'max_errors' of them.
+    Rules use it as a plain list. Meta rules buffer errors of alternatives
+    in a 'fork()' of it, and an alternative, that overflows the buffer,
+    is just not valid."""
+
+    def __init__(self, max_errors):
+        super(ErrorsCollector, self).__init__()
+        self.max_errors = max_errors
+
+    def append(self, message):
+        if len(self) >= self.max_errors:
+            raise ErrorsLimitReached(self)
+        list.append(self, message)
+
+    def insert(self, index, message):
+        if len(self) >= self.max_errors:
+            raise ErrorsLimitReached(self)
+        list.insert(self, index, message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def fork(self):
+        return ErrorsCollector(self.max_errors)
+
+
+class ErrorsSink(object):
+    """Errors list, that does not keep errors, but passes each of them
+    to 'callback' (as config_errors.ConfigError) as soon as it is found,
+    so errors may be written to a file or a log during the validation.
+    Error of a complex rule, that some of nested values are not valid, is
+    known only after errors of nested values, so it is passed after them
+    (the list of errors has it before them). Errors of alternatives are
+    passed only when all of alternatives failed.
+    Like ErrorsCollector, it takes not more than 'max_errors' errors,
+    if it is given."""
+
+    def __init__(self, callback, max_errors=None):
+        self.callback = callback
+        self.max_errors = max_errors
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, message):
+        if self.max_errors is not None and self.count >= self.max_errors:
+            raise ErrorsLimitReached(self)
+        self.count += 1
+        self.callback(config_errors.record(message))
+
+    def insert(self, index, message):
+        self.append(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def fork(self):
+        if self.max_errors is None:
+            return []
+        return ErrorsCollector(self.max_errors)
+
+
+def new_errors_buffer(errors):
+    """Returns an empty list for errors of alternatives: a fork of
+    the ErrorsCollector or just a list."""
+    return getattr(errors, 'fork', list)()
+
+
+# Meta rules index their alternatives by types of values, that basic rules
+# may accept, so most of alternatives are ruled out by the type of value.
+# Values of other types (and of subclasses) are checked with all of
+# alternatives.
+INDEXED_TYPES = (bool, int, str, unicode, list, dict)
+
+
+def index_alternatives(alternatives, accepts_type):
+    """Returns a dict: type of value -> tuple of alternatives, that may
+    accept values of the type ('accepts_type(alternative, type)' tells it).
+    Types, that all of alternatives may accept, are not indexed."""
+    types_index = {}
+    for value_type in INDEXED_TYPES:
+        candidates = tuple(alternative for alternative in alternatives
+                           if accepts_type(alternative, value_type))
+        if len(candidates) < len(alternatives):
+            types_index[value_type] = candidates
+    return types_index
+
+
+# Dictionary alternatives are usually told apart by a key, like '()' of
+# custom objects in logging configs. A dictionary rule definition may
+# declare such a key as 'discriminator', or it is chosen of mandatory keys
+# of alternatives. Dictionaries with and without the key are checked only
+# with alternatives, that may accept them.
+
+def find_discriminator(alternatives, keys, accepts_key):
+    """Returns a tuple: (key, alternatives for dictionaries with the key,
+    alternatives for dictionaries without the key) for the key of 'keys',
+    that rules out the most of alternatives, or None, if keys rule out none
+    of them. 'accepts_key(alternative, key, present)' returns False, if
+    the alternative never accepts dictionaries with (present is True) or
+    without the key."""
+    discriminator = None
+    best_size = 2 * len(alternatives)
+    for key in keys:
+        with_key = tuple(alternative for alternative in alternatives
+                         if accepts_key(alternative, key, True))
+        without_key = tuple(alternative for alternative in alternatives
+                            if accepts_key(alternative, key, False))
+        if len(with_key) + len(without_key) < best_size:
+            discriminator = (key, with_key, without_key)
+            best_size = len(with_key) + len(without_key)
+    return discriminator
+
+
+def discriminator_keys(declared_key, mandatory_keys_sets):
+    """Returns keys to choose the discriminator of: the declared key or
+    mandatory keys of dictionary alternatives in a stable order."""
+    if declared_key is not None:
+        return [declared_key]
+    keys = set()
+    for mandatory_keys in mandatory_keys_sets:
+        keys.update(mandatory_keys)
+    return sorted(keys)
+
+
+class Rule(object):
+    """Base value-independent rule.
+    Shouldn't be used directly."""
+
+    def check(self, value, path, errors):
+        """Checks the value, appends error records to the 'errors' list
+        and returns 'ok'. Path is the path of value in config data structure,
+        empty path means the root of config."""
+        raise NotImplementedError()
+
+    def is_valid(self, value):
+        """Fast path of 'check()': returns 'ok' without error messages and
+        paths and stops on the first failure. Rules should override it,
+        by default it just calls 'check()'."""
+        return self.check(value, '', [])
+
+    def add_child(self, rule, slot):
+        """Adds nested rule. Slot tells which of nested values should be
+        checked by the rule."""
+        raise NotImplementedError()
+
+    def accepts_type(self, value_type):
+        """Returns False, if values of the type are never valid. Rules
+        should override it, by default any type may be valid."""
+        return True
+
+    def accepts_key(self, key, present):
+        """Returns False, if dictionaries with the key (present is True)
+        or without it are never valid."""
+        return True
+
+
+class IntegerRule(Rule):
+    """Simple rule, to validate integer values."""
+
+    def is_valid(self, value):
+        return type(value) == int
+
+    def accepts_type(self, value_type):
+        return value_type is int
+
+    def check(self, value, path, errors):
+        if type(value) == int:
+            return True
+        errors.append((config_errors.INTEGER, path, ()))
+        return False
+
+
+class BooleanRule(Rule):
+    """Simple rule, to validate boolean values."""
+
+    def is_valid(self, value):
+        return isinstance(value, bool)
+
+    def accepts_type(self, value_type):
+        return issubclass(value_type, bool)
+
+    def check(self, value, path, errors):
+        if isinstance(value, bool):
+            return True
+        errors.append((config_errors.BOOLEAN, path, ()))
+        return False
+
+
+class StringRule(Rule):
+    """Simple rule, to validate string values."""
+
+    def is_valid(self, value):
+        return isinstance(value, basestring)
+
+    def accepts_type(self, value_type):
+        return issubclass(value_type, basestring)
+
+    def check(self, value, path, errors):
+        if isinstance(value, basestring):
+            return True
+        errors.append((config_errors.STRING, path, ()))
+        return False
+
+
+class NotEmptyStringRule(StringRule):
+    """Simple rule, to validate non-empty string values."""
+
+    def is_valid(self, value):
+        return isinstance(value, basestring) and len(value) > 0
+
+    def check(self, value, path, errors):
+        if not super(NotEmptyStringRule, self).check(value, path, errors):
+            return False
+        if len(value) == 0:
+            errors.append((config_errors.NOT_EMPTY_STRING, path, ()))
+            return False
+        return True
+
+
+class StringOfUnsignedIntegerRule(NotEmptyStringRule):
+    """Simple rule, to validate strings of unsigned integer values."""
+
+    def is_valid(self, value):
+        # isdigit() is False for empty strings
+        return isinstance(value, basestring) and value.isdigit()
+
+    def check(self, value, path, errors):
+        if not super(StringOfUnsignedIntegerRule, self).check(value, path,
+                                                              errors):
+            return False
+        if not value.isdigit():
+            errors.append((config_errors.STRING_OF_UNSIGNED_INTEGERS,
+                           path, ()))
+            return False
+        return True
+
+
+class CompositeRule(Rule):
+    """Base complex rule.
+    Shouldn't be used directly."""
+
+    def _check_items(self, items, path, errors):
+        """Checks (path, value, rule) items. Error message of this rule
+        goes before the errors of nested values, like
+        'CompositeNode.get_all_errors()' does it."""
+        first_error = len(errors)
+        valid_items = True
+        for item_path, item_value, item_rule in items:
+            valid_items = (item_rule.check(item_value, item_path, errors)
+                           and valid_items)
+        if not valid_items:
+            errors.insert(first_error,
+                          (config_errors.NESTED, path, ()))
+        return valid_items
+
+
+class ListRule(CompositeRule):
+    """Complex rule, to validate lists. The only nested rule is used
+    for all of list items."""
+
+    def __init__(self, min_length=None, max_length=None):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.allowed = None
+
+    def add_child(self, rule, slot):
+        self.allowed = rule
+
+    def accepts_type(self, value_type):
+        return issubclass(value_type, list)
+
+    def is_valid(self, value):
+        if not isinstance(value, list):
+            return False
+        if self.min_length is not None and len(value) < self.min_length:
+            return False
+        if self.max_length is not None and len(value) > self.max_length:
+            return False
+        if self.allowed is not None:
+            is_valid = self.allowed.is_valid
+            for item in value:
+                if not is_valid(item):
+                    return False
+        return True
+
+    def check(self, value, path, errors):
+        if not isinstance(value, list):
+            errors.append((config_errors.LIST, path, ()))
+            return False
+
+        valid = True
+        if self.min_length is not None and len(value) < self.min_length:
+            errors.append((config_errors.MIN_LENGTH, path, (self.min_length,)))
+            valid = False
+
+        if self.max_length is not None and len(value) > self.max_length:
+            errors.append((config_errors.MAX_LENGTH, path, (self.max_length,)))
+            valid = False
+
+        if valid and self.allowed is not None:
+            allowed = self.allowed
+            valid = self._check_items(
+                (((path, ITEM, index), item, allowed)
+                 for index, item in enumerate(value)),
+                path, errors)
+
+        return valid
+
+
+class DictRule(CompositeRule):
+    """Complex rule, to validate dictionaries. Nested rules are kept
+    for mandatory and optional keys, and one more nested rule is used for
+    the rest of keys, if the keys set is not strict."""
+
+    def __init__(self, mandatory_keys=frozenset(), optional_keys=frozenset(),
+                 strict_keys_set=True):
+        self.mandatory_keys = frozenset(mandatory_keys)
+        self.optional_keys = frozenset(optional_keys)
+        self.valid_keys = self.mandatory_keys.union(self.optional_keys)
+        self.strict_keys_set = strict_keys_set
+        self.keys_rules = {}
+        self.allowed = None
+
+    def add_child(self, rule, slot):
+        kind, key = slot
+        if kind == 'allowed':
+            self.allowed = rule
+        elif kind == 'optional':
+            self.keys_rules.setdefault(key, rule)
+        else:
+            self.keys_rules[key] = rule
+
+    def accepts_type(self, value_type):
+        return issubclass(value_type, dict)
+
+    def accepts_key(self, key, present):
+        if present:
+            return key in self.valid_keys or not self.strict_keys_set
+        return key not in self.mandatory_keys
+
+    def get_key_rule(self, key):
+        """Returns nested rule for the value of the key or None."""
+        rule = self.keys_rules.get(key)
+        if rule is None and key not in self.valid_keys \
+                and not self.strict_keys_set:
+            rule = self.allowed
+        return rule
+
+    def is_valid(self, value):
+        if not isinstance(value, dict):
+            return False
+        for key in self.mandatory_keys:
+            if key not in value:
+                return False
+        if self.strict_keys_set:
+            valid_keys = self.valid_keys
+            for key in value:
+                if key not in valid_keys:
+                    return False
+        get_key_rule = self.get_key_rule
+        for key, item in value.iteritems():
+            rule = get_key_rule(key)
+            if rule is not None and not rule.is_valid(item):
+                return False
+        return True
+
+    def check(self, value, path, errors):
+        if not isinstance(value, dict):
+            errors.append((config_errors.DICTIONARY, path, ()))
+            return False
+
+        valid = True
+        dict_keys = set(value.keys())
+        missed_keys = self.mandatory_keys.difference(dict_keys)
+        if len(missed_keys) > 0:
+            errors.append((config_errors.MISSING_KEYS,
+                           path, (sorted(missed_keys),)))
+            valid = False
+
+        if self.strict_keys_set:
+            unknown_keys = dict_keys.difference(self.valid_keys)
+            if len(unknown_keys) > 0:
+                errors.append((config_errors.UNKNOWN_KEYS,
+                               path, (sorted(unknown_keys),)))
+                valid = False
+
+        if valid:
+            get_key_rule = self.get_key_rule
+            valid = self._check_items(
+                (((path, ITEM, key), value[key], rule)
+                 for key, rule in ((key, get_key_rule(key)) for key in value)
+                 if rule is not None),
+                path, errors)
+
+        return valid
+
+
+class MetaRule(CompositeRule):
+    """Complex rule, to validate a value with a set of alternative rules.
+    The value is valid if at least one of alternatives says 'ok'.
+    Errors of alternatives are reported only if all of them failed.
+    Only alternatives, that accept the type of value (and the presence of
+    discriminator key in dictionaries), are tried (see 'index_alternatives()'
+    and 'find_discriminator()'), but if none of them is valid, all of
+    alternatives are checked to report their errors."""
+
+    def __init__(self, discriminator=None):
+        self.alternatives = []
+        # declared discriminator key of dictionary alternatives
+        self.discriminator = discriminator
+        # built on the first check, when nested rules are complete
+        self._types_index = None
+        self._discriminator = None
+
+    def add_child(self, rule, slot):
+        self.alternatives.append(rule)
+        self._types_index = None
+
+    def accepts_type(self, value_type):
+        for alternative in self.alternatives:
+            if alternative.accepts_type(value_type):
+                return True
+        return False
+
+    def accepts_key(self, key, present):
+        for alternative in self.alternatives:
+            if (alternative.accepts_type(dict)
+                    and alternative.accepts_key(key, present)):
+                return True
+        return False
+
+    def _build_index(self):
+        self._types_index = index_alternatives(
+            self.alternatives,
+            lambda alternative, value_type:
+                alternative.accepts_type(value_type))
+        dict_alternatives = self._types_index.get(dict, self.alternatives)
+        self._discriminator = find_discriminator(
+            dict_alternatives,
+            discriminator_keys(
+                self.discriminator,
+                [alternative.mandatory_keys
+                 for alternative in dict_alternatives
+                 if isinstance(alternative, DictRule)]),
+            lambda alternative, key, present:
+                alternative.accepts_key(key, present))
+
+    def _candidates(self, value):
+        """Returns alternatives, that may accept the value, or None,
+        if all of alternatives should be tried."""
+        if self._types_index is None:
+            self._build_index()
+        value_type = type(value)
+        if value_type is dict and self._discriminator is not None:
+            key, with_key, without_key = self._discriminator
+            return with_key if key in value else without_key
+        return self._types_index.get(value_type)
+
+    def is_valid(self, value):
+        alternatives = self._candidates(value)
+        if alternatives is None:
+            alternatives = self.alternatives
+        for alternative in alternatives:
+            if alternative.is_valid(value):
+                return True
+        return False
+
+    def check(self, value, path, errors):
+        candidates = self._candidates(value)
+        if candidates is not None:
+            for alternative in candidates:
+                if alternative.is_valid(value):
+                    return True
+
+        alternatives_errors = new_errors_buffer(errors)
+        index = 1
+        for alternative in self.alternatives:
+            try:
+                if alternative.check(value, (path, ALTERNATIVE, index),
+                                     alternatives_errors):
+                    return True
+            except ErrorsLimitReached as error:
+                if error.collector is not alternatives_errors:
+                    raise
+            index += 1
+
+        errors.append((config_errors.ALTERNATIVES, path, ()))
+        errors.extend(alternatives_errors)
+        return False
+
+
+class ValidationResult(object):
+    """Result of validation of a value with a compiled schema.
+    'records' is a list of error records, 'errors' renders them to
+    error messages on the first access."""
+
+    def __init__(self, is_valid, records, truncated=False):
+        self.is_valid = is_valid
+        self.records = records
+        # True, if validation was stopped by the errors budget
+        self.truncated = truncated
+        self._errors = None
+
+    def __nonzero__(self):
+        return self.is_valid
+
+    @property
+    def errors(self):
+        if self._errors is None:
+            self._errors = config_errors.render_errors(self.records)
+        return self._errors
+
+    def get_all_errors(self):
+        """Same as 'get_all_errors()' of basic rules: a list of error
+        messages or None."""
+        if self.records:
+            return self.errors
+        else:
+            return None
+
+    def get_all_error_records(self):
+        """Like 'get_all_errors()', but returns error records."""
+        if self.records:
+            return config_errors.records(self.records)
+        else:
+            return None
+
+
+class CompiledSchema(object):
+    """Base class for products of rules scheme compilation.
+    Compiled schema does not depend on the value, so it can be built once
+    and used to validate any number of values.
+    Shouldn't be used directly."""
+
+    def validate(self, value, max_errors=None, error_sink=None):
+        """Validates the value and returns ValidationResult.
+        If 'max_errors' is given, validation stops as soon as there is
+        no room for one more error and the result is marked as truncated.
+        If 'error_sink' callable is given, it gets each error record as
+        soon as it is found (see ErrorsSink), and the result has no
+        records."""
+        if max_errors is None and error_sink is None:
+            errors = []
+            is_valid = self._check(value, '', errors)
+            return ValidationResult(is_valid, errors)
+
+        if error_sink is None:
+            errors = records = ErrorsCollector(max_errors)
+        else:
+            errors = ErrorsSink(error_sink, max_errors)
+            records = ()
+        try:
+            is_valid = self._check(value, '', errors)
+        except ErrorsLimitReached:
+            return ValidationResult(False, list(records), truncated=True)
+        return ValidationResult(is_valid, list(records))
+
+    def is_valid(self, value):
+        """Returns 'ok' for the value. It is much cheaper than 'validate()':
+        it stops on the first failure and never formats error messages.
+        Subclasses should override it, by default it calls 'validate()'."""
+        return self.validate(value).is_valid
+
+    def bind(self, value):
+        """Returns an object, that can be used in place of the root of
+        basic rules tree built for the value."""
+        return BoundSchema(self, value)
+
+    def _check(self, value, path, errors):
+        raise NotImplementedError()
+
+
+class RulesTreeSchema(CompiledSchema):
+    """Compiled schema, that is a tree of value-independent rules."""
+
+    def __init__(self, root_rule):
+        self.root_rule = root_rule
+
+    def _check(self, value, path, errors):
+        return self.root_rule.check(value, path, errors)
+
+    def is_valid(self, value):
+        return self.root_rule.is_valid(value)
+
+
+class BoundSchema(object):
+    """Compiled schema bound to a value. It has the same interface as the
+    root of basic rules tree: 'validate()' and 'get_all_errors()'."""
+
+    def __init__(self, schema, value):
+        self.schema = schema
+        self.value = value
+        self.path = '/'
+        self._result = None
+
+    def validate(self):
+        self._result = self.schema.validate(self.value)
+        return self._result.is_valid
+
+    def is_valid(self):
+        return self.schema.is_valid(self.value)
+
+    def get_all_errors(self):
+        if self._result is None:
+            return None
+        return self._result.get_all_errors()
+
+    def get_all_error_records(self):
+        if self._result is None:
+            return None
+        return self._result.get_all_error_records()
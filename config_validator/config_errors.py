@@ -0,0 +1,114 @@
+# Rules report errors as compact records: an error code, the path of
+# the invalid value and parameters of the failed check (like 'min_length'
+# or missing keys). Text of error message is rendered only when someone
+# asks for it, so validation does not pay for formatting of messages,
+# that are never read, and programs can inspect errors without parsing
+# English text.
+# Paths of values are kept linked to the paths of parents (see
+# 'config_paths') and are joined into text only with the message.
+
+from config_paths import render_path
+
+# Error codes.
+INTEGER = 'integer'
+BOOLEAN = 'boolean'
+STRING = 'string'
+NOT_EMPTY_STRING = 'not_empty_string'
+STRING_OF_UNSIGNED_INTEGERS = 'string_of_unsigned_integers'
+LIST = 'list'
+DICTIONARY = 'dictionary'
+MIN_LENGTH = 'min_length'
+MAX_LENGTH = 'max_length'
+MISSING_KEYS = 'missing_keys'
+UNKNOWN_KEYS = 'unknown_keys'
+NESTED = 'nested'
+ALTERNATIVES = 'alternatives'
+CYCLE = 'cycle'
+
+# Templates of error messages. The first argument is the path, the rest
+# are parameters of the error.
+MESSAGES = {
+    INTEGER: "Config Error at %s : value must be integer.",
+    BOOLEAN: "Config Error at %s : value must be boolean.",
+    STRING: "Config Error at %s : value must be string.",
+    NOT_EMPTY_STRING: "Config Error at %s : value must "
+                      "be not empty string.",
+    STRING_OF_UNSIGNED_INTEGERS: "Config Error at %s : value must be not"
+                                 " empty string representing unsigned"
+                                 " integer.",
+    LIST: "Config Error at %s : value must be list.",
+    DICTIONARY: "Config Error at %s : value must be dictionary.",
+    MIN_LENGTH: "Config Error at %s : the value must have "
+                "at list %d items.",
+    MAX_LENGTH: "Config Error at %s : the value must have "
+                "not more than %d items.",
+    MISSING_KEYS: "Config Error at %s : missing key(s): %s.",
+    UNKNOWN_KEYS: "Config Error at %s : unknown key(s): %s.",
+    NESTED: "Config Error at %s : each of nested values must be valid.",
+    ALTERNATIVES: "Config Error at %s : All allowed alternatives "
+                  "are not valid.",
+    CYCLE: "Config Error at %s : value contains itself, it is the same "
+           "object as the value at %s.",
+}
+
+
+class ConfigError(tuple):
+    """Error record: a tuple of error code, path of the value and a tuple of
+    parameters. Empty path means the root of config.
+    Rules report errors as plain (code, path, params) tuples, which are
+    the cheapest objects to create, 'record()' turns them into ConfigErrors
+    and renders their paths to text.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, code, path, *params):
+        return tuple.__new__(cls, (code, path, params))
+
+    code = property(lambda self: self[0])
+    path = property(lambda self: self[1])
+    params = property(lambda self: self[2])
+
+    def render(self):
+        """Returns text of the error message."""
+        return render_error(self)
+
+    __str__ = render
+
+    def __repr__(self):
+        return 'ConfigError(%s)' % ', '.join(
+            repr(arg) for arg in (self.code, self.path) + self.params)
+
+
+def record(error, paths_texts=None):
+    """Returns ConfigError for the (code, path, params) tuple. Custom rules
+    may still report errors as plain strings, they are returned as is.
+    'paths_texts' is passed to 'config_paths.render_path()'."""
+    if isinstance(error, (basestring, ConfigError)):
+        return error
+    code, path, params = error
+    return tuple.__new__(ConfigError,
+                         (code, render_path(path, paths_texts), params))
+
+
+def render_error(error, paths_texts=None):
+    """Returns text of the error. Plain string errors are returned as is.
+    'paths_texts' is passed to 'config_paths.render_path()'."""
+    if isinstance(error, basestring):
+        return error
+    code, path, params = error
+    return MESSAGES[code] % ((render_path(path, paths_texts) or '/',)
+                             + params)
+
+
+def render_errors(errors):
+    """Returns texts of the errors. Paths are rendered once for all of
+    errors, so common parent paths are not joined again for each error."""
+    paths_texts = {}
+    return [render_error(error, paths_texts) for error in errors]
+
+
+def records(errors):
+    """Returns ConfigErrors for the errors, like 'render_errors()'."""
+    paths_texts = {}
+    return [record(error, paths_texts) for error in errors]
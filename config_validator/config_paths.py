@@ -0,0 +1,76 @@
+# Rules report the path of each invalid value, like '/handlers/0/level'.
+# But most of values are valid, and building a path string for each of them
+# costs a string copy of the whole parent path, so deep configs pay
+# O(depth) for every value. Instead a path is linked to the path of the
+# parent value: it is a tuple (parent path, template, item), where the item
+# is a key or an index of the value (or a number of alternative), and
+# the template formats it. Text of the path is joined only when someone
+# asks for it, usually to render an error message.
+# Plain strings are paths too: the root path is '', and custom rules may
+# still use string paths.
+
+# Templates of path segments.
+ITEM = '/%s'
+ALTERNATIVE = '(alt.#%d)'
+
+
+def child_path(parent, key):
+    """Returns the path of the nested value 'key' (a key of dictionary or
+    an index of list) of the value at the parent path. Handlers of complex
+    rules build paths of nested values with it, because paths may be
+    tuples and can not be joined like strings."""
+    return (parent, ITEM, key)
+
+
+def render_path(path, texts=None):
+    """Returns text of the path, like '/a/b/0'. The root path is ''.
+    'texts' is an optional dictionary, that keeps texts of rendered paths
+    by their ids, so paths with common parents are rendered faster. It
+    keeps the rendered paths too, so their ids are not reused by other
+    paths (like paths rebased only to be rendered)."""
+    if isinstance(path, basestring):
+        return path
+
+    if texts is None:
+        segments = []
+        while not isinstance(path, basestring):
+            path, template, item = path
+            segments.append(template % (item,))
+        segments.append(path)
+        segments.reverse()
+        return ''.join(segments)
+
+    paths = []
+    text = None
+    while not isinstance(path, basestring):
+        entry = texts.get(id(path))
+        if entry is not None:
+            text = entry[1]
+            break
+        paths.append(path)
+        path = path[0]
+    else:
+        text = path
+
+    for path in reversed(paths):
+        text += path[1] % (path[2],)
+        texts[id(path)] = (path, text)
+    return text
+
+
+def rebase_path(path, base, new_base):
+    """Returns the path with its parent path 'base' replaced by 'new_base'
+    (parent paths are found by identity). Paths, that are not nested in
+    'base', are returned as is."""
+    segments = []
+    nested_path = path
+    while nested_path is not base:
+        if isinstance(nested_path, basestring):
+            return path
+        segments.append(nested_path)
+        nested_path = nested_path[0]
+
+    path = new_base
+    for segment in reversed(segments):
+        path = (path, segment[1], segment[2])
+    return path
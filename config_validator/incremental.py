@@ -0,0 +1,479 @@
+# A control plane may change a few values of a large config at a time, and
+# each change would cost building and validating the whole rules tree again.
+# Here we introduce the incremental validation: it keeps the rules tree of
+# the config and, given the paths of changed values (or a JSON Patch, that
+# changes them), rebuilds only the rules of changed values. Key sets of
+# their parent dictionaries are checked again, and results of nested rules
+# are passed up to the root through the parent rules only.
+
+import copy
+
+from basic_rules import (CycleNode, DictNode, ListNode, Node, SharedNode,
+                         _OTHER, _SHARED)
+from config_paths import ITEM
+import config_errors
+
+
+# Rules, that are updated in place: rules of other types are built again
+# with all of their nested rules.
+_INCREMENTAL_RULES = (DictNode, ListNode)
+
+
+def parse_pointer(pointer):
+    """Returns tokens of JSON Pointer (RFC 6901): '/a/0' -> ['a', '0'].
+    The empty pointer points to the whole config."""
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError('Bad JSON pointer: %r.' % (pointer,))
+    return [token.replace('~1', '/').replace('~0', '~')
+            for token in pointer[1:].split('/')]
+
+
+def _dict_key(container, token, known_keys=()):
+    """Returns the key of dictionary for the token. Tokens of pointers are
+    strings, so integer keys are found by their text too."""
+    if token in container or token in known_keys:
+        return token
+    if isinstance(token, basestring) and token.lstrip('-').isdigit():
+        number = int(token)
+        if number in container or number in known_keys:
+            return number
+    return token
+
+
+def _list_index(token):
+    """Returns the index of list for the token or None."""
+    if isinstance(token, (int, long)) and not isinstance(token, bool):
+        return token
+    if isinstance(token, basestring) and token.isdigit():
+        return int(token)
+    return None
+
+
+def _is_valid(rule):
+    """Returns the result of the validated rule. Rules keep their errors,
+    so most of them are valid, if they have no errors."""
+    if rule._rule_kind is _OTHER or rule._rule_kind is _SHARED:
+        return bool(rule.is_valid())
+    return not rule._errors
+
+
+def _has_own_errors(rule):
+    """Returns True, if the value of the complex rule itself is invalid:
+    the rule has errors except the error of invalid nested values."""
+    errors = rule._errors
+    return bool(errors) and not (len(errors) == 1
+                                 and errors[0][0] == config_errors.NESTED)
+
+
+class UpdateResult(object):
+    """Result of validation of the changed config: true, if the config is
+    valid. Error messages of the whole config are rendered only when they
+    are asked for, so a change, that is checked only for validity, costs
+    the update of changed rules alone. Errors are of the config at the time
+    of the call of 'get_all_errors()': ask for them before the next
+    change."""
+
+    __slots__ = ('is_valid', '_validation')
+
+    def __init__(self, validation):
+        self.is_valid = validation.is_valid()
+        self._validation = validation
+
+    def __nonzero__(self):
+        return self.is_valid
+
+    def get_all_errors(self, max_errors=None):
+        return self._validation.get_all_errors(max_errors)
+
+    def get_all_error_records(self, max_errors=None):
+        return self._validation.get_all_error_records(max_errors)
+
+
+class IncrementalValidation(object):
+    """Validation state of a config: the rules tree, that is built by the
+    director (it should build basic rules trees, like BasicRulesDirector).
+    Change the config in place and pass paths of changed values to
+    'update()', or pass a JSON Patch to 'apply_patch()', and only changed
+    values are validated again.
+    Paths are JSON Pointers (like '/handlers/h/level') or sequences of keys
+    and indexes. A change of a value means a change of all of its nested
+    values. Values, that are shared by several places of config (see
+    '_handle_value_message()' of the director), are validated again with
+    the whole config, when they are changed."""
+
+    def __init__(self, director, config):
+        self._director = director
+        self._config = config
+        self._rules = None
+        # ids of rules of dictionaries -> (rule, positions of nested rules
+        # by keys)
+        self._positions = {}
+        # ids of rules of dictionaries and lists -> (rule, number of its
+        # invalid nested rules)
+        self._invalid_counts = {}
+        self.validate()
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def rules(self):
+        """The rules tree of the config."""
+        return self._rules
+
+    def validate(self):
+        """Validates the whole config again. Returns UpdateResult."""
+        rules = self._director.build_rules_tree(self._config)
+        if not isinstance(rules, Node):
+            raise TypeError('Incremental validation needs basic rules trees,'
+                            ' got %r.' % (rules,))
+        rules.validate()
+        self._rules = rules
+        self._positions = {}
+        self._invalid_counts = {}
+        return UpdateResult(self)
+
+    def is_valid(self):
+        return _is_valid(self._rules)
+
+    def get_all_errors(self, max_errors=None):
+        """Returns error messages of the config or None, see
+        'Node.get_all_errors()'. Valid parts of the rules tree are not
+        walked, so it is fast for configs with a few errors."""
+        return self._rules.get_all_errors(max_errors)
+
+    def get_all_error_records(self, max_errors=None):
+        return self._rules.get_all_error_records(max_errors)
+
+    def update(self, changed_paths):
+        """Validates the changed values of config again, the config should
+        be already changed. Returns UpdateResult."""
+        keys_lists = sorted((tuple(parse_pointer(path))
+                             if isinstance(path, basestring)
+                             else tuple(path)
+                             for path in changed_paths), key=len)
+        # nested values of changed values are validated with them
+        updated = set()
+        for keys in keys_lists:
+            if any(keys[:length] in updated
+                   for length in xrange(len(keys) + 1)):
+                continue
+            updated.add(keys)
+            self._update(keys)
+        return UpdateResult(self)
+
+    def apply_patch(self, patch):
+        """Applies the JSON Patch (RFC 6902), a list of operations, to
+        the config and validates the changed values again. Returns
+        UpdateResult.
+        Raises ValueError for bad operations and failed 'test' operations,
+        then the operations before it are still applied and validated."""
+        changed_paths = []
+        try:
+            for operation in patch:
+                changed_paths.extend(self._apply_operation(operation))
+        finally:
+            if changed_paths:
+                self.update(changed_paths)
+        return UpdateResult(self)
+
+    def _apply_operation(self, operation):
+        """Applies one operation of JSON Patch to the config. Returns keys
+        lists of changed values."""
+        op = operation.get('op')
+        keys = parse_pointer(operation.get('path', ''))
+        if op == 'test':
+            if self._get(keys) != operation.get('value'):
+                raise ValueError('Test of JSON patch failed at %r.'
+                                 % (operation['path'],))
+            return []
+        if op == 'add':
+            return [self._add(keys, operation['value'])]
+        if op == 'remove':
+            return [self._remove(keys)]
+        if op == 'replace':
+            return [self._replace(keys, operation['value'])]
+        if op in ('move', 'copy'):
+            from_keys = parse_pointer(operation['from'])
+            value = self._get(from_keys)
+            if op == 'copy':
+                return [self._add(keys, copy.deepcopy(value))]
+            if from_keys == keys[:len(from_keys)] and from_keys != keys:
+                raise ValueError('Can not move a value into itself: %r.'
+                                 % (operation['path'],))
+            return [self._remove(from_keys), self._add(keys, value)]
+        raise ValueError('Unknown operation of JSON patch: %r.' % (op,))
+
+    def _get(self, keys):
+        value = self._config
+        try:
+            for token in keys:
+                if isinstance(value, list):
+                    index = _list_index(token)
+                    if index is None:
+                        raise KeyError(token)
+                    value = value[index]
+                else:
+                    value = value[_dict_key(value, token)]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError('No value at %r.' % (list(keys),))
+        return value
+
+    def _add(self, keys, value):
+        if not keys:
+            self._config = value
+            return ()
+        parent = self._get(keys[:-1])
+        if isinstance(parent, list):
+            index = (len(parent) if keys[-1] == '-'
+                     else _list_index(keys[-1]))
+            if index is None or index > len(parent):
+                raise ValueError('Bad index of list at %r.' % (list(keys),))
+            parent.insert(index, value)
+            if index == len(parent) - 1:
+                return tuple(keys[:-1]) + (index,)
+            # indexes of the rest of items are changed
+            return keys[:-1]
+        if not isinstance(parent, dict):
+            raise ValueError('No container at %r.' % (list(keys[:-1]),))
+        key = _dict_key(parent, keys[-1])
+        parent[key] = value
+        return tuple(keys[:-1]) + (key,)
+
+    def _remove(self, keys):
+        if not keys:
+            raise ValueError('Can not remove the whole config.')
+        parent = self._get(keys[:-1])
+        self._get(keys)
+        if isinstance(parent, list):
+            index = _list_index(keys[-1])
+            del parent[index]
+            if index == len(parent):
+                return tuple(keys[:-1]) + (index,)
+            return keys[:-1]
+        key = _dict_key(parent, keys[-1])
+        del parent[key]
+        return tuple(keys[:-1]) + (key,)
+
+    def _replace(self, keys, value):
+        if not keys:
+            self._config = value
+            return ()
+        parent = self._get(keys[:-1])
+        self._get(keys)
+        if isinstance(parent, list):
+            index = _list_index(keys[-1])
+            parent[index] = value
+            return tuple(keys[:-1]) + (index,)
+        key = _dict_key(parent, keys[-1])
+        parent[key] = value
+        return tuple(keys[:-1]) + (key,)
+
+    def _update(self, keys):
+        """Validates the value at the path of keys again. Walks rules of
+        parent values down to the changed value, the first rule on the way,
+        that is not updated in place (a meta rule, a shared value or a rule
+        with invalid value itself), is built again with all of its nested
+        rules."""
+        node = self._rules
+        if (not keys or type(node) not in _INCREMENTAL_RULES
+                or _has_own_errors(node)):
+            self.validate()
+            return
+
+        definition = self._director.rules_scheme
+        value = self._config
+        path = ''
+        # frames of parent rules: [rule, rule definition, value, path,
+        # key of the next value, position of its rule]
+        parents = []
+
+        for depth, token in enumerate(keys):
+            if type(node) is ListNode:
+                key = _list_index(token)
+                position = key
+                present = True
+                if not isinstance(value, list) or key is None:
+                    return self._rebuild(parents, node, definition, value,
+                                         path)
+                length = len(node._children)
+                if len(value) != length:
+                    if (key != max(len(value), length) - 1
+                            or abs(len(value) - length) != 1):
+                        # indexes of items are changed
+                        return self._rebuild(parents, node, definition,
+                                             value, path)
+                    # the last item is appended or removed, like a key
+                    # of dictionary
+                    present = key < len(value)
+                    if key == length:
+                        position = None
+                elif not 0 <= key < length:
+                    return self._rebuild(parents, node, definition, value,
+                                         path)
+            else:
+                if not isinstance(value, dict):
+                    return self._rebuild(parents, node, definition, value,
+                                         path)
+                positions = self._get_positions(node)
+                key = _dict_key(value, token, positions)
+                position = positions.get(key)
+                present = key in value
+
+            try:
+                nested_definition = self._director.nested_definition(
+                    definition, key)
+            except NotImplementedError:
+                return self._rebuild(parents, node, definition, value, path)
+
+            parents.append([node, definition, value, path, key, position])
+            nested_path = (path, ITEM, key)
+
+            if position is None or not present:
+                # the key is added or removed
+                return self._change_keys(parents, nested_definition,
+                                         nested_path)
+
+            nested_node = node._children[position]
+            if isinstance(nested_node, (SharedNode, CycleNode)):
+                # the value is at other places of config too
+                self.validate()
+                return
+            if (depth == len(keys) - 1
+                    or type(nested_node) not in _INCREMENTAL_RULES
+                    or _has_own_errors(nested_node)):
+                return self._rebuild(parents[:-1], node, definition, value,
+                                     path, position, nested_definition,
+                                     value[key], nested_path)
+
+            node = nested_node
+            definition = nested_definition
+            value = value[key]
+            path = nested_path
+
+    def _rebuild(self, parents, node, definition, value, path,
+                 position=None, nested_definition=None, nested_value=None,
+                 nested_path=None):
+        """Builds the rule of the value again. Without 'position' it is
+        the rule 'node', the last of parents is its parent; with 'position'
+        it is the nested rule of 'node' at the position."""
+        if position is None:
+            if not parents:
+                self.validate()
+                return
+            parent = parents.pop()
+            position = parent[5]
+            nested_definition, nested_value, nested_path = \
+                definition, value, path
+            node, definition, value, path = parent[:4]
+        parents.append([node, definition, value, path, None, position])
+
+        old_rule = node._children[position]
+        rule = self._build(parents, nested_definition, nested_value,
+                           nested_path)
+        node._children[position] = rule
+        self._forget_rules(old_rule)
+        self._propagate(parents, _is_valid(old_rule), _is_valid(rule))
+
+    def _change_keys(self, parents, nested_definition, nested_path):
+        """The key of the last of parents is added to or removed from its
+        dictionary (or the last item is appended to or removed from its
+        list): checks the dictionary itself again and adds or removes
+        the nested rule."""
+        node, definition, value, path, key, position = parents[-1]
+        if type(node) is ListNode:
+            present = key < len(value)
+        else:
+            present = key in value
+        nested_errors = node._errors
+        node._errors = None
+        if not node.check_value():
+            node._errors = nested_errors
+            return self._rebuild(parents[:-1], node, definition, value, path)
+        node._errors = nested_errors
+
+        was_valid = is_valid = True
+        if position is not None:
+            old_rule = node._children[position]
+            del node._children[position]
+            self._forget_rules(old_rule)
+            # positions of the rest of nested rules are changed
+            self._positions.pop(id(node), None)
+            was_valid = _is_valid(old_rule)
+        if present and nested_definition is not None:
+            rule = self._build(parents, nested_definition, value[key],
+                               nested_path)
+            node.add_child(rule)
+            if id(node) in self._positions:
+                self._positions[id(node)][1][key] = len(node._children) - 1
+            is_valid = _is_valid(rule)
+        self._propagate(parents, was_valid, is_valid)
+
+    def _build(self, parents, rule_definition, value, path):
+        """Builds and validates the rules of the value."""
+        rule = self._director.build_rules_subtree(
+            rule_definition, value, path,
+            [(parent[1], parent[2], parent[3]) for parent in parents])
+        rule.validate()
+        return rule
+
+    def _propagate(self, parents, was_valid, is_valid):
+        """A nested rule of the last of parents changed its result: updates
+        results of parents up to the root, while they are changed. Parents
+        keep numbers of their invalid nested rules, so a change costs
+        the same for parents with any number of nested rules."""
+        for parent in reversed(parents):
+            if was_valid == is_valid:
+                return
+            node = parent[0]
+            invalid_count = self._count_invalid(node, 1 if was_valid else -1)
+            was_valid = not node._errors
+            if invalid_count:
+                node._errors = [(config_errors.NESTED, node._path, ())]
+            else:
+                node._errors = None
+            is_valid = not node._errors
+
+    def _count_invalid(self, node, change):
+        """Returns the number of invalid nested rules of the rule, after
+        the result of one of them is changed: 'change' is added to the kept
+        number. Nested rules are counted, when the rule has no number yet,
+        they are already changed then."""
+        entry = self._invalid_counts.get(id(node))
+        if entry is None or entry[0] is not node:
+            invalid_count = sum(1 for rule in node._children
+                                if not _is_valid(rule))
+        else:
+            invalid_count = entry[1] + change
+        self._invalid_counts[id(node)] = (node, invalid_count)
+        return invalid_count
+
+    def _get_positions(self, node):
+        """Returns positions of nested rules of the dictionary's rule by
+        their keys."""
+        entry = self._positions.get(id(node))
+        if entry is None or entry[0] is not node:
+            entry = (node, dict((rule._path[2], position)
+                                for position, rule
+                                in enumerate(node._children)))
+            self._positions[id(node)] = entry
+        return entry[1]
+
+    def _forget_rules(self, rule):
+        """Forgets positions and numbers of invalid nested rules of the rule
+        and its nested rules, which are not in the rules tree any more. They
+        are kept only for rules on the way to changed values, that are
+        updated in place, so only such rules of the subtree are walked."""
+        positions = self._positions
+        invalid_counts = self._invalid_counts
+        rules = [rule]
+        while rules and (positions or invalid_counts):
+            rule = rules.pop()
+            if type(rule) in _INCREMENTAL_RULES:
+                positions.pop(id(rule), None)
+                invalid_counts.pop(id(rule), None)
+                rules.extend(nested_rule for nested_rule in rule._children
+                             if type(nested_rule) in _INCREMENTAL_RULES)
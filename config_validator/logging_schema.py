@@ -5,7 +5,9 @@ custom_logging_object = {
             'type': 'not_empty_string'
         }  # TODO: check if it is a valid callable object
     },
-    'strict_keys_set': False
+    'strict_keys_set': False,
+    # compiled schemas check objects with '()' key only with this rule
+    'discriminator': '()'
 }
 
 logging_schema = {
@@ -0,0 +1,437 @@
+# Instructions array backend for the rules scheme compilation.
+# The compiled schema here is a flat array of instructions (tuples), where
+# complex rules refer to nested rules by their indexes in the array.
+# Validation is made by a small interpreter loop with an explicit stack,
+# so there are no rule objects and no python call per validated value.
+# Only alternatives of meta rules are checked with nested runs of the loop.
+# Instructions:
+#  (OP_INTEGER,), (OP_BOOLEAN,), (OP_STRING,), (OP_NOT_EMPTY_STRING,),
+#  (OP_UNSIGNED_INTEGER_STRING,) - simple type checks;
+#  (OP_LIST, min_length, max_length, allowed_index) - length bounds and
+#  iteration over list items;
+#  (OP_DICT, mandatory_keys, valid_keys, strict_keys_set, keys_indexes,
+#  allowed_index) - keys set checks and iteration over dictionary values;
+#  (OP_META, alternatives_indexes, types_index, discriminator) - alternative
+#  branches, indexes of alternatives, that accept values of some types, and
+#  a (key, indexes for dictionaries with the key, indexes for dictionaries
+#  without it) tuple or None (see 'compiled_rules.index_alternatives()' and
+#  'compiled_rules.find_discriminator()').
+# Missing nested rule index is -1.
+
+import compiled_rules
+import config_errors
+from config_paths import ITEM, ALTERNATIVE
+from compiled_builder import SchemaRulesBuilder
+from basic_builder import RulesBuilderMixIn
+
+
+OP_INTEGER = 0
+OP_BOOLEAN = 1
+OP_STRING = 2
+OP_NOT_EMPTY_STRING = 3
+OP_UNSIGNED_INTEGER_STRING = 4
+OP_LIST = 5
+OP_DICT = 6
+OP_META = 7
+
+# Interpreter tasks.
+_CHECK = 0
+_FINISH = 1
+
+
+def _meta_candidates(instruction, value):
+    """Returns indexes of alternatives of OP_META instruction, that may
+    accept the value, or None, if all of alternatives should be tried."""
+    value_type = type(value)
+    if value_type is dict and instruction[3] is not None:
+        key, with_key, without_key = instruction[3]
+        return with_key if key in value else without_key
+    return instruction[2].get(value_type)
+
+
+def run_program(program, value, path, errors, index=0):
+    """Checks the value with the program (or its part, that starts at
+    the index), appends error records to the 'errors' list and returns
+    'ok'. Frames of composite rules are one-item lists with their 'ok'."""
+    result = False
+    stack = [(_CHECK, index, value, path, None)]
+
+    while stack:
+        task = stack.pop()
+
+        if task[0] == _CHECK:
+            _, index, value, path, frame = task
+            instruction = program[index]
+            op = instruction[0]
+
+            if op == OP_INTEGER:
+                ok = type(value) == int
+                if not ok:
+                    errors.append((config_errors.INTEGER, path, ()))
+
+            elif op == OP_BOOLEAN:
+                ok = isinstance(value, bool)
+                if not ok:
+                    errors.append((config_errors.BOOLEAN, path, ()))
+
+            elif op <= OP_UNSIGNED_INTEGER_STRING:
+                ok = isinstance(value, basestring)
+                if not ok:
+                    errors.append((config_errors.STRING, path, ()))
+                elif op >= OP_NOT_EMPTY_STRING and len(value) == 0:
+                    ok = False
+                    errors.append((config_errors.NOT_EMPTY_STRING, path, ()))
+                elif op == OP_UNSIGNED_INTEGER_STRING \
+                        and not value.isdigit():
+                    ok = False
+                    errors.append((config_errors.STRING_OF_UNSIGNED_INTEGERS,
+                                   path, ()))
+
+            elif op == OP_LIST:
+                _, min_length, max_length, allowed = instruction
+                ok = isinstance(value, list)
+                if not ok:
+                    errors.append((config_errors.LIST, path, ()))
+                else:
+                    if min_length is not None and len(value) < min_length:
+                        ok = False
+                        errors.append((config_errors.MIN_LENGTH,
+                                       path, (min_length,)))
+                    if max_length is not None and len(value) > max_length:
+                        ok = False
+                        errors.append((config_errors.MAX_LENGTH,
+                                       path, (max_length,)))
+                    if ok and allowed >= 0 and value:
+                        composite = [True]
+                        stack.append((_FINISH, composite, len(errors), path,
+                                      frame))
+                        for item_index in xrange(len(value) - 1, -1, -1):
+                            stack.append((_CHECK, allowed, value[item_index],
+                                          (path, ITEM, item_index),
+                                          composite))
+                        continue
+
+            elif op == OP_DICT:
+                (_, mandatory_keys, valid_keys, strict_keys_set,
+                 keys_indexes, allowed) = instruction
+                ok = isinstance(value, dict)
+                if not ok:
+                    errors.append((config_errors.DICTIONARY, path, ()))
+                else:
+                    dict_keys = set(value.keys())
+                    missed_keys = mandatory_keys.difference(dict_keys)
+                    if len(missed_keys) > 0:
+                        ok = False
+                        errors.append((config_errors.MISSING_KEYS,
+                                       path, (sorted(missed_keys),)))
+                    if strict_keys_set:
+                        unknown_keys = dict_keys.difference(valid_keys)
+                        if len(unknown_keys) > 0:
+                            ok = False
+                            errors.append((config_errors.UNKNOWN_KEYS,
+                                           path, (sorted(unknown_keys),)))
+                    if ok:
+                        checks = []
+                        for key in value:
+                            key_index = keys_indexes.get(key, allowed)
+                            if key_index >= 0:
+                                checks.append((key_index, key))
+                        if checks:
+                            composite = [True]
+                            stack.append((_FINISH, composite, len(errors),
+                                          path, frame))
+                            for key_index, key in reversed(checks):
+                                stack.append((_CHECK, key_index, value[key],
+                                              (path, ITEM, key), composite))
+                            continue
+
+            else:
+                ok = False
+                candidates = _meta_candidates(instruction, value)
+                if candidates is not None:
+                    for alternative in candidates:
+                        if program_is_valid(program, value, alternative):
+                            ok = True
+                            break
+
+                if not ok:
+                    # all of alternatives are checked to report errors
+                    alternatives_errors = \
+                        compiled_rules.new_errors_buffer(errors)
+                    alternative_number = 1
+                    for alternative in instruction[1]:
+                        try:
+                            ok = run_program(program, value,
+                                             (path, ALTERNATIVE,
+                                              alternative_number),
+                                             alternatives_errors, alternative)
+                        except compiled_rules.ErrorsLimitReached as error:
+                            # the alternative overflows the errors budget
+                            if error.collector is not alternatives_errors:
+                                raise
+                        if ok:
+                            break
+                        alternative_number += 1
+                    if not ok:
+                        errors.append((config_errors.ALTERNATIVES, path, ()))
+                        errors.extend(alternatives_errors)
+
+        else:
+            _, composite, first_error, path, frame = task
+            ok = composite[0]
+            if not ok:
+                errors.insert(first_error,
+                              (config_errors.NESTED, path, ()))
+
+        # Report the result to the frame of the parent rule.
+        if frame is None:
+            result = ok
+        elif not ok:
+            frame[0] = False
+
+    return result
+
+
+def program_is_valid(program, value, index=0):
+    """Returns 'ok' of the value for the program (or its part, that starts
+    at the index) without error messages. Stops on the first failure.
+    Alternatives of meta rules are checked with nested calls, the rest of
+    nested values go to the stack in any order."""
+    stack = [(index, value)]
+
+    while stack:
+        index, value = stack.pop()
+        instruction = program[index]
+        op = instruction[0]
+
+        if op == OP_INTEGER:
+            if type(value) != int:
+                return False
+
+        elif op == OP_BOOLEAN:
+            if not isinstance(value, bool):
+                return False
+
+        elif op <= OP_UNSIGNED_INTEGER_STRING:
+            if not isinstance(value, basestring):
+                return False
+            if op == OP_NOT_EMPTY_STRING and len(value) == 0:
+                return False
+            # isdigit() is False for empty strings
+            if op == OP_UNSIGNED_INTEGER_STRING and not value.isdigit():
+                return False
+
+        elif op == OP_LIST:
+            _, min_length, max_length, allowed = instruction
+            if not isinstance(value, list):
+                return False
+            if min_length is not None and len(value) < min_length:
+                return False
+            if max_length is not None and len(value) > max_length:
+                return False
+            if allowed >= 0:
+                stack.extend((allowed, item) for item in value)
+
+        elif op == OP_DICT:
+            (_, mandatory_keys, valid_keys, strict_keys_set,
+             keys_indexes, allowed) = instruction
+            if not isinstance(value, dict):
+                return False
+            for key in mandatory_keys:
+                if key not in value:
+                    return False
+            if strict_keys_set:
+                for key in value:
+                    if key not in valid_keys:
+                        return False
+            for key, item in value.iteritems():
+                key_index = keys_indexes.get(key, allowed)
+                if key_index >= 0:
+                    stack.append((key_index, item))
+
+        else:
+            candidates = _meta_candidates(instruction, value)
+            if candidates is None:
+                candidates = instruction[1]
+            for alternative in candidates:
+                if program_is_valid(program, value, alternative):
+                    break
+            else:
+                return False
+
+    return True
+
+
+class Instruction(object):
+    """Instruction under construction. Nested rules are kept as objects
+    until the program is assembled."""
+
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+        self.children = []
+
+    def add_child(self, rule, slot):
+        self.children.append((slot, rule))
+
+
+class OpcodeSchema(compiled_rules.CompiledSchema):
+    """Compiled schema, that is a flat array of instructions."""
+
+    def __init__(self, program):
+        self.program = program
+
+    def _check(self, value, path, errors):
+        return run_program(self.program, value, path, errors)
+
+    def is_valid(self, value):
+        return program_is_valid(self.program, value)
+
+
+def _accepts_type(instruction, value_type):
+    """Returns False, if values of the type are never valid for the
+    instruction."""
+    op = instruction.op
+    if op == OP_INTEGER:
+        return value_type is int
+    if op == OP_BOOLEAN:
+        return issubclass(value_type, bool)
+    if op <= OP_UNSIGNED_INTEGER_STRING:
+        return issubclass(value_type, basestring)
+    if op == OP_LIST:
+        return issubclass(value_type, list)
+    if op == OP_DICT:
+        return issubclass(value_type, dict)
+    for slot, rule in instruction.children:
+        if _accepts_type(rule, value_type):
+            return True
+    return False
+
+
+def _accepts_key(instruction, key, present):
+    """Returns False, if dictionaries with the key (present is True) or
+    without it are never valid for the instruction."""
+    if instruction.op == OP_DICT:
+        mandatory_keys, optional_keys, strict_keys_set = instruction.args
+        if present:
+            return (key in mandatory_keys or key in optional_keys
+                    or not strict_keys_set)
+        return key not in mandatory_keys
+    if instruction.op == OP_META:
+        for slot, rule in instruction.children:
+            if _accepts_type(rule, dict) and _accepts_key(rule, key, present):
+                return True
+        return False
+    return True
+
+
+def assemble(instructions):
+    """Converts a list of Instructions, the root is the first one,
+    to a program: a tuple of instructions tuples."""
+    indexes = dict((id(instruction), index)
+                   for index, instruction in enumerate(instructions))
+    program = []
+    for instruction in instructions:
+        if instruction.op == OP_LIST:
+            allowed = -1
+            for slot, rule in instruction.children:
+                allowed = indexes[id(rule)]
+            program.append((OP_LIST,) + instruction.args + (allowed,))
+
+        elif instruction.op == OP_DICT:
+            mandatory_keys, optional_keys, strict_keys_set = instruction.args
+            keys_indexes = {}
+            allowed = -1
+            for (kind, key), rule in instruction.children:
+                if kind == 'allowed':
+                    if not strict_keys_set:
+                        allowed = indexes[id(rule)]
+                elif kind == 'optional':
+                    keys_indexes.setdefault(key, indexes[id(rule)])
+                else:
+                    keys_indexes[key] = indexes[id(rule)]
+            program.append((OP_DICT, mandatory_keys,
+                            mandatory_keys.union(optional_keys),
+                            strict_keys_set, keys_indexes, allowed))
+
+        elif instruction.op == OP_META:
+            alternatives = [rule for slot, rule in instruction.children]
+            types_index = compiled_rules.index_alternatives(alternatives,
+                                                            _accepts_type)
+            dict_alternatives = types_index.get(dict, alternatives)
+            discriminator = compiled_rules.find_discriminator(
+                dict_alternatives,
+                compiled_rules.discriminator_keys(
+                    instruction.args[0],
+                    [rule.args[0] for rule in dict_alternatives
+                     if rule.op == OP_DICT]),
+                _accepts_key)
+            if discriminator is not None:
+                key, with_key, without_key = discriminator
+                discriminator = (key,
+                                 tuple(indexes[id(rule)] for rule in with_key),
+                                 tuple(indexes[id(rule)]
+                                       for rule in without_key))
+            program.append((
+                OP_META,
+                tuple(indexes[id(rule)] for rule in alternatives),
+                dict((value_type, tuple(indexes[id(rule)]
+                                        for rule in candidates))
+                     for value_type, candidates in types_index.iteritems()),
+                discriminator))
+
+        else:
+            program.append((instruction.op,))
+
+    return tuple(program)
+
+
+class OpcodeRulesBuilderMixIn(RulesBuilderMixIn):
+
+    """A collection of build methods with the same signatures as in
+    CompiledRulesBuilderMixIn, that construct instructions."""
+
+    def build_integer(self, parent_id, slot=None):
+        return self._add_new_rule(Instruction(OP_INTEGER), parent_id, slot)
+
+    def build_boolean(self, parent_id, slot=None):
+        return self._add_new_rule(Instruction(OP_BOOLEAN), parent_id, slot)
+
+    def build_string(self, parent_id, slot=None):
+        return self._add_new_rule(Instruction(OP_STRING), parent_id, slot)
+
+    def build_string_of_unsigned_integers(self, parent_id, slot=None):
+        return self._add_new_rule(Instruction(OP_UNSIGNED_INTEGER_STRING),
+                                  parent_id, slot)
+
+    def build_not_empty_string(self, parent_id, slot=None):
+        return self._add_new_rule(Instruction(OP_NOT_EMPTY_STRING),
+                                  parent_id, slot)
+
+    def build_dictionary(self, parent_id, slot=None,
+                         mandatory_keys=frozenset(),
+                         optional_keys=frozenset(),
+                         strict_keys_set=True):
+        rule = Instruction(OP_DICT, frozenset(mandatory_keys),
+                           frozenset(optional_keys), strict_keys_set)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_list(self, parent_id, slot=None, min_length=None,
+                   max_length=None):
+        rule = Instruction(OP_LIST, min_length, max_length)
+        return self._add_new_rule(rule, parent_id, slot)
+
+    def build_meta_rule(self, parent_id, slot=None, discriminator=None):
+        return self._add_new_rule(Instruction(OP_META, discriminator),
+                                  parent_id, slot)
+
+
+class OpcodeRulesBuilder(SchemaRulesBuilder, OpcodeRulesBuilderMixIn):
+
+    """A concrete builder implementation. Its product is a compiled schema
+    made of a flat array of instructions."""
+
+    def get_product(self):
+        if len(self._rules_list) == 0:
+            return None
+        return OpcodeSchema(assemble(self._rules_list))
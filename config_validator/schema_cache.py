@@ -0,0 +1,233 @@
+# Compiled schemas do not depend on the value, so the same compiled schema
+# can be shared by all of directors that got the same rules scheme.
+# Here we introduce a process-wide cache of compiled schemas. Rules schemes
+# are plain python data structures, so they are identified by a structural
+# fingerprint: equal schemes have equal fingerprints, even if they are
+# different objects.
+# Compiled schemas can also be kept in a cache directory, so a new process
+# loads them instead of compiling the rules scheme again.
+
+import cPickle
+import errno
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from __init__ import __version__
+
+
+# Digest of sources of the library, see '_library_digest()'.
+_sources_digest = None
+
+
+def _library_digest():
+    """Returns the digest of sources of the library modules. Cached
+    compiled schemas keep rules objects, opcode programs and generated
+    source, that depend on the code of the library, so they are stale after
+    any change of the code, even if the version is not changed."""
+    global _sources_digest
+    if _sources_digest is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for file_name in sorted(glob.glob(os.path.join(directory, '*.py'))):
+            with open(file_name, 'rb') as source_file:
+                digest.update(os.path.basename(file_name) + '\0')
+                digest.update(source_file.read())
+        _sources_digest = digest.hexdigest()
+    return _sources_digest
+
+
+def schema_fingerprint(rules_scheme):
+    """Returns a stable structural fingerprint (hex string) of the rules
+    scheme. Dictionaries are fingerprinted regardless of keys order."""
+    return _fingerprint(rules_scheme, {})
+
+
+def subschemas_fingerprints(rules_scheme):
+    """Returns fingerprints of all of containers (dictionaries, lists and
+    tuples) of the rules scheme, keyed by their ids. It may be used only
+    while the rules scheme is alive and is not changed."""
+    memo = {}
+    _fingerprint(rules_scheme, memo)
+    return memo
+
+
+def _fingerprint(definition, memo):
+    # Subschemas are often shared between several places of a scheme,
+    # so fingerprints of containers are memoized by identity.
+    if isinstance(definition, (dict, list, tuple)):
+        if id(definition) in memo:
+            return memo[id(definition)]
+
+        if isinstance(definition, dict):
+            parts = sorted('%r:%s' % (key, _fingerprint(value, memo))
+                           for key, value in definition.iteritems())
+            text = '{%s}' % ','.join(parts)
+        else:
+            parts = [_fingerprint(value, memo) for value in definition]
+            text = '%s[%s]' % (type(definition).__name__, ','.join(parts))
+
+        fingerprint = hashlib.sha1(text).hexdigest()
+        memo[id(definition)] = fingerprint
+        return fingerprint
+
+    if isinstance(definition, (set, frozenset)):
+        return '%s(%s)' % (type(definition).__name__,
+                           ','.join(sorted(repr(item)
+                                           for item in definition)))
+
+    return '%s:%r' % (type(definition).__name__, definition)
+
+
+class SchemaCache(object):
+
+    """Bounded cache of compiled schemas with LRU eviction policy.
+    Keys are tuples, that start with the rules scheme fingerprint."""
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def get(self, key):
+        """Returns the cached compiled schema or None."""
+        with self._lock:
+            schema = self._schemas.pop(key, None)
+            if schema is None:
+                self.misses += 1
+                return None
+            self._schemas[key] = schema
+            self.hits += 1
+            return schema
+
+    def put(self, key, schema):
+        with self._lock:
+            self._schemas.pop(key, None)
+            self._schemas[key] = schema
+            while len(self._schemas) > self.max_size:
+                self._schemas.popitem(last=False)
+
+    def invalidate(self, rules_scheme=None):
+        """Drops compiled schemas of the rules scheme from the cache,
+        or all of compiled schemas if rules scheme is not given."""
+        with self._lock:
+            if rules_scheme is None:
+                self._schemas.clear()
+                return
+
+            fingerprint = schema_fingerprint(rules_scheme)
+            for key in self._schemas.keys():
+                if key[0] == fingerprint:
+                    del self._schemas[key]
+
+
+default_schema_cache = SchemaCache()
+
+
+class DiskSchemaCache(object):
+
+    """Persistent cache of compiled schemas in a directory.
+    Each compiled schema is pickled to a file named by the hash of its key.
+    The file also keeps the key, the library version, the digest of its
+    sources and python version.
+    If any of them does not match, or the file can not be loaded, the entry
+    is treated as stale: 'get()' returns None, so the schema is compiled
+    again and 'put()' overwrites the file."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _key_text(self, key):
+        return '|'.join(
+            '%s.%s' % (part.__module__, part.__name__)
+            if isinstance(part, type) else str(part) for part in key)
+
+    def _header(self, key):
+        return {
+            'key': self._key_text(key),
+            'version': __version__,
+            'sources': _library_digest(),
+            'python': tuple(sys.version_info[:2]),
+        }
+
+    def _file_name(self, key):
+        # Files are prefixed with the fingerprint to find all of files of
+        # a rules scheme.
+        return os.path.join(
+            self.directory,
+            '%s-%s.schema' % (key[0],
+                              hashlib.sha1(self._key_text(key)).hexdigest()))
+
+    def get(self, key):
+        """Returns the cached compiled schema or None."""
+        try:
+            with open(self._file_name(key), 'rb') as schema_file:
+                header = cPickle.load(schema_file)
+                if header != self._header(key):
+                    schema = None
+                else:
+                    schema = cPickle.load(schema_file)
+        except Exception:
+            schema = None
+
+        if schema is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return schema
+
+    def put(self, key, schema):
+        """Saves the compiled schema. The file is replaced atomically,
+        so concurrent processes never read a partially written entry.
+        The cache never breaks validation: if the schema can not be saved
+        (the directory is not writable, the schema can not be pickled),
+        it is not saved, and 'put()' returns False."""
+        try:
+            os.makedirs(self.directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                return False
+
+        try:
+            descriptor, temp_name = tempfile.mkstemp(dir=self.directory,
+                                                     suffix='.tmp')
+        except (IOError, OSError):
+            return False
+        try:
+            with os.fdopen(descriptor, 'wb') as schema_file:
+                cPickle.dump(self._header(key), schema_file,
+                             cPickle.HIGHEST_PROTOCOL)
+                cPickle.dump(schema, schema_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temp_name, self._file_name(key))
+        except Exception:
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def invalidate(self, rules_scheme=None):
+        """Removes files of the rules scheme from the cache directory,
+        or all of cached files if rules scheme is not given."""
+        if not os.path.isdir(self.directory):
+            return
+
+        prefix = ''
+        if rules_scheme is not None:
+            prefix = schema_fingerprint(rules_scheme) + '-'
+
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(prefix) and file_name.endswith('.schema'):
+                os.remove(os.path.join(self.directory, file_name))
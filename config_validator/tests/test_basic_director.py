@@ -1,9 +1,15 @@
+from itertools import islice
 import unittest
 
 from ..basic_builder import BasicRulesBuilder
-from ..basic_director import BasicRulesDirector, HandledDirector
+from ..basic_director import (BasicRulesDirector, HandledDirector,
+                               BFS_ORDER, DFS_ORDER)
 from .. import basic_rules
-from ..basic_director_handlers import RuleParseHandler
+from ..logging_schema import logging_schema
+from ..config_paths import child_path, render_path
+from .test_compiled_director import SCHEMA_CASES
+from ..basic_director_handlers import (RuleMessage, RuleParseHandler,
+                                       SimpleRuleParseHandler, META_RULE)
 
 
 class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
@@ -72,15 +78,15 @@ class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
         self.assertIsInstance(rules, basic_rules.MetaNode)
         self.assertEqual(rules.value, value)
         self.assertEqual(rules.path, '/')
-        self.assertIsInstance(rules._children, set)
-        self.assertEqual(len(rules._children), 3)
+        self.assertIsInstance(rules._children, list)
+        # alternatives are built when they are tried, the last one is not
+        self.assertEqual(len(rules._children), 2)
         expected_children_types = {
             basic_rules.IntegerNode,
             basic_rules.StringOfUnsignedInteger,
-            basic_rules.BooleanNode
         }
         real_children_types_set = set()
-        for rule in rules._children:
+        for rule in rules._children[:]:  # built alternatives only
             real_children_types_set.add(type(rule))
             self.assertIsInstance(rule, basic_rules.Node)
             self.assertEqual(rule.value, value)
@@ -88,6 +94,63 @@ class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
 
         self.assertEqual(expected_children_types, real_children_types_set)
 
+    def test_meta_rule_errors(self):
+        schema = [{'type': 'list', 'allowed': [{'type': 'integer'},
+                                               {'type': 'boolean'}]},
+                  {'type': 'string'}]
+        director = BasicRulesDirector(schema, self.builder)
+        rules = director.build_rules_tree([1, 'a'])
+        self.assertEqual(len(rules._children), 0)
+        self.assertFalse(rules.validate())
+        self.assertEqual(rules.get_all_errors(), [
+            'Config Error at / : All allowed alternatives are not valid.',
+            'Config Error at (alt.#1) : each of nested values must be valid.',
+            'Config Error at (alt.#1)/1 : All allowed alternatives'
+            ' are not valid.',
+            'Config Error at (alt.#1)/1(alt.#1) : value must be integer.',
+            'Config Error at (alt.#1)/1(alt.#2) : value must be boolean.',
+            'Config Error at (alt.#2) : value must be string.'])
+
+    def test_bad_definition_of_alternative(self):
+        director = BasicRulesDirector([{'type': 'integer'},
+                                       {'type': 'unknown'}], self.builder)
+        self.assertRaises(ValueError, director.build_rules_tree, 1)
+        self.assertRaises(ValueError, director.build_rules_tree, 'a')
+
+    def test_bad_nested_definition_of_alternative(self):
+        director = BasicRulesDirector([{'type': 'integer'},
+                                       {'type': 'list',
+                                        'allowed': {'type': 'unknown'}}],
+                                      self.builder)
+        self.assertTrue(director.build_rules_tree(1).validate())
+        self.assertRaises(ValueError, director.build_rules_tree, [1])
+
+    def test_alternatives_of_chain_handlers(self):
+        director = BasicRulesDirector([{'type': 'integer'},
+                                       {'type': 'positive_integer'}],
+                                      self.builder)
+        director.append_handler(PositiveIntegerHandler(self.builder))
+        # the definition is not checked, the alternative is built at once
+        self.assertTrue(director.build_rules_tree(1).validate())
+        rules = director.build_rules_tree('a')
+        self.assertFalse(rules.validate())
+        self.assertEqual(rules.get_all_errors(), [
+            'Config Error at / : All allowed alternatives are not valid.',
+            'Config Error at (alt.#1) : value must be integer.',
+            'Config Error at (alt.#2) : value must be integer.'])
+
+    def test_alternatives_built_during_another_build(self):
+        director = BasicRulesDirector([{'type': 'integer'},
+                                       {'type': 'string'}], self.builder)
+        rules = director.build_rules_tree('a')
+        self.builder.clean()
+        list_id = self.builder.build_list([], None, 0, 1, '/')
+        self.assertTrue(rules.validate())
+        self.assertEqual(len(rules._children), 2)
+        product = self.builder.get_product()
+        self.assertIsInstance(product, basic_rules.ListNode)
+        self.assertEqual(self.builder.build_integer(1, list_id, '/0'), 1)
+
     def test_list_rule_without_allowed(self):
         min_length = 0
         max_length = 10
@@ -105,7 +168,6 @@ class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
         self.assertEqual(rules.path, '/')
         self.assertEqual(rules.min_length, min_length)
         self.assertEqual(rules.max_length, max_length)
-        self.assertIsInstance(rules._children, set)
         self.assertEqual(len(rules._children), 0)
 
     def test_list_rule_with_allowed(self):
@@ -126,7 +188,7 @@ class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
         self.assertEqual(rules.path, '/')
         self.assertEqual(rules.min_length, min_length)
         self.assertEqual(rules.max_length, max_length)
-        self.assertIsInstance(rules._children, set)
+        self.assertIsInstance(rules._children, list)
         self.assertEqual(len(rules._children), len(value))
         expected_map = {'/%d' % i: value[i] for i in range(len(value))}
         real_map = {}
@@ -179,7 +241,7 @@ class DirectorWithBasicRulesBuilderTest(unittest.TestCase):
         self.assertEqual(rules.path, '/')
         self.assertEqual(rules.value, value)
 
-        self.assertIsInstance(rules._children, set)
+        self.assertIsInstance(rules._children, list)
         self.assertEqual(len(rules._children), 5)
 
         expected_map = {
@@ -286,3 +348,433 @@ class DirectorHandleOpsTest(unittest.TestCase):
         self.assertIs(baz, self.director.pop_handler())
         self.assertIs(foo, self.director.pop_handler())
         self.assertIsNone(self.director.pop_handler())
+
+
+class CountingIntegerHandler(SimpleRuleParseHandler):
+
+    simple_rule_types = ('integer',)
+
+    def __init__(self, builder):
+        super(CountingIntegerHandler, self).__init__(builder)
+        self.handled = 0
+
+    def build_rule(self, message):
+        self.handled += 1
+        return super(CountingIntegerHandler, self).build_rule(message)
+
+
+class PositiveIntegerHandler(RuleParseHandler):
+
+    def handle_message(self, message):
+        if (isinstance(message['rule_definition'], dict)
+                and message['rule_definition'].get('type')
+                == 'positive_integer'):
+            rule_id = self.builder.build_integer(
+                message['value'], message['parent_rule_id'],
+                message['path'] if message['path'] else '/')
+            return rule_id, []
+
+        return super(PositiveIntegerHandler, self).handle_message(message)
+
+
+class IntegerAsStringHandler(RuleParseHandler):
+
+    def handle_message(self, message):
+        if (isinstance(message['rule_definition'], dict)
+                and message['rule_definition'].get('type') == 'integer'):
+            rule_id = self.builder.build_string(
+                message['value'], message['parent_rule_id'],
+                message['path'] if message['path'] else '/')
+            return rule_id, []
+
+        return super(IntegerAsStringHandler, self).handle_message(message)
+
+
+class TupleHandler(RuleParseHandler):
+    """Handler of a complex rule: items of list have rules of their own.
+    'string_paths' makes paths of items the way of string paths."""
+
+    rule_types = ('tuple',)
+
+    def __init__(self, builder, string_paths=False):
+        super(TupleHandler, self).__init__(builder)
+        self.string_paths = string_paths
+
+    def build_rule(self, message):
+        definitions = message['rule_definition']['items']
+        rule_id = self.builder.build_list(
+            message['value'], message['parent_rule_id'],
+            len(definitions), len(definitions),
+            message['path'] if message['path'] else '/')
+        new_messages = []
+        for index, value in enumerate(message['value']):
+            if self.string_paths:
+                path = render_path(message['path']) + '/' + str(index)
+            else:
+                path = child_path(message['path'], index)
+            new_messages.append(RuleMessage(definitions[index], rule_id,
+                                            value, path))
+        return rule_id, new_messages
+
+
+class DirectorHandlersRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = BasicRulesBuilder()
+
+    def test_paths_of_custom_handler(self):
+        schema = {'type': 'dictionary',
+                  'mandatory': {'pair': {
+                      'type': 'tuple',
+                      'items': [{'type': 'integer'},
+                                {'type': 'list',
+                                 'allowed': {'type': 'string'}}]}}}
+        for string_paths in (False, True):
+            director = BasicRulesDirector(schema, self.builder)
+            director.push_handler(TupleHandler(self.builder, string_paths))
+            rules = director.build_rules_tree({'pair': ['a', [1]]})
+            self.assertFalse(rules.validate())
+            self.assertEqual(rules.get_all_errors(), [
+                'Config Error at / : each of nested values must be valid.',
+                'Config Error at /pair : each of nested values must be'
+                ' valid.',
+                'Config Error at /pair/0 : value must be integer.',
+                'Config Error at /pair/1 : each of nested values must be'
+                ' valid.',
+                'Config Error at /pair/1/0 : value must be string.'])
+
+    def test_registry(self):
+        director = BasicRulesDirector({}, self.builder)
+        self.assertEqual(set(director._handlers_registry), {
+            'integer', 'string', 'not_empty_string', 'boolean',
+            'string_of_unsigned_integers', 'list', 'dictionary', META_RULE})
+
+    def test_pushed_handler_has_priority(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type': 'integer'}},
+                                      self.builder)
+        handler = CountingIntegerHandler(self.builder)
+        director.push_handler(handler)
+        self.assertTrue(director.build_rules_tree([1, 2, 3]).validate())
+        self.assertEqual(handler.handled, 3)
+
+        self.assertIs(director.shift_handler(), handler)
+        self.assertTrue(director.build_rules_tree([1, 2, 3]).validate())
+        self.assertEqual(handler.handled, 3)
+
+    def test_pushed_handler_without_rule_types(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type': 'integer'}},
+                                      self.builder)
+        director.push_handler(IntegerAsStringHandler(self.builder))
+        rules = director.build_rules_tree(['1'])
+        self.assertTrue(rules.validate())
+        self.assertIsInstance(rules._children[0], basic_rules.StringNode)
+        self.assertFalse(director.build_rules_tree([1]).validate())
+
+        director.shift_handler()
+        self.assertTrue(director.build_rules_tree([1]).validate())
+
+    def test_appended_handler_has_no_priority(self):
+        director = BasicRulesDirector({'type': 'integer'}, self.builder)
+        handler = CountingIntegerHandler(self.builder)
+        director.append_handler(handler)
+        director.build_rules_tree(1)
+        self.assertEqual(handler.handled, 0)
+
+    def test_unregistered_handler(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type':
+                                                   'positive_integer'}},
+                                      self.builder)
+        with self.assertRaises(ValueError):
+            director.build_rules_tree([1])
+        director.append_handler(PositiveIntegerHandler(self.builder))
+        self.assertTrue(director.build_rules_tree([1]).validate())
+        director.pop_handler()
+        with self.assertRaises(ValueError):
+            director.build_rules_tree([1])
+
+
+class PathsRecordingDirector(BasicRulesDirector):
+
+    def _find_handler(self, message):
+        self.handled_paths.append(render_path(message['path']))
+        return super(PathsRecordingDirector, self)._find_handler(message)
+
+
+class DirectorTraversalOrderTest(unittest.TestCase):
+
+    SCHEMA = {'type': 'list',
+              'allowed': {'type': 'list', 'allowed': {'type': 'integer'}}}
+
+    def build(self, traversal_order, value):
+        director = PathsRecordingDirector(self.SCHEMA, BasicRulesBuilder())
+        director.traversal_order = traversal_order
+        director.handled_paths = []
+        return director.build_rules_tree(value), director.handled_paths
+
+    def test_default_order(self):
+        self.assertEqual(HandledDirector.traversal_order, BFS_ORDER)
+
+    def test_bfs_order(self):
+        rules, paths = self.build(BFS_ORDER, [[1, 2], [3]])
+        self.assertTrue(rules.validate())
+        self.assertEqual(paths, ['', '/0', '/1', '/0/0', '/0/1', '/1/0'])
+
+    def test_dfs_order(self):
+        rules, paths = self.build(DFS_ORDER, [[1, 2], [3]])
+        self.assertTrue(rules.validate())
+        self.assertEqual(paths, ['', '/0', '/0/0', '/0/1', '/1', '/1/0'])
+
+    def test_same_errors(self):
+        value = [[1, 'a'], 'b', [[]]]
+        bfs_rules, _ = self.build(BFS_ORDER, value)
+        dfs_rules, _ = self.build(DFS_ORDER, value)
+        self.assertFalse(bfs_rules.validate())
+        self.assertFalse(dfs_rules.validate())
+        self.assertEqual(sorted(bfs_rules.get_all_errors()),
+                         sorted(dfs_rules.get_all_errors()))
+
+    def test_unknown_order(self):
+        with self.assertRaises(ValueError):
+            self.build('random', [])
+
+    def test_long_list(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type': 'integer'}},
+                                      BasicRulesBuilder())
+        director.traversal_order = DFS_ORDER
+        self.assertTrue(director.build_rules_tree(range(20000)).validate())
+
+
+class SizeRecordingBuilder(BasicRulesBuilder):
+
+    def __init__(self):
+        super(SizeRecordingBuilder, self).__init__()
+        self.max_size = 0
+
+    def _add_new_rule(self, rule, parent_id):
+        rule_id = super(SizeRecordingBuilder, self)._add_new_rule(rule,
+                                                                 parent_id)
+        self.max_size = max(self.max_size, len(self._rules_list))
+        return rule_id
+
+
+class StreamingValidationTest(unittest.TestCase):
+
+    def test_same_errors_as_rules_tree(self):
+        for schema, value in SCHEMA_CASES:
+            director = BasicRulesDirector(schema, BasicRulesBuilder())
+            rules = director.build_rules_tree(value)
+            rules.validate()
+            expected_errors = rules.get_all_errors()
+            errors = director.validate_rules_tree(value)
+            if expected_errors is None:
+                self.assertIsNone(errors)
+            else:
+                self.assertEqual(sorted(errors), sorted(expected_errors))
+
+    def test_errors_order(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type': 'integer'}},
+                                      BasicRulesBuilder())
+        self.assertEqual(director.validate_rules_tree([1, 'a', 2, 'b']), [
+            'Config Error at / : each of nested values must be valid.',
+            'Config Error at /1 : value must be integer.',
+            'Config Error at /3 : value must be integer.'])
+
+    def test_rules_are_not_kept(self):
+        builder = SizeRecordingBuilder()
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': [{'type': 'integer'},
+                                                   {'type': 'boolean'}]},
+                                      builder)
+        self.assertIsNone(director.validate_rules_tree(range(1000)))
+        self.assertEqual(builder.max_size, 1)
+        self.assertIsNone(builder.get_product())
+
+    def test_alternatives_after_valid_one(self):
+        builder = BasicRulesBuilder()
+        director = BasicRulesDirector([{'type': 'boolean'},
+                                       {'type': 'integer'}], builder)
+        handler = CountingIntegerHandler(builder)
+        director.push_handler(handler)
+        self.assertIsNone(director.validate_rules_tree(True))
+        self.assertEqual(handler.handled, 0)
+        self.assertIsNone(director.validate_rules_tree(1))
+        self.assertEqual(handler.handled, 1)
+
+    def test_bad_rule_definition(self):
+        director = BasicRulesDirector({'type': 'list',
+                                       'allowed': {'type': 'unknown'}},
+                                      BasicRulesBuilder())
+        self.assertIsNone(director.validate_rules_tree([]))
+        with self.assertRaises(ValueError):
+            director.validate_rules_tree([1])
+
+
+class ErrorsBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = SizeRecordingBuilder()
+        self.director = BasicRulesDirector({'type': 'list',
+                                            'allowed': {'type': 'integer'}},
+                                           self.builder)
+
+    def test_stops_on_budget(self):
+        handler = CountingIntegerHandler(self.builder)
+        self.director.push_handler(handler)
+        result = self.director.validate(['a'] * 1000, max_errors=3)
+        self.assertFalse(result)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.get_all_errors(), [
+            'Config Error at / : each of nested values must be valid.',
+            'Config Error at /0 : value must be integer.',
+            'Config Error at /1 : value must be integer.'])
+        # the error of the list is counted, when the list is closed
+        self.assertEqual(handler.handled, 4)
+
+    def test_within_budget(self):
+        result = self.director.validate([1, 'a'], max_errors=2)
+        self.assertFalse(result)
+        self.assertFalse(result.truncated)
+        self.assertEqual(len(result.records), 2)
+        result = self.director.validate([1, 2], max_errors=0)
+        self.assertTrue(result)
+        self.assertFalse(result.truncated)
+
+    def test_zero_budget(self):
+        result = self.director.validate(['a'], max_errors=0)
+        self.assertFalse(result)
+        self.assertTrue(result.truncated)
+        self.assertIsNone(result.get_all_errors())
+
+    def test_alternatives(self):
+        director = BasicRulesDirector(
+            [{'type': 'list', 'allowed': {'type': 'integer'}},
+             {'type': 'list', 'allowed': {'type': 'string'}}],
+            BasicRulesBuilder())
+        result = director.validate(['a'] * 10, max_errors=2)
+        self.assertTrue(result)
+        self.assertFalse(result.truncated)
+        result = director.validate([None] * 10, max_errors=2)
+        self.assertFalse(result)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.get_all_errors(), [
+            'Config Error at / : All allowed alternatives are not valid.',
+            'Config Error at (alt.#1) : each of nested values must be '
+            'valid.'])
+
+    def test_first_errors_of_validation(self):
+        director = BasicRulesDirector(logging_schema, BasicRulesBuilder())
+        for value in ({'version': 1, 'handlers': {'a': {}, 'b': []},
+                       'root': {'level': 1, 'handlers': [1, 2]}},
+                      {'version': 'x', 'formatters': {'f': {'()': 1}}}):
+            expected = director.validate(value).records
+            for max_errors in range(len(expected) + 2):
+                result = director.validate(value, max_errors)
+                self.assertEqual(result.records, expected[:max_errors])
+                self.assertEqual(result.truncated,
+                                 len(expected) > max_errors)
+
+
+class SharedValuesTest(unittest.TestCase):
+
+    def tree_schema(self):
+        schema = {'type': 'dictionary',
+                  'mandatory': {'name': {'type': 'string'}},
+                  'optional': {}}
+        schema['optional']['children'] = {'type': 'list', 'allowed': schema}
+        return schema
+
+    def all_errors(self, schema, value):
+        director = BasicRulesDirector(schema, BasicRulesBuilder())
+        rules = director.build_rules_tree(value)
+        is_valid = rules.validate()
+        self.assertEqual(rules.is_valid(), is_valid)
+        errors = rules.get_all_errors()
+        single_pass_errors = director.validate_rules_tree(value)
+        if errors is None:
+            self.assertIsNone(single_pass_errors)
+        else:
+            self.assertEqual(sorted(single_pass_errors), sorted(errors))
+        return is_valid, errors
+
+    def test_same_errors_as_copies(self):
+        schema = self.tree_schema()
+        child = {'name': 1, 'children': []}
+        value = {'name': 'root',
+                 'children': [child, child, {'name': 'a',
+                                             'children': [child]}]}
+        copies = {'name': 'root',
+                  'children': [dict(child), dict(child),
+                               {'name': 'a', 'children': [dict(child)]}]}
+        self.assertEqual(self.all_errors(schema, value),
+                         self.all_errors(schema, copies))
+
+    def test_shared_rules(self):
+        item = {'type': 'list', 'allowed': {'type': 'integer'}}
+        director = BasicRulesDirector(
+            {'type': 'list', 'allowed': item}, BasicRulesBuilder())
+        shared = [1, 2, 3]
+        rules = director.build_rules_tree([shared, shared, [1]])
+        first, second, third = rules._children
+        self.assertIsInstance(first, basic_rules.SharedNode)
+        self.assertIs(first.shared, second.shared)
+        self.assertIsInstance(third, basic_rules.ListNode)
+        self.assertTrue(rules.validate())
+
+    def test_different_rules_of_shared_value(self):
+        schema = {'type': 'dictionary',
+                  'mandatory': {'a': {'type': 'list',
+                                      'allowed': {'type': 'integer'}},
+                                'b': {'type': 'list',
+                                      'allowed': {'type': 'string'}}}}
+        shared = [1]
+        is_valid, errors = self.all_errors(schema, {'a': shared,
+                                                    'b': shared})
+        self.assertFalse(is_valid)
+        self.assertIn('Config Error at /b/0 : value must be string.', errors)
+
+    def test_errors_budget(self):
+        schema = [{'type': 'integer'}]
+        schema.append({'type': 'list', 'allowed': schema})
+        director = BasicRulesDirector(schema, BasicRulesBuilder())
+        value = ['x']
+        for depth in range(30):
+            value = [value, value]
+            if depth == 3:
+                rules = director.build_rules_tree(value)
+                self.assertFalse(rules.validate())
+                errors = rules.get_all_errors()
+                self.assertEqual(rules.get_all_errors(40), errors[:40])
+                self.assertEqual(list(rules.iter_errors()), errors)
+        # 2 ** 30 places of the shared values, only a few are walked
+        rules = director.build_rules_tree(value)
+        self.assertFalse(rules.validate())
+        errors = rules.get_all_errors(max_errors=5)
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(list(islice(rules.iter_errors(), 5)), errors)
+        self.assertEqual(len(rules.get_all_error_records(5)), 5)
+
+    def test_cycle(self):
+        node = {'name': 'a', 'children': []}
+        node['children'].append(node)
+        is_valid, errors = self.all_errors(self.tree_schema(), node)
+        self.assertFalse(is_valid)
+        self.assertEqual(errors[-1],
+                         'Config Error at /children/0 : value contains'
+                         ' itself, it is the same object as the value'
+                         ' at /.')
+
+    def test_cycle_in_alternatives(self):
+        schema = [{'type': 'integer'}]
+        schema.append({'type': 'list', 'allowed': schema})
+        value = [1, []]
+        value[1].append(value)
+        is_valid, errors = self.all_errors(schema, value)
+        self.assertFalse(is_valid)
+        self.assertIn('Config Error at (alt.#2)/1(alt.#2)/0 : value'
+                      ' contains itself, it is the same object as the value'
+                      ' at /.', errors)
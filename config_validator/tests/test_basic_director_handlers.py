@@ -1,6 +1,7 @@
 import unittest
 from ..basic_builder import BasicRulesBuilder
 from .. import basic_director_handlers
+from ..config_paths import render_path, ITEM
 
 
 class FakeHandler(object):
@@ -169,6 +170,61 @@ class DictRuleParseHandlerTest(unittest.TestCase):
         self.assertIsInstance(new_messages, list)
         self.assertEqual(len(new_messages), 3)
 
+    def test_lazy_messages(self):
+        value = {'a': 'aa', 'b': 1}
+        rule_id, new_messages = self.parser.build_rule_lazily({
+            "rule_definition": {"type": "dictionary",
+                                "optional": {"a": {"type": "string"}}},
+            "parent_rule_id": None,
+            "value": value,
+            "path": ""
+        })
+        self.assertNotIsInstance(new_messages, list)
+        messages = list(new_messages)
+        self.assertEqual([message.value for message in messages], ['aa'])
+        self.assertEqual(messages[0].parent_rule_id, rule_id)
+
+    def test_nested_definitions(self):
+        integer, string = {"type": "integer"}, {"type": "string"}
+        definitions = self.parser.nested_definitions({
+            "type": "dictionary",
+            "mandatory": {"a": integer},
+            "optional": {"b": string, "c": None},
+            "allowed": {"type": "boolean"},
+        })
+        self.assertEqual(sorted(definitions), [integer, string])
+        definitions = self.parser.nested_definitions({
+            "type": "dictionary", "strict_keys_set": False,
+            "allowed": string})
+        self.assertEqual(definitions, [string])
+
+    def test_rules_share_keys_sets(self):
+        rule_definition = {
+            "type": "dictionary",
+            "mandatory": {"a": {"type": "string"}},
+        }
+        for value in ({'a': 'aa'}, {'a': 'bb'}):
+            self.parser.handle_message({
+                "rule_definition": rule_definition,
+                "parent_rule_id": None,
+                "value": value,
+                "path": ""
+            })
+        first, second = self.builder._rules_list
+        self.assertEqual(first.mandatory_keys, set(['a']))
+        self.assertIs(first.mandatory_keys, second.mandatory_keys)
+
+        # changed definition gets new sets
+        rule_definition['mandatory']['b'] = {"type": "string"}
+        rule_id, new_messages = self.parser.handle_message({
+            "rule_definition": rule_definition,
+            "parent_rule_id": None,
+            "value": {},
+            "path": ""
+        })
+        self.assertEqual(self.builder._rules_list[rule_id].mandatory_keys,
+                         set(['a', 'b']))
+
     def test_parse_fake_message(self):
         rule_id, new_messages = self.parser.handle_message(
             FakeHandler.FAKE_MESSAGE)
@@ -219,3 +275,33 @@ class MetaRulesParseHandlerTest(unittest.TestCase):
             FakeHandler.FAKE_MESSAGE)
         self.assertIsNone(rule_id)
         self.assertEqual(new_messages, [])
+
+
+class RuleMessageTest(unittest.TestCase):
+
+    def test_item_access(self):
+        message = basic_director_handlers.RuleMessage(
+            {'type': 'integer'}, 3, 100, '/a')
+        self.assertEqual(message['rule_definition'], {'type': 'integer'})
+        self.assertEqual(message['parent_rule_id'], 3)
+        self.assertEqual(message['value'], 100)
+        self.assertEqual(message.path, '/a')
+        self.assertIn('value', message)
+        self.assertNotIn('slot', message)
+        self.assertIsNone(message.get('slot'))
+        message['parent_rule_id'] = None
+        self.assertIsNone(message.parent_rule_id)
+        with self.assertRaises(KeyError):
+            message['slot']
+
+    def test_nested_messages(self):
+        parser = basic_director_handlers.ListRuleParseHandler(
+            BasicRulesBuilder())
+        message = basic_director_handlers.RuleMessage(
+            {'type': 'list', 'allowed': {'type': 'integer'}}, None,
+            [10, 20], '')
+        rule_id, new_messages = parser.handle_message(message)
+        self.assertEqual([(m.value, render_path(m.path), m.parent_rule_id)
+                          for m in new_messages],
+                         [(10, '/0', rule_id), (20, '/1', rule_id)])
+        self.assertEqual(new_messages[0].path, ('', ITEM, 0))
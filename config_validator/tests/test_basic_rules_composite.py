@@ -1,6 +1,9 @@
 import unittest
 
-from ..basic_rules import CompositeNode, BooleanNode
+import sys
+
+from ..basic_rules import CompositeNode, BooleanNode, ListNode, MetaNode
+from ..config_paths import ITEM
 
 
 class CompositeNodeTest(unittest.TestCase):
@@ -20,10 +23,26 @@ class CompositeNodeTest(unittest.TestCase):
     def test_removing_child(self):
         parent_rule = CompositeNode(None, 'root')
         child_rule = BooleanNode(True, 'child')
-        parent_rule._children.add(child_rule)
+        parent_rule.add_child(child_rule)
         self.assertIn(child_rule, parent_rule._children)
         parent_rule.remove_child(child_rule)
         self.assertNotIn(child_rule, parent_rule._children)
+        # removing of unknown child is not an error
+        parent_rule.remove_child(child_rule)
+
+    def test_children_order(self):
+        parent_rule = CompositeNode(None, '')
+        children = [BooleanNode(index, '/%d' % index) for index in range(10)]
+        for child_rule in children:
+            parent_rule.add_child(child_rule)
+        parent_rule.remove_child(children[3])
+        del children[3]
+        self.assertEqual(parent_rule._children, children)
+        self.assertFalse(parent_rule.validate())
+        self.assertEqual(
+            parent_rule.get_all_errors()[1:],
+            ['Config Error at %s : value must be boolean.' % child.path
+             for child in children])
 
     def test_validate_without_children_for_all_values(self):
         values = (None, 1, True, False, '', 'test string', '123', '+123',
@@ -74,3 +93,119 @@ class CompositeNodeTest(unittest.TestCase):
         self.assertFalse(rule.validate())
         self.assertIsInstance(rule.get_all_errors(), list)
         self.assertEqual(len(rule.get_all_errors()), 10+1)
+
+
+class CompositeNodeStepsTest(unittest.TestCase):
+
+    def test_check_nested(self):
+        rule = CompositeNode(None, 'root')
+        self.assertTrue(rule.check_value())
+        self.assertTrue(rule.check_nested([True, True]))
+        self.assertFalse(rule.check_nested([True, False]))
+        self.assertEqual(len(rule.errors), 1)
+
+    def test_simple_rule_steps(self):
+        rule = BooleanNode('Invalid Value', 'root')
+        self.assertFalse(rule.check_value())
+        self.assertFalse(rule.check_nested([]))
+
+    def test_is_valid(self):
+        rule = CompositeNode(None, 'root')
+        rule.add_child(BooleanNode(True, 'child#1'))
+        self.assertTrue(rule.is_valid())
+        rule.add_child(BooleanNode('Invalid Value', 'child#2'))
+        self.assertFalse(rule.is_valid())
+        self.assertEqual(rule.errors, [])
+
+
+class DeepNestingTest(unittest.TestCase):
+
+    DEPTH = sys.getrecursionlimit() * 2
+
+    def build(self, leaf_value):
+        # [[[...[leaf_value]...]]] with a meta rule at each level
+        root = rule = MetaNode(None, '')
+        path = ''
+        for depth in range(self.DEPTH):
+            rule.add_child(BooleanNode(None, path))
+            list_rule = ListNode([None], path)
+            rule.add_child(list_rule)
+            path = (path, ITEM, 0)
+            rule = MetaNode(None, path)
+            list_rule.add_child(rule)
+        rule.add_child(BooleanNode(leaf_value, path))
+        return root
+
+    def test_valid(self):
+        root = self.build(True)
+        self.assertTrue(root.is_valid())
+        self.assertTrue(root.validate())
+        self.assertIsNone(root.get_all_errors())
+
+    def test_invalid(self):
+        root = self.build('Invalid Value')
+        self.assertFalse(root.is_valid())
+        self.assertFalse(root.validate())
+        errors = root.get_all_errors()
+        self.assertEqual(len(errors), self.DEPTH * 3 + 2)
+        self.assertEqual(errors[-1],
+                         'Config Error at %s : value must be boolean.'
+                         % ('/0' * self.DEPTH))
+        self.assertEqual(list(root.iter_errors()), errors)
+
+
+class NotWalkedChildTest(unittest.TestCase):
+
+    class AlwaysInvalidNode(CompositeNode):
+        # overrides validate(), so it is not walked by the parent rule
+        def validate(self):
+            self.errors.append('Custom error.')
+            return False
+
+        def is_valid(self):
+            return False
+
+    def test_custom_child(self):
+        rule = CompositeNode(None, '')
+        rule.add_child(self.AlwaysInvalidNode(None, '/a'))
+        self.assertFalse(rule.is_valid())
+        self.assertFalse(rule.validate())
+        self.assertEqual(
+            rule.get_all_errors(),
+            ['Config Error at / : each of nested values must be valid.',
+             'Custom error.'])
+
+
+class ErrorsIteratorTest(unittest.TestCase):
+
+    class CustomErrorsNode(CompositeNode):
+        # collects errors by itself, so it is not walked by the parent rule
+        def _collect_errors(self, errors, max_errors):
+            errors.append('Custom error.')
+            return True
+
+    def setUp(self):
+        self.rule = ListNode(['a', 1], '')
+        for index, value in enumerate(self.rule.value):
+            self.rule.add_child(BooleanNode(value, ('', ITEM, index)))
+        self.rule.add_child(self.CustomErrorsNode(None, '/c'))
+        self.rule.validate()
+
+    def test_iter_errors(self):
+        errors = self.rule.iter_errors()
+        self.assertEqual(next(errors), 'Config Error at / : each of nested'
+                                       ' values must be valid.')
+        self.assertEqual(list(errors),
+                         ['Config Error at /0 : value must be boolean.',
+                          'Config Error at /1 : value must be boolean.',
+                          'Custom error.'])
+        self.assertEqual(list(self.rule.iter_errors()),
+                         self.rule.get_all_errors())
+
+    def test_iter_error_records(self):
+        self.assertEqual(list(self.rule.iter_error_records()),
+                         self.rule.get_all_error_records())
+        self.assertEqual(list(BooleanNode(True, '').iter_errors()), [])
+        self.assertEqual(
+            list(self.CustomErrorsNode(None, '').iter_error_records()),
+            ['Custom error.'])
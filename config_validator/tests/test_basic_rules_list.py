@@ -85,7 +85,7 @@ class ListNodeTest(unittest.TestCase):
     def test_removing_child(self):
         parent_rule = ListNode([], 'root')
         child_rule = BooleanNode(True, 'child')
-        parent_rule._children.add(child_rule)
+        parent_rule.add_child(child_rule)
         self.assertIn(child_rule, parent_rule._children)
         parent_rule.remove_child(child_rule)
         self.assertNotIn(child_rule, parent_rule._children)
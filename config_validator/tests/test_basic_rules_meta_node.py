@@ -1,6 +1,6 @@
 import unittest
 
-from ..basic_rules import MetaNode, BooleanNode
+from ..basic_rules import MetaNode, BooleanNode, ListNode
 
 
 class MetaNodeTest(unittest.TestCase):
@@ -86,7 +86,7 @@ class MetaNodeTest(unittest.TestCase):
     def test_removing_child(self):
         parent_rule = MetaNode([], 'root')
         child_rule = BooleanNode(True, 'child')
-        parent_rule._children.add(child_rule)
+        parent_rule.add_child(child_rule)
         self.assertIn(child_rule, parent_rule._children)
         parent_rule.remove_child(child_rule)
         self.assertNotIn(child_rule, parent_rule._children)
@@ -131,3 +131,54 @@ class MetaNodeTest(unittest.TestCase):
         self.assertFalse(rule.validate())
         self.assertIsInstance(rule.get_all_errors(), list)
         self.assertEqual(len(rule.get_all_errors()), 10+1)
+
+    def test_validate_stops_on_first_valid_child(self):
+        rule = MetaNode([], 'root')
+        rule.add_child(BooleanNode('Invalid Value', 'child#0'))
+        rule.add_child(BooleanNode(True, 'child#1'))
+        skipped = BooleanNode('Invalid Value', 'child#2')
+        rule.add_child(skipped)
+
+        self.assertTrue(rule.validate())
+        self.assertIsNone(skipped._errors)
+        self.assertIsNone(rule.get_all_errors())
+
+    def test_validate_stops_on_first_valid_nested_child(self):
+        rule = MetaNode([True], 'root')
+        valid_list = ListNode([True], 'child#0')
+        valid_list.add_child(BooleanNode(True, 'child#0/0'))
+        rule.add_child(valid_list)
+        skipped = ListNode('Invalid Value', 'child#1')
+        rule.add_child(skipped)
+
+        self.assertTrue(rule.validate())
+        self.assertIsNone(skipped._errors)
+
+    def test_alternatives_are_built_on_demand(self):
+        built = []
+
+        def alternative(value):
+            def build():
+                built.append(value)
+                return BooleanNode(value, 'child#%d' % len(built))
+            return build
+
+        rule = MetaNode(None, 'root')
+        rule.add_alternative(alternative('Invalid Value'))
+        rule.add_alternative(alternative(True))
+        rule.add_alternative(alternative('Never Built'))
+        self.assertEqual(built, [])
+
+        self.assertTrue(rule.is_valid())
+        self.assertEqual(built, ['Invalid Value', True])
+        self.assertTrue(rule.validate())
+        self.assertEqual(built, ['Invalid Value', True])
+        self.assertEqual(len(rule._children), 2)
+
+    def test_children_after_alternatives(self):
+        rule = MetaNode(None, 'root')
+        rule.add_alternative(lambda: BooleanNode('Invalid Value', 'child#0'))
+        rule.add_child(BooleanNode(1, 'child#1'))
+        self.assertFalse(rule.validate())
+        self.assertEqual([child.path for child in rule._children],
+                         ['child#0', 'child#1'])
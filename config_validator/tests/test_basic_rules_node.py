@@ -1,6 +1,6 @@
 import unittest
 
-from ..basic_rules import Node
+from ..basic_rules import Node, IntegerNode, ListNode, DictNode, MetaNode
 
 
 class NodeTest(unittest.TestCase):
@@ -98,3 +98,15 @@ class NodeTest(unittest.TestCase):
         child_rule = Node(456, 'child')
         with self.assertRaises(NotImplementedError):
             parent_rule.remove_child(child_rule)
+
+    def test_errors_are_created_lazily(self):
+        rule = Node(123, 'root')
+        self.assertIsNone(rule._errors)
+        self.assertEqual(rule.errors, [])
+        rule.errors.append('Custom error.')
+        self.assertEqual(rule.get_all_errors(), ['Custom error.'])
+
+    def test_rules_have_no_instance_dict(self):
+        for rule in (IntegerNode(1, '/'), ListNode([], '/'),
+                     DictNode({}, '/'), MetaNode(None, '/')):
+            self.assertFalse(hasattr(rule, '__dict__'))
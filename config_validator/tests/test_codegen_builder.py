@@ -0,0 +1,68 @@
+import unittest
+
+from ..codegen_builder import CodegenRulesBuilder, GeneratedSchema
+from ..compiled_builder import CompiledRulesBuilder
+from ..compiled_director import CompiledRulesDirector
+from ..logging_schema import logging_schema
+from .test_compiled_director import SCHEMA_CASES, DICT_SCHEMA
+
+
+class CodegenRulesBuilderTest(unittest.TestCase):
+
+    def test_product(self):
+        director = CompiledRulesDirector(logging_schema,
+                                         CodegenRulesBuilder())
+        schema = director.compile_schema()
+        self.assertIsInstance(schema, GeneratedSchema)
+        self.assertIn('def %s(' % schema.function_name, schema.source)
+
+    def test_clean(self):
+        builder = CodegenRulesBuilder()
+        builder.build_integer(None)
+        self.assertIsNotNone(builder.get_product())
+        builder.clean()
+        self.assertIsNone(builder.get_product())
+
+    def test_same_results_as_compiled_rules(self):
+        for schema, value in SCHEMA_CASES:
+            expected = CompiledRulesDirector(
+                schema, CompiledRulesBuilder()).validate(value)
+            result = CompiledRulesDirector(
+                schema, CodegenRulesBuilder()).validate(value)
+            self.assertEqual(result.is_valid, expected.is_valid)
+            self.assertEqual(result.errors, expected.errors)
+
+    def test_is_valid(self):
+        cases = SCHEMA_CASES + [
+            ({'type': 'dictionary', 'strict_keys_set': False}, {'a': 1}),
+            ({'type': 'dictionary', 'strict_keys_set': False,
+              'mandatory': {'a': {'type': 'integer'}},
+              'allowed': {'type': 'string'}}, {'a': 1, 'b': 1}),
+            ({'type': 'dictionary', 'optional': {'a': {'type': 'integer'}}},
+             {'a': 1, 'b': 1}),
+            ({'type': 'string_of_unsigned_integers'}, ''),
+        ]
+        for schema, value in cases:
+            expected = CompiledRulesDirector(
+                schema, CompiledRulesBuilder()).validate(value)
+            director = CompiledRulesDirector(schema, CodegenRulesBuilder())
+            self.assertEqual(director.is_valid(value), expected.is_valid)
+
+    def test_non_literal_keys(self):
+        schema = {
+            'type': 'dictionary',
+            'mandatory': {(1, 2): {'type': 'integer'}},
+            'optional': {None: {'type': 'boolean'}}
+        }
+        director = CompiledRulesDirector(schema, CodegenRulesBuilder())
+        self.assertTrue(director.validate({(1, 2): 1, None: True}))
+        self.assertFalse(director.validate({None: True}))
+        self.assertTrue(director.is_valid({(1, 2): 1, None: True}))
+        self.assertFalse(director.is_valid({None: True}))
+
+    def test_build_rules_tree(self):
+        director = CompiledRulesDirector(DICT_SCHEMA, CodegenRulesBuilder())
+        rules = director.build_rules_tree({'m1': 'a'})
+        self.assertFalse(rules.validate())
+        self.assertEqual(rules.get_all_errors(),
+                         ["Config Error at / : missing key(s): ['m2']."])
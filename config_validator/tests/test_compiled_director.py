@@ -0,0 +1,334 @@
+import unittest
+from collections import OrderedDict
+
+from ..basic_builder import BasicRulesBuilder
+from ..basic_director import BasicRulesDirector
+from ..codegen_builder import CodegenRulesBuilder
+from ..compiled_builder import CompiledRulesBuilder
+from ..compiled_director import CompiledRulesDirector
+from ..logging_schema import logging_schema
+from ..opcode_builder import OpcodeRulesBuilder
+from .. import compiled_rules
+from .. import config_errors
+
+
+LIST_SCHEMA = {
+    'type': 'list',
+    'min_length': 1,
+    'max_length': 3,
+    'allowed': [{'type': 'integer'}, {'type': 'string_of_unsigned_integers'}]
+}
+
+DICT_SCHEMA = {
+    'type': 'dictionary',
+    'mandatory': {
+        'm1': {'type': 'string'},
+        'm2': {'type': 'boolean'}
+    },
+    'optional': {
+        'o1': {'type': 'integer'},
+        'o2': LIST_SCHEMA
+    },
+    'strict_keys_set': False,
+    'allowed': {
+        'type': 'dictionary',
+        'mandatory': {'mm1': {'type': 'not_empty_string'}}
+    }
+}
+
+# Meta rules with alternatives of different types.
+UNION_SCHEMA = {
+    'type': 'list',
+    'allowed': [
+        {'type': 'integer'},
+        {'type': 'not_empty_string'},
+        {'type': 'dictionary', 'strict_keys_set': False,
+         'allowed': [{'type': 'boolean'}, {'type': 'list'}]},
+        {'type': 'boolean'},
+    ]
+}
+
+# Dictionary alternatives told apart by the key 'kind'.
+DISCRIMINATED_SCHEMA = {
+    'type': 'list',
+    'allowed': [
+        {'type': 'dictionary', 'optional': {'a': {'type': 'integer'}}},
+        {'type': 'dictionary', 'discriminator': 'kind',
+         'mandatory': {'kind': {'type': 'string'}},
+         'strict_keys_set': False},
+        {'type': 'dictionary', 'mandatory': {'b': {'type': 'boolean'}},
+         'strict_keys_set': False},
+    ]
+}
+
+# (schema, value) pairs used to compare compiled validators with
+# basic rules validators.
+SCHEMA_CASES = [
+    ({'type': 'integer'}, 1),
+    ({'type': 'integer'}, '1'),
+    ({'type': 'boolean'}, None),
+    ({'type': 'string'}, 1),
+    ({'type': 'not_empty_string'}, ''),
+    ({'type': 'string_of_unsigned_integers'}, '-1'),
+    ([{'type': 'integer'}, {'type': 'boolean'}], 'x'),
+    ([], 1),
+    (UNION_SCHEMA, [1, 'a', True, [], {'b': True, 'l': [1]}, None]),
+    (UNION_SCHEMA, [{'b': 'x'}, 2.5, OrderedDict([('b', False)])]),
+    (DISCRIMINATED_SCHEMA, [{'a': 1}, {'kind': 'x', 'a': 'y'}, {'b': True},
+                            {'kind': 1, 'b': False}, {}, {'a': None}]),
+    (DISCRIMINATED_SCHEMA, [{'kind': 1}, {'a': 1, 'b': 1}, 1]),
+    (LIST_SCHEMA, [1, '2', 3]),
+    (LIST_SCHEMA, [1, '-2', None]),
+    (LIST_SCHEMA, []),
+    (LIST_SCHEMA, [1, 2, 3, 4]),
+    (LIST_SCHEMA, {'a': 1}),
+    ({'type': 'list'}, [1, 'a']),
+    (DICT_SCHEMA, {'m1': '', 'm2': True, 'o2': [1], 'x': {'mm1': 'a'}}),
+    (DICT_SCHEMA, {'m1': 1, 'm2': 1, 'o1': 'a', 'o2': ['a'], 'x': {}}),
+    (DICT_SCHEMA, {'m2': True}),
+    (DICT_SCHEMA, []),
+    (dict(DICT_SCHEMA, strict_keys_set=True), {'m1': '', 'm2': True, 'x': 1}),
+    (logging_schema, {
+        'version': 1,
+        'formatters': {'f': {'format': '%(message)s'},
+                       'c': {'()': 'my.factory', 'arg': 1}},
+        'filters': {'f': {'name': 'x'}},
+        'handlers': {'h': {'class': 'logging.StreamHandler',
+                           'formatter': 'f', 'filters': ['f']}},
+        'loggers': {'l': {'handlers': ['h'], 'propagate': False}},
+        'root': {'level': 'DEBUG', 'handlers': ['h']},
+    }),
+    (logging_schema, {
+        'version': '1',
+        'formatters': {'f': {'format': ''}, 'c': {'()': ''}},
+        'filters': {'f': {'name': 1}},
+        'handlers': {'h': {'level': 'DEBUG', 'filters': 'f'}},
+        'loggers': {'l': {'handlers': [1, ''], 'propagate': 'no'}},
+        'root': {'level': 'DEBUG', 'handlers': 'h', 'unknown': 1},
+        'unknown': True,
+    }),
+]
+
+
+def basic_errors(schema, value):
+    director = BasicRulesDirector(schema, BasicRulesBuilder())
+    rules = director.build_rules_tree(value)
+    return rules.validate(), rules.get_all_errors()
+
+
+class CompiledRulesDirectorTest(unittest.TestCase):
+
+    def test_compile_schema(self):
+        director = CompiledRulesDirector(logging_schema,
+                                         CompiledRulesBuilder())
+        schema = director.compile_schema()
+        self.assertIsInstance(schema, compiled_rules.CompiledSchema)
+        self.assertIs(schema, director.compile_schema())
+
+    def test_is_valid(self):
+        for schema, value in SCHEMA_CASES:
+            expected_valid, _ = basic_errors(schema, value)
+            director = CompiledRulesDirector(schema, CompiledRulesBuilder())
+            self.assertEqual(director.is_valid(value), expected_valid)
+            self.assertEqual(
+                BasicRulesDirector(schema, BasicRulesBuilder())
+                .is_valid(value), expected_valid)
+
+    def test_non_string_keys_paths(self):
+        # paths are rendered only with error messages
+        schema = {'type': 'dictionary', 'strict_keys_set': False,
+                  'allowed': {'type': 'integer'}}
+        director = CompiledRulesDirector(schema, CompiledRulesBuilder())
+        self.assertTrue(director.is_valid({1: 1}))
+        self.assertFalse(director.is_valid({1: 'a'}))
+        self.assertEqual(
+            director.validate({1: 'a'}).get_all_errors(),
+            ["Config Error at / : each of nested values must be valid.",
+             "Config Error at /1 : value must be integer."])
+
+    def test_same_results_as_basic_rules(self):
+        for schema, value in SCHEMA_CASES:
+            director = CompiledRulesDirector(schema, CompiledRulesBuilder())
+            result = director.validate(value)
+            expected_valid, expected_errors = basic_errors(schema, value)
+            self.assertEqual(result.is_valid, expected_valid)
+            self.assertEqual(result.get_all_errors(), expected_errors)
+
+    def test_same_errors_order_in_all_backends(self):
+        schema = {'type': 'dictionary',
+                  'mandatory': dict(('m%d' % index, {'type': 'integer'})
+                                    for index in range(10))}
+        value = dict(('u%d' % index, index) for index in range(10))
+        _, expected_errors = basic_errors(schema, value)
+        self.assertEqual(
+            expected_errors,
+            ["Config Error at / : missing key(s): %s." % sorted(schema[
+                'mandatory']),
+             "Config Error at / : unknown key(s): %s." % sorted(value)])
+        for builder_class in (CompiledRulesBuilder, CodegenRulesBuilder,
+                              OpcodeRulesBuilder):
+            director = CompiledRulesDirector(schema, builder_class())
+            self.assertEqual(director.validate(value).get_all_errors(),
+                             expected_errors)
+
+    def test_many_values(self):
+        director = CompiledRulesDirector({'type': 'integer'},
+                                         CompiledRulesBuilder())
+        for value in range(100):
+            self.assertTrue(director.validate(value))
+        self.assertFalse(director.validate('100'))
+
+    def test_build_rules_tree(self):
+        director = CompiledRulesDirector(LIST_SCHEMA, CompiledRulesBuilder())
+        rules = director.build_rules_tree([1, 'a'])
+        self.assertFalse(rules.validate())
+        self.assertEqual(len(rules.get_all_errors()), 4)
+        self.assertTrue(director.build_rules_tree([1, '2']).validate())
+
+    def test_bad_rules_definitions(self):
+        schema = {
+            'type': 'dictionary',
+            'optional': {'a': {'type': 'unknown'}, 'b': 'bad definition'}
+        }
+        director = CompiledRulesDirector(schema, CompiledRulesBuilder())
+        with self.assertRaises(ValueError):
+            director.compile_schema()
+
+
+class ErrorsBudgetTest(unittest.TestCase):
+
+    BUILDERS = (CompiledRulesBuilder, CodegenRulesBuilder, OpcodeRulesBuilder)
+
+    def test_same_results_with_large_budget(self):
+        for builder_class in self.BUILDERS:
+            for schema, value in SCHEMA_CASES:
+                director = CompiledRulesDirector(schema, builder_class())
+                expected = director.validate(value)
+                result = director.validate(value, max_errors=1000)
+                self.assertEqual(result.is_valid, expected.is_valid)
+                self.assertEqual(result.errors, expected.errors)
+                self.assertFalse(result.truncated)
+
+    def test_truncated(self):
+        schema = {'type': 'list', 'allowed': {'type': 'integer'}}
+        for builder_class in self.BUILDERS:
+            director = CompiledRulesDirector(schema, builder_class())
+            result = director.validate(['a'] * 100000, max_errors=5)
+            self.assertFalse(result)
+            self.assertTrue(result.truncated)
+            self.assertEqual(result.errors, [
+                'Config Error at /%d : value must be integer.' % index
+                for index in range(5)])
+
+    def test_alternatives(self):
+        schema = [{'type': 'list', 'allowed': {'type': 'integer'}},
+                  {'type': 'list', 'allowed': {'type': 'string'}}]
+        for builder_class in self.BUILDERS:
+            director = CompiledRulesDirector(schema, builder_class())
+            # the first alternative overflows the budget
+            result = director.validate(['a'] * 100, max_errors=3)
+            self.assertTrue(result)
+            self.assertFalse(result.truncated)
+
+            result = director.validate([None] * 100, max_errors=3)
+            self.assertFalse(result)
+            self.assertTrue(result.truncated)
+            self.assertEqual(result.errors, [
+                'Config Error at / : All allowed alternatives are not valid.',
+                'Config Error at (alt.#1)/0 : value must be integer.',
+                'Config Error at (alt.#1)/1 : value must be integer.'])
+
+    def test_error_sink(self):
+        for builder_class in self.BUILDERS:
+            for schema, value in SCHEMA_CASES:
+                director = CompiledRulesDirector(schema, builder_class())
+                expected = director.validate(value)
+                found = []
+                result = director.validate(value, error_sink=found.append)
+                self.assertEqual(result.is_valid, expected.is_valid)
+                self.assertEqual(result.records, [])
+                self.assertEqual(sorted(map(str, found)),
+                                 sorted(expected.errors))
+
+    def test_error_sink_order(self):
+        schema = {'type': 'list', 'allowed': {'type': 'integer'}}
+        for builder_class in self.BUILDERS:
+            director = CompiledRulesDirector(schema, builder_class())
+            found = []
+            result = director.validate(['a'] * 100, max_errors=3,
+                                       error_sink=found.append)
+            self.assertTrue(result.truncated)
+            self.assertEqual(map(str, found), [
+                'Config Error at /%d : value must be integer.' % index
+                for index in range(3)])
+
+            # error of the list goes after errors of its items
+            found = []
+            director.validate(['a', 1], error_sink=found.append)
+            self.assertEqual([error.code for error in found],
+                             [config_errors.INTEGER, config_errors.NESTED])
+
+    def test_basic_rules_errors(self):
+        director = BasicRulesDirector(
+            {'type': 'list', 'allowed': {'type': 'integer'}},
+            BasicRulesBuilder())
+        rules = director.build_rules_tree(['a'] * 10)
+        rules.validate()
+        self.assertEqual(len(rules.get_all_errors()), 11)
+        self.assertEqual(len(rules.get_all_errors(max_errors=3)), 3)
+        self.assertEqual(rules.get_all_errors(max_errors=3)[0],
+                         'Config Error at / : each of nested values'
+                         ' must be valid.')
+
+
+class InterningTest(unittest.TestCase):
+
+    BUILDERS = (CompiledRulesBuilder, CodegenRulesBuilder, OpcodeRulesBuilder)
+
+    @staticmethod
+    def point_schema():
+        # a new object each time, equal subschemas are not the same objects
+        return {'type': 'dictionary',
+                'mandatory': {'x': {'type': 'integer'},
+                              'y': {'type': 'integer'}}}
+
+    def schema(self):
+        return {'type': 'dictionary',
+                'mandatory': {'a': self.point_schema(),
+                              'b': self.point_schema()},
+                'optional': {'c': {'type': 'list',
+                                   'allowed': self.point_schema()}}}
+
+    def test_shared_rules(self):
+        director = CompiledRulesDirector(self.schema(), CompiledRulesBuilder())
+        director.schema_cache = None
+        root = director.compile_schema().root_rule
+        point = root.keys_rules['a']
+        self.assertIs(root.keys_rules['b'], point)
+        self.assertIs(root.keys_rules['c'].allowed, point)
+        self.assertIs(point.keys_rules['x'], point.keys_rules['y'])
+
+    def test_shared_instructions(self):
+        director = CompiledRulesDirector(self.schema(), OpcodeRulesBuilder())
+        director.schema_cache = None
+        # root, point, integer and list
+        self.assertEqual(len(director.compile_schema().program), 4)
+
+    def test_same_errors(self):
+        value = {'a': {'x': 1, 'y': 'a'}, 'b': {'x': 1},
+                 'c': [{'x': 1, 'y': 2}, {'y': [], 'z': 0}]}
+        _, expected_errors = basic_errors(self.schema(), value)
+        for builder_class in self.BUILDERS:
+            director = CompiledRulesDirector(self.schema(), builder_class())
+            director.schema_cache = None
+            self.assertEqual(director.validate(value).get_all_errors(),
+                             expected_errors)
+
+    def test_bad_definitions_are_not_shared(self):
+        schema = {'type': 'dictionary',
+                  'optional': {'a': {'type': 'unknown'},
+                               'b': {'type': 'unknown'}}}
+        director = CompiledRulesDirector(schema, CompiledRulesBuilder())
+        director.schema_cache = None
+        with self.assertRaisesRegexp(ValueError, 'Got 2 bad rules'):
+            director.compile_schema()
@@ -0,0 +1,303 @@
+import unittest
+from collections import OrderedDict
+
+from .. import compiled_rules
+from .. import config_errors
+from ..config_errors import ConfigError, render_error
+
+
+def render(errors):
+    return [render_error(error) for error in errors]
+
+
+class SimpleRulesTest(unittest.TestCase):
+
+    def check(self, rule, value):
+        errors = []
+        return rule.check(value, '/path', errors), errors
+
+    def test_integer_rule(self):
+        rule = compiled_rules.IntegerRule()
+        self.assertEqual(self.check(rule, 1), (True, []))
+        for value in (True, '1', 1.0, None):
+            valid, errors = self.check(rule, value)
+            self.assertFalse(valid)
+            self.assertEqual(render(errors),
+                             ['Config Error at /path : value must'
+                              ' be integer.'])
+
+    def test_boolean_rule(self):
+        rule = compiled_rules.BooleanRule()
+        self.assertEqual(self.check(rule, False), (True, []))
+        valid, errors = self.check(rule, 0)
+        self.assertFalse(valid)
+        self.assertEqual(len(errors), 1)
+
+    def test_string_rule(self):
+        rule = compiled_rules.StringRule()
+        self.assertEqual(self.check(rule, ''), (True, []))
+        self.assertEqual(self.check(rule, u'unicode'), (True, []))
+        valid, errors = self.check(rule, 1)
+        self.assertFalse(valid)
+        self.assertEqual(len(errors), 1)
+
+    def test_not_empty_string_rule(self):
+        rule = compiled_rules.NotEmptyStringRule()
+        self.assertEqual(self.check(rule, 'a'), (True, []))
+        for value in ('', None):
+            valid, errors = self.check(rule, value)
+            self.assertFalse(valid)
+            self.assertEqual(len(errors), 1)
+
+    def test_string_of_unsigned_integer_rule(self):
+        rule = compiled_rules.StringOfUnsignedIntegerRule()
+        self.assertEqual(self.check(rule, '123'), (True, []))
+        for value in ('', '-1', '+1', 123):
+            valid, errors = self.check(rule, value)
+            self.assertFalse(valid)
+            self.assertEqual(len(errors), 1)
+
+    def test_root_path(self):
+        errors = []
+        self.assertFalse(compiled_rules.IntegerRule().check(None, '', errors))
+        self.assertEqual(render(errors), ['Config Error at / : value must'
+                                  ' be integer.'])
+
+
+class CompositeRulesTest(unittest.TestCase):
+
+    def test_list_rule(self):
+        rule = compiled_rules.ListRule(min_length=1, max_length=2)
+        rule.add_child(compiled_rules.IntegerRule(), ('allowed', None))
+        errors = []
+        self.assertTrue(rule.check([1, 2], '', errors))
+        self.assertFalse(rule.check([], '', errors))
+        self.assertFalse(rule.check([1, 2, 3], '', errors))
+        self.assertEqual(len(errors), 2)
+
+    def test_list_rule_nested_errors_order(self):
+        rule = compiled_rules.ListRule()
+        rule.add_child(compiled_rules.IntegerRule(), ('allowed', None))
+        errors = []
+        self.assertFalse(rule.check([1, 'a', 'b'], '/list', errors))
+        self.assertEqual(render(errors), [
+            'Config Error at /list : each of nested values must be valid.',
+            'Config Error at /list/1 : value must be integer.',
+            'Config Error at /list/2 : value must be integer.',
+        ])
+
+    def test_dict_rule(self):
+        rule = compiled_rules.DictRule({'m'}, {'o'}, True)
+        rule.add_child(compiled_rules.IntegerRule(), ('mandatory', 'm'))
+        rule.add_child(compiled_rules.BooleanRule(), ('optional', 'o'))
+        errors = []
+        self.assertTrue(rule.check({'m': 1, 'o': True}, '', errors))
+        self.assertEqual(errors, [])
+        self.assertFalse(rule.check({'o': True, 'x': 1}, '', errors))
+        self.assertEqual(render(errors), [
+            "Config Error at / : missing key(s): ['m'].",
+            "Config Error at / : unknown key(s): ['x'].",
+        ])
+
+    def test_dict_rule_allowed(self):
+        rule = compiled_rules.DictRule(strict_keys_set=False)
+        rule.add_child(compiled_rules.IntegerRule(), ('allowed', None))
+        errors = []
+        self.assertTrue(rule.check({'a': 1, 'b': 2}, '', errors))
+        self.assertFalse(rule.check({'a': 'x'}, '', errors))
+        self.assertEqual(render(errors), [
+            'Config Error at / : each of nested values must be valid.',
+            'Config Error at /a : value must be integer.',
+        ])
+
+    def test_meta_rule(self):
+        rule = compiled_rules.MetaRule()
+        rule.add_child(compiled_rules.IntegerRule(), ('alternative', 1))
+        rule.add_child(compiled_rules.BooleanRule(), ('alternative', 2))
+        errors = []
+        self.assertTrue(rule.check(1, '', errors))
+        self.assertTrue(rule.check(True, '', errors))
+        self.assertEqual(errors, [])
+        self.assertFalse(rule.check('a', '', errors))
+        self.assertEqual(render(errors), [
+            'Config Error at / : All allowed alternatives are not valid.',
+            'Config Error at (alt.#1) : value must be integer.',
+            'Config Error at (alt.#2) : value must be boolean.',
+        ])
+
+    def test_meta_rule_types_index(self):
+        tried = []
+
+        class RecordingRule(compiled_rules.StringRule):
+            def is_valid(self, value):
+                tried.append(value)
+                return super(RecordingRule, self).is_valid(value)
+
+        rule = compiled_rules.MetaRule()
+        rule.add_child(compiled_rules.IntegerRule(), ('alternative', 1))
+        rule.add_child(RecordingRule(), ('alternative', 2))
+        rule.add_child(compiled_rules.DictRule(), ('alternative', 3))
+        errors = []
+        self.assertTrue(rule.check(1, '', errors))
+        self.assertTrue(rule.check({}, '', errors))
+        self.assertTrue(rule.is_valid(1))
+        self.assertEqual(tried, [])
+        self.assertTrue(rule.check('a', '', errors))
+        self.assertEqual(tried, ['a'])
+        self.assertEqual(errors, [])
+
+        # not accepted types and subclasses are checked with all of
+        # alternatives
+        self.assertFalse(rule.check(None, '', errors))
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(rule.is_valid(OrderedDict()))
+        self.assertTrue(rule.accepts_type(OrderedDict))
+        self.assertFalse(rule.accepts_type(list))
+
+    def test_meta_rule_discriminator(self):
+        tried = []
+
+        class RecordingRule(compiled_rules.DictRule):
+            def is_valid(self, value):
+                tried.append(self)
+                return super(RecordingRule, self).is_valid(value)
+
+        plain = RecordingRule(optional_keys=['a'])
+        custom = RecordingRule(mandatory_keys=['()'], strict_keys_set=False)
+        rule = compiled_rules.MetaRule()
+        rule.add_child(plain, ('alternative', 1))
+        rule.add_child(custom, ('alternative', 2))
+        self.assertTrue(rule.is_valid({'a': 1}))
+        self.assertTrue(rule.is_valid({'()': 'factory'}))
+        self.assertEqual(tried, [plain, custom])
+
+        errors = []
+        self.assertFalse(rule.check({'a': 1, 'b': 2}, '', errors))
+        self.assertEqual(len(errors), 3)
+
+    def test_find_discriminator(self):
+        plain = compiled_rules.DictRule(optional_keys=['a'])
+        custom = compiled_rules.DictRule(mandatory_keys=['()'],
+                                         strict_keys_set=False)
+        accepts_key = lambda rule, key, present: rule.accepts_key(key,
+                                                                  present)
+        self.assertEqual(
+            compiled_rules.find_discriminator([plain, custom], ['a', '()'],
+                                              accepts_key),
+            ('()', (custom,), (plain,)))
+        self.assertIsNone(compiled_rules.find_discriminator(
+            [plain, custom], ['a'], accepts_key))
+        self.assertEqual(compiled_rules.discriminator_keys(
+            None, [frozenset(['b']), frozenset(['a', 'b'])]), ['a', 'b'])
+        self.assertEqual(compiled_rules.discriminator_keys(
+            'c', [frozenset(['b'])]), ['c'])
+
+    def test_meta_rule_without_alternatives(self):
+        errors = []
+        self.assertFalse(compiled_rules.MetaRule().check(1, '', errors))
+        self.assertEqual(len(errors), 1)
+        self.assertFalse(compiled_rules.MetaRule().is_valid(1))
+
+    def test_is_valid(self):
+        rule = compiled_rules.ListRule(max_length=2)
+        rule.add_child(compiled_rules.NotEmptyStringRule(), ('allowed', None))
+        self.assertTrue(rule.is_valid(['a', 'b']))
+        self.assertFalse(rule.is_valid(['a', '']))
+        self.assertFalse(rule.is_valid(['a', 'b', 'c']))
+        self.assertFalse(rule.is_valid('a'))
+
+
+class ErrorsCollectorTest(unittest.TestCase):
+
+    def test_budget(self):
+        errors = compiled_rules.ErrorsCollector(2)
+        errors.append('a')
+        errors.insert(0, 'b')
+        self.assertEqual(errors, ['b', 'a'])
+        with self.assertRaises(compiled_rules.ErrorsLimitReached) as context:
+            errors.append('c')
+        self.assertIs(context.exception.collector, errors)
+        self.assertEqual(len(errors), 2)
+
+    def test_fork(self):
+        errors = compiled_rules.ErrorsCollector(2)
+        errors.append('a')
+        fork = compiled_rules.new_errors_buffer(errors)
+        self.assertEqual(fork, [])
+        self.assertEqual(fork.max_errors, 2)
+        self.assertEqual(type(compiled_rules.new_errors_buffer([])), list)
+
+
+class ErrorsSinkTest(unittest.TestCase):
+
+    def test_callback(self):
+        found = []
+        errors = compiled_rules.ErrorsSink(found.append, 2)
+        errors.append((config_errors.STRING, ('', '/%s', 'a'), ()))
+        errors.insert(0, (config_errors.NESTED, '', ()))
+        self.assertEqual(found, [ConfigError(config_errors.STRING, '/a'),
+                                 ConfigError(config_errors.NESTED, '')])
+        self.assertEqual(len(errors), 2)
+        with self.assertRaises(compiled_rules.ErrorsLimitReached) as context:
+            errors.append((config_errors.STRING, '', ()))
+        self.assertIs(context.exception.collector, errors)
+        self.assertEqual(len(found), 2)
+
+    def test_fork(self):
+        errors = compiled_rules.ErrorsSink(None, 2)
+        self.assertEqual(compiled_rules.new_errors_buffer(errors).max_errors,
+                         2)
+        errors = compiled_rules.ErrorsSink(None)
+        self.assertEqual(type(compiled_rules.new_errors_buffer(errors)), list)
+
+
+class ErrorRecordsTest(unittest.TestCase):
+
+    def test_records(self):
+        rule = compiled_rules.ListRule(min_length=2)
+        errors = []
+        self.assertFalse(rule.check([1], '/list', errors))
+        self.assertEqual(errors, [
+            ConfigError(config_errors.MIN_LENGTH, '/list', 2)])
+        error = config_errors.record(errors[0])
+        self.assertEqual(error.params, (2,))
+        self.assertEqual(str(error), 'Config Error at /list : the value'
+                                     ' must have at list 2 items.')
+
+    def test_result(self):
+        schema = compiled_rules.RulesTreeSchema(compiled_rules.StringRule())
+        result = schema.validate(1)
+        self.assertEqual(result.get_all_error_records(),
+                         [ConfigError(config_errors.STRING, '')])
+        self.assertEqual(result.get_all_errors(),
+                         ['Config Error at / : value must be string.'])
+        self.assertIsNone(schema.validate('a').get_all_error_records())
+
+
+class CompiledSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = compiled_rules.RulesTreeSchema(
+            compiled_rules.IntegerRule())
+
+    def test_validate(self):
+        result = self.schema.validate(1)
+        self.assertTrue(result)
+        self.assertTrue(result.is_valid)
+        self.assertIsNone(result.get_all_errors())
+
+        result = self.schema.validate('1')
+        self.assertFalse(result)
+        self.assertEqual(len(result.get_all_errors()), 1)
+
+    def test_is_valid(self):
+        self.assertTrue(self.schema.is_valid(1))
+        self.assertFalse(self.schema.is_valid('1'))
+        self.assertFalse(self.schema.bind('1').is_valid())
+
+    def test_bind(self):
+        rules = self.schema.bind('1')
+        self.assertEqual(rules.value, '1')
+        self.assertIsNone(rules.get_all_errors())
+        self.assertFalse(rules.validate())
+        self.assertEqual(len(rules.get_all_errors()), 1)
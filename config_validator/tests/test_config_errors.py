@@ -0,0 +1,77 @@
+import unittest
+
+from .. import config_errors
+from ..config_errors import ConfigError, render_error
+from ..basic_rules import DictNode, IntegerNode, ListNode
+
+
+class ConfigErrorTest(unittest.TestCase):
+
+    def test_render(self):
+        error = ConfigError(config_errors.MISSING_KEYS, '/a', ['b'])
+        self.assertEqual(error.render(),
+                         "Config Error at /a : missing key(s): ['b'].")
+        self.assertEqual(str(error), error.render())
+        self.assertEqual(ConfigError(config_errors.INTEGER, '').render(),
+                         'Config Error at / : value must be integer.')
+
+    def test_equality(self):
+        error = ConfigError(config_errors.MIN_LENGTH, '/a', 1)
+        self.assertEqual(error, ConfigError(config_errors.MIN_LENGTH, '/a', 1))
+        self.assertNotEqual(error,
+                            ConfigError(config_errors.MIN_LENGTH, '/a', 2))
+        self.assertNotEqual(error, error.render())
+        self.assertEqual(repr(error), "ConfigError('min_length', '/a', 1)")
+
+    def test_record(self):
+        error = config_errors.record((config_errors.MIN_LENGTH, '/a', (1,)))
+        self.assertIsInstance(error, ConfigError)
+        self.assertEqual(error.code, config_errors.MIN_LENGTH)
+        self.assertEqual(error.path, '/a')
+        self.assertEqual(error.params, (1,))
+        self.assertIs(config_errors.record(error), error)
+        self.assertEqual(config_errors.record('custom error'), 'custom error')
+
+    def test_render_error(self):
+        self.assertEqual(render_error('custom error'), 'custom error')
+        self.assertEqual(render_error(ConfigError(config_errors.LIST, '/')),
+                         'Config Error at / : value must be list.')
+
+    def test_all_codes_have_messages(self):
+        for code in (config_errors.INTEGER, config_errors.BOOLEAN,
+                     config_errors.STRING, config_errors.NOT_EMPTY_STRING,
+                     config_errors.STRING_OF_UNSIGNED_INTEGERS,
+                     config_errors.LIST, config_errors.DICTIONARY,
+                     config_errors.MIN_LENGTH, config_errors.MAX_LENGTH,
+                     config_errors.MISSING_KEYS, config_errors.UNKNOWN_KEYS,
+                     config_errors.NESTED, config_errors.ALTERNATIVES):
+            self.assertIn(code, config_errors.MESSAGES)
+
+
+class BasicRulesErrorRecordsTest(unittest.TestCase):
+
+    def test_records(self):
+        rule = ListNode([1, 'a'], '/')
+        rule.add_child(IntegerNode(1, '/0'))
+        rule.add_child(IntegerNode('a', '/1'))
+        self.assertFalse(rule.validate())
+        self.assertEqual(rule.get_all_error_records(), [
+            ConfigError(config_errors.NESTED, '/'),
+            ConfigError(config_errors.INTEGER, '/1')])
+        self.assertEqual(rule.get_all_errors(), [
+            'Config Error at / : each of nested values must be valid.',
+            'Config Error at /1 : value must be integer.'])
+
+    def test_params(self):
+        rule = DictNode({'a': 1}, '/')
+        rule.mandatory_keys = set(['b'])
+        rule.strict_keys_set = False
+        self.assertFalse(rule.validate())
+        record, = rule.get_all_error_records()
+        self.assertEqual(record.code, config_errors.MISSING_KEYS)
+        self.assertEqual(record.params, (['b'],))
+
+    def test_custom_string_errors(self):
+        rule = IntegerNode(1, '/')
+        rule.errors.append('Custom error.')
+        self.assertEqual(rule.get_all_errors(), ['Custom error.'])
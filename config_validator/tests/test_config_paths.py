@@ -0,0 +1,59 @@
+import unittest
+
+from ..config_paths import (child_path, rebase_path, render_path, ITEM,
+                            ALTERNATIVE)
+
+
+class RenderPathTest(unittest.TestCase):
+
+    def test_string_paths(self):
+        self.assertEqual(render_path(''), '')
+        self.assertEqual(render_path('/a/b'), '/a/b')
+
+    def test_linked_paths(self):
+        path = ('', ITEM, 'handlers')
+        path = (path, ITEM, 0)
+        self.assertEqual(render_path(path), '/handlers/0')
+        self.assertEqual(render_path((path, ALTERNATIVE, 2)),
+                         '/handlers/0(alt.#2)')
+
+    def test_child_path(self):
+        path = child_path(child_path('', 'handlers'), 0)
+        self.assertEqual(path, (('', ITEM, 'handlers'), ITEM, 0))
+        self.assertEqual(render_path(child_path('/a', 'b')), '/a/b')
+
+    def test_linked_to_string_path(self):
+        self.assertEqual(render_path(('/a', ITEM, 'b')), '/a/b')
+
+    def test_tuple_keys(self):
+        self.assertEqual(render_path(('', ITEM, (1, 2))), '/(1, 2)')
+
+    def test_texts_of_parents(self):
+        texts = {}
+        parent = (('', ITEM, 'a'), ITEM, 'b')
+        first, second = (parent, ITEM, 0), (parent, ITEM, 1)
+        self.assertEqual(render_path(first, texts), '/a/b/0')
+        self.assertEqual(texts[id(parent)], (parent, '/a/b'))
+        self.assertEqual(render_path(second, texts), '/a/b/1')
+        self.assertEqual(render_path('/c', texts), '/c')
+
+    def test_texts_of_temporary_paths(self):
+        texts = {}
+        for key in range(100):
+            self.assertEqual(render_path(('', ITEM, key), texts),
+                             '/%s' % (key,))
+
+
+class RebasePathTest(unittest.TestCase):
+
+    def test_nested_path(self):
+        base = ('', ITEM, 'a')
+        new_base = ('', ITEM, 'b')
+        path = ((base, ITEM, 0), ALTERNATIVE, 1)
+        self.assertEqual(render_path(rebase_path(path, base, new_base)),
+                         '/b/0(alt.#1)')
+        self.assertIs(rebase_path(base, base, new_base), new_base)
+
+    def test_not_nested_path(self):
+        path = ('', ITEM, 'c')
+        self.assertIs(rebase_path(path, ('', ITEM, 'a'), '/b'), path)
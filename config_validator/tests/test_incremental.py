@@ -0,0 +1,325 @@
+import copy
+import random
+import unittest
+
+from ..basic_builder import BasicRulesBuilder
+from ..basic_director import BasicRulesDirector
+from ..incremental import IncrementalValidation, parse_pointer
+from ..logging_schema import logging_schema
+
+
+LOGGING_CONFIG = {
+    'version': 1,
+    'formatters': {'f': {'format': '%(message)s'},
+                   'c': {'()': 'my.factory', 'option': 1}},
+    'handlers': {'h%d' % number: {'class': 'logging.StreamHandler',
+                                  'level': 'DEBUG',
+                                  'formatter': 'f',
+                                  'filters': ['a']}
+                 for number in range(3)},
+    'loggers': {'l%d' % number: {'level': 'INFO',
+                                 'handlers': ['h1', 'h2'],
+                                 'propagate': False}
+                for number in range(3)},
+    'root': {'level': 'INFO'},
+}
+
+
+class ParsePointerTest(unittest.TestCase):
+
+    def test_root(self):
+        self.assertEqual(parse_pointer(''), [])
+
+    def test_tokens(self):
+        self.assertEqual(parse_pointer('/a/0/'), ['a', '0', ''])
+
+    def test_escapes(self):
+        self.assertEqual(parse_pointer('/a~1b/c~0d/~01'),
+                         ['a/b', 'c~d', '~1'])
+
+    def test_bad_pointer(self):
+        self.assertRaises(ValueError, parse_pointer, 'a/b')
+
+
+class IncrementalValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = copy.deepcopy(LOGGING_CONFIG)
+        self.validation = IncrementalValidation(
+            BasicRulesDirector(logging_schema, BasicRulesBuilder()),
+            self.config)
+
+    def assertSameAsFullValidation(self, result):
+        rules = BasicRulesDirector(
+            logging_schema,
+            BasicRulesBuilder()).build_rules_tree(self.validation.config)
+        is_valid = rules.validate()
+        expected = rules.get_all_errors()
+        self.assertEqual(self.validation.is_valid(), is_valid)
+        self.assertEqual(bool(result), is_valid)
+        errors = result.get_all_errors()
+        if expected is None:
+            self.assertIsNone(errors)
+        else:
+            self.assertEqual(sorted(errors), sorted(expected))
+
+    def test_valid_config(self):
+        self.assertTrue(self.validation.is_valid())
+        self.assertIsNone(self.validation.get_all_errors())
+
+    def test_replace_leaf(self):
+        self.config['handlers']['h1']['level'] = 1
+        result = self.validation.update(['/handlers/h1/level'])
+        self.assertIn('Config Error at /handlers/h1(alt.#1)/level : '
+                      'value must be string.', result.get_all_errors())
+        self.assertSameAsFullValidation(result)
+
+        self.config['handlers']['h1']['level'] = 'INFO'
+        result = self.validation.update([('handlers', 'h1', 'level')])
+        self.assertTrue(result)
+        self.assertIsNone(result.get_all_errors())
+        self.assertTrue(self.validation.is_valid())
+
+    def test_only_changed_rules_are_built(self):
+        rules = self.validation.rules
+        children = list(rules._children)
+        self.config['root']['level'] = 1
+        self.validation.update(['/root/level'])
+        self.assertIs(self.validation.rules, rules)
+        changed = [rule for rule in rules._children if rule not in children]
+        self.assertEqual(changed, [])
+
+    def test_missing_mandatory_key(self):
+        del self.config['handlers']['h0']['class']
+        result = self.validation.update(['/handlers/h0/class'])
+        self.assertSameAsFullValidation(result)
+        self.assertFalse(self.validation.is_valid())
+
+        self.config['handlers']['h0']['class'] = 'logging.NullHandler'
+        self.assertTrue(self.validation.update(['/handlers/h0/class']))
+
+    def test_result_is_lazy(self):
+        self.config['root']['level'] = 1
+        result = self.validation.update(['/root/level'])
+        self.assertFalse(result)
+        self.config['root']['level'] = 'INFO'
+        self.assertTrue(self.validation.update(['/root/level']))
+        # errors are of the config at the time of the call
+        self.assertIsNone(result.get_all_errors())
+
+    def test_positions_of_removed_rules_are_forgotten(self):
+        self.validation.update(['/handlers/h0/level', '/loggers/l0/level'])
+        rules = self.validation.rules
+        nested_rules = dict((rule._path[2], rule) for rule in rules._children)
+        handlers = nested_rules['handlers']
+        loggers = nested_rules['loggers']
+        cached = set(self.validation._positions)
+        self.assertTrue({id(rules), id(handlers), id(loggers)} <= cached)
+
+        self.config['handlers'] = {'h': {'class': 'logging.StreamHandler'}}
+        self.validation.update(['/handlers'])
+        self.assertEqual(set(self.validation._positions),
+                         cached - {id(handlers)})
+        self.assertSameAsFullValidation(
+            self.validation.update(['/loggers/l0/level']))
+
+    def test_unknown_key(self):
+        self.config['root']['unknown'] = 1
+        result = self.validation.update(['/root/unknown'])
+        self.assertSameAsFullValidation(result)
+        self.assertFalse(self.validation.is_valid())
+
+    def test_list_length(self):
+        self.config['loggers']['l0']['handlers'].append(1)
+        result = self.validation.update(['/loggers/l0/handlers'])
+        self.assertSameAsFullValidation(result)
+        self.config['loggers']['l0']['handlers'].pop()
+        self.assertTrue(self.validation.update(['/loggers/l0/handlers']))
+
+    def test_meta_rule(self):
+        self.config['formatters']['c'] = {'format': 1}
+        result = self.validation.update(['/formatters/c'])
+        self.assertSameAsFullValidation(result)
+        self.config['formatters']['c']['format'] = 'x'
+        self.assertTrue(self.validation.update(['/formatters/c/format']))
+
+    def test_nested_changed_paths(self):
+        self.config['root'] = {'level': 1, 'handlers': [2]}
+        result = self.validation.update(['/root/handlers/0', '/root',
+                                         '/root/level'])
+        self.assertSameAsFullValidation(result)
+
+    def test_shared_values(self):
+        handler = {'class': 'logging.StreamHandler'}
+        self.config['handlers'] = {'a': handler, 'b': handler}
+        self.validation.update(['/handlers'])
+        handler['class'] = 1
+        result = self.validation.update(['/handlers/a/class'])
+        errors = result.get_all_errors()
+        self.assertIn('Config Error at /handlers/a(alt.#1)/class : '
+                      'value must be string.', errors)
+        self.assertIn('Config Error at /handlers/b(alt.#1)/class : '
+                      'value must be string.', errors)
+        self.assertSameAsFullValidation(result)
+
+    def test_root_changed(self):
+        result = self.validation.apply_patch(
+            [{'op': 'replace', 'path': '', 'value': []}])
+        self.assertFalse(result)
+        self.assertSameAsFullValidation(result)
+
+    def test_random_changes(self):
+        generator = random.Random(0)
+        leaves = [1, 'a', '', 'DEBUG', True, None, [], {}, ['h'],
+                  {'format': 'x'}, {'class': 'x'}, {'()': 'y'}]
+        keys = ['level', 'handlers', 'class', 'filters', 'format', 'x']
+
+        def random_value(depth=0):
+            chance = generator.random()
+            if depth > 2 or chance < 0.6:
+                return copy.deepcopy(generator.choice(leaves))
+            if chance < 0.8:
+                return [random_value(depth + 1)
+                        for _ in range(generator.randint(0, 3))]
+            return {generator.choice(keys): random_value(depth + 1)
+                    for _ in range(generator.randint(0, 3))}
+
+        def all_paths(value, path=()):
+            yield path
+            if isinstance(value, dict):
+                items = value.items()
+            elif isinstance(value, list):
+                items = enumerate(value)
+            else:
+                items = ()
+            for key, nested_value in items:
+                for nested_path in all_paths(nested_value, path + (key,)):
+                    yield nested_path
+
+        for _ in range(50):
+            self.setUp()
+            for _ in range(5):
+                path = generator.choice(list(all_paths(self.config)))
+                value = self.config
+                for key in path:
+                    value = value[key]
+                if isinstance(value, dict):
+                    key = generator.choice(keys)
+                    if key in value and generator.random() < 0.5:
+                        del value[key]
+                    else:
+                        value[key] = random_value()
+                    changed = path + (key,)
+                elif isinstance(value, list):
+                    if value and generator.random() < 0.5:
+                        del value[0]
+                    else:
+                        value.append(random_value())
+                    changed = path
+                else:
+                    continue
+                self.assertSameAsFullValidation(
+                    self.validation.update([changed]))
+
+
+class IteratedList(list):
+    """List, that counts its iterations."""
+
+    iterations = 0
+
+    def __iter__(self):
+        self.iterations += 1
+        return super(IteratedList, self).__iter__()
+
+
+class WideMappingTest(unittest.TestCase):
+
+    def test_nested_rules_are_not_scanned(self):
+        config = dict(('k%d' % number, number) for number in range(1000))
+        validation = IncrementalValidation(
+            BasicRulesDirector({'type': 'dictionary',
+                                'strict_keys_set': False,
+                                'allowed': {'type': 'integer'}},
+                               BasicRulesBuilder()),
+            config)
+        config['k1'] = 'x'
+        self.assertFalse(validation.update(['/k1']))
+        rules = validation.rules
+        rules._children = IteratedList(rules._children)
+
+        config['k2'] = 'x'
+        self.assertFalse(validation.update(['/k2']))
+        config['k1'] = 1
+        self.assertFalse(validation.update(['/k1']))
+        config['k2'] = 2
+        self.assertTrue(validation.update(['/k2']))
+        config['new'] = 'x'
+        result = validation.update(['/new'])
+        self.assertFalse(result)
+        del config['new']
+        self.assertTrue(validation.update(['/new']))
+        self.assertEqual(rules._children.iterations, 0)
+
+
+class ApplyPatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validation = IncrementalValidation(
+            BasicRulesDirector(logging_schema, BasicRulesBuilder()),
+            copy.deepcopy(LOGGING_CONFIG))
+
+    def test_add_replace_remove(self):
+        result = self.validation.apply_patch([
+            {'op': 'add', 'path': '/loggers/l0/handlers/-', 'value': 'h0'},
+            {'op': 'replace', 'path': '/root/level', 'value': 'DEBUG'},
+            {'op': 'remove', 'path': '/handlers/h2/filters'},
+        ])
+        self.assertTrue(result)
+        config = self.validation.config
+        self.assertEqual(config['loggers']['l0']['handlers'],
+                         ['h1', 'h2', 'h0'])
+        self.assertEqual(config['root']['level'], 'DEBUG')
+        self.assertNotIn('filters', config['handlers']['h2'])
+
+    def test_invalid_value(self):
+        result = self.validation.apply_patch([
+            {'op': 'add', 'path': '/loggers/l0/handlers/0', 'value': 10}])
+        self.assertFalse(result)
+        self.assertIn('Config Error at /loggers/l0/handlers/0 : '
+                      'value must be string.', result.get_all_errors())
+
+    def test_move_and_copy(self):
+        result = self.validation.apply_patch([
+            {'op': 'copy', 'from': '/handlers/h0', 'path': '/handlers/h3'},
+            {'op': 'move', 'from': '/handlers/h1', 'path': '/loggers/l3'},
+        ])
+        config = self.validation.config
+        self.assertIn('h3', config['handlers'])
+        self.assertIsNot(config['handlers']['h3'], config['handlers']['h0'])
+        self.assertNotIn('h1', config['handlers'])
+        self.assertIn('Config Error at /loggers/l3 : '
+                      "unknown key(s): ['class', 'formatter'].",
+                      result.get_all_errors())
+
+    def test_failed_test_operation(self):
+        self.assertRaises(ValueError, self.validation.apply_patch, [
+            {'op': 'replace', 'path': '/root/level', 'value': 1},
+            {'op': 'test', 'path': '/version', 'value': 2},
+            {'op': 'remove', 'path': '/root'},
+        ])
+        # operations before the failed test are applied and validated
+        self.assertEqual(self.validation.config['root'], {'level': 1})
+        self.assertFalse(self.validation.is_valid())
+
+    def test_bad_operations(self):
+        for operation in ({'op': 'remove', 'path': '/no/such/value'},
+                          {'op': 'unknown', 'path': '/root'},
+                          {'op': 'move', 'from': '/root',
+                           'path': '/root/level/x'}):
+            self.assertRaises(ValueError, self.validation.apply_patch,
+                              [operation])
+        self.assertTrue(self.validation.is_valid())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from ..opcode_builder import OpcodeRulesBuilder, OpcodeSchema
+from .. import opcode_builder
+from ..compiled_builder import CompiledRulesBuilder
+from ..compiled_director import CompiledRulesDirector
+from ..logging_schema import logging_schema
+from .test_compiled_director import SCHEMA_CASES
+
+
+class OpcodeRulesBuilderTest(unittest.TestCase):
+
+    def test_product(self):
+        director = CompiledRulesDirector(logging_schema, OpcodeRulesBuilder())
+        schema = director.compile_schema()
+        self.assertIsInstance(schema, OpcodeSchema)
+        self.assertIsInstance(schema.program, tuple)
+        self.assertEqual(schema.program[0][0], opcode_builder.OP_DICT)
+        for instruction in schema.program:
+            self.assertIsInstance(instruction, tuple)
+
+    def test_program(self):
+        schema = {
+            'type': 'list',
+            'min_length': 1,
+            'allowed': [{'type': 'integer'}, {'type': 'boolean'}]
+        }
+        program = CompiledRulesDirector(
+            schema, OpcodeRulesBuilder()).compile_schema().program
+        self.assertEqual(program, (
+            (opcode_builder.OP_LIST, 1, None, 1),
+            (opcode_builder.OP_META, (2, 3), {
+                int: (2,), bool: (3,),
+                str: (), unicode: (), list: (), dict: ()}, None),
+            (opcode_builder.OP_INTEGER,),
+            (opcode_builder.OP_BOOLEAN,),
+        ))
+
+    def test_clean(self):
+        builder = OpcodeRulesBuilder()
+        builder.build_integer(None)
+        self.assertIsNotNone(builder.get_product())
+        builder.clean()
+        self.assertIsNone(builder.get_product())
+
+    def test_same_results_as_compiled_rules(self):
+        for schema, value in SCHEMA_CASES:
+            expected = CompiledRulesDirector(
+                schema, CompiledRulesBuilder()).validate(value)
+            result = CompiledRulesDirector(
+                schema, OpcodeRulesBuilder()).validate(value)
+            self.assertEqual(result.is_valid, expected.is_valid)
+            self.assertEqual(result.errors, expected.errors)
+
+    def test_is_valid(self):
+        for schema, value in SCHEMA_CASES:
+            expected = CompiledRulesDirector(
+                schema, CompiledRulesBuilder()).validate(value)
+            director = CompiledRulesDirector(schema, OpcodeRulesBuilder())
+            self.assertEqual(director.is_valid(value), expected.is_valid)
+
+    def test_nested_alternatives(self):
+        schema = [
+            {'type': 'list', 'allowed': [{'type': 'integer'},
+                                         {'type': 'boolean'}]},
+            {'type': 'dictionary', 'strict_keys_set': False,
+             'allowed': [{'type': 'string'}, {'type': 'list'}]},
+        ]
+        for value in ([1, True], {'a': 'b', 'c': []}, [1, 'a'],
+                      {'a': 1}, None):
+            expected = CompiledRulesDirector(
+                schema, CompiledRulesBuilder()).validate(value)
+            result = CompiledRulesDirector(
+                schema, OpcodeRulesBuilder()).validate(value)
+            self.assertEqual(result.is_valid, expected.is_valid)
+            self.assertEqual(result.errors, expected.errors)
+            self.assertEqual(CompiledRulesDirector(
+                schema, OpcodeRulesBuilder()).is_valid(value),
+                expected.is_valid)
+
+    def test_long_list(self):
+        schema = {'type': 'list', 'allowed': {'type': 'list'}}
+        director = CompiledRulesDirector(schema, OpcodeRulesBuilder())
+        self.assertTrue(director.validate([[]] * 10000))
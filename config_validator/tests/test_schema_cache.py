@@ -0,0 +1,218 @@
+import copy
+import cPickle
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import schema_cache
+from ..schema_cache import SchemaCache, DiskSchemaCache, schema_fingerprint
+from ..codegen_builder import CodegenRulesBuilder
+from ..compiled_rules import RulesTreeSchema
+from ..compiled_builder import CompiledRulesBuilder
+from ..compiled_director import CompiledRulesDirector
+from ..compiled_director_handlers import SimpleRuleCompileHandler
+from ..opcode_builder import OpcodeRulesBuilder
+from ..logging_schema import logging_schema
+
+
+class SchemaFingerprintTest(unittest.TestCase):
+
+    def test_equal_schemes(self):
+        self.assertEqual(schema_fingerprint(logging_schema),
+                         schema_fingerprint(copy.deepcopy(logging_schema)))
+
+    def test_keys_order(self):
+        first = {'type': 'dictionary', 'mandatory': {'a': {'type': 'integer'},
+                                                     'b': {'type': 'string'}}}
+        second = {'mandatory': {'b': {'type': 'string'},
+                                'a': {'type': 'integer'}},
+                  'type': 'dictionary'}
+        self.assertEqual(schema_fingerprint(first), schema_fingerprint(second))
+
+    def test_different_schemes(self):
+        fingerprints = set(schema_fingerprint(scheme) for scheme in (
+            {'type': 'integer'},
+            {'type': 'boolean'},
+            [{'type': 'integer'}],
+            [{'type': 'integer'}, {'type': 'boolean'}],
+            [{'type': 'boolean'}, {'type': 'integer'}],
+            {'type': 'list', 'min_length': 1},
+            {'type': 'list', 'min_length': True},
+            {'type': 'list', 'min_length': '1'},
+        ))
+        self.assertEqual(len(fingerprints), 8)
+
+
+class SchemaCacheTest(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = SchemaCache()
+        self.assertIsNone(cache.get(('a',)))
+        cache.put(('a',), 'schema a')
+        self.assertEqual(cache.get(('a',)), 'schema a')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = SchemaCache(max_size=2)
+        cache.put(('a',), 'schema a')
+        cache.put(('b',), 'schema b')
+        cache.get(('a',))
+        cache.put(('c',), 'schema c')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(('b',)))
+        self.assertEqual(cache.get(('a',)), 'schema a')
+        self.assertEqual(cache.get(('c',)), 'schema c')
+
+    def test_invalidate(self):
+        cache = SchemaCache()
+        fingerprint = schema_fingerprint(logging_schema)
+        cache.put((fingerprint, 1), 'schema 1')
+        cache.put((fingerprint, 2), 'schema 2')
+        cache.put(('other', 1), 'other schema')
+        cache.invalidate(logging_schema)
+        self.assertEqual(len(cache), 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+
+class IntegerAsStringCompileHandler(SimpleRuleCompileHandler):
+
+    simple_rule_types = ('integer',)
+
+    def build_rule(self, message):
+        return self.builder.build_string(message['parent_rule_id'],
+                                         message['slot']), []
+
+
+class DirectorSchemaCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SchemaCache()
+        CompiledRulesDirector.schema_cache = self.cache
+
+    def tearDown(self):
+        del CompiledRulesDirector.schema_cache
+
+    def test_compile_once(self):
+        schemas = set()
+        for i in range(1000):
+            director = CompiledRulesDirector(logging_schema,
+                                             CompiledRulesBuilder())
+            schemas.add(id(director.compile_schema()))
+        self.assertEqual(len(schemas), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (999, 1))
+
+    def test_builder_type_in_key(self):
+        tree_schema = CompiledRulesDirector(
+            logging_schema, CompiledRulesBuilder()).compile_schema()
+        opcode_schema = CompiledRulesDirector(
+            logging_schema, OpcodeRulesBuilder()).compile_schema()
+        self.assertIsNot(tree_schema, opcode_schema)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_handlers_in_key(self):
+        plain = CompiledRulesDirector({'type': 'integer'},
+                                      CompiledRulesBuilder())
+        self.assertTrue(plain.is_valid(5))
+        director = CompiledRulesDirector({'type': 'integer'},
+                                         CompiledRulesBuilder())
+        director.push_handler(IntegerAsStringCompileHandler(
+            director._builder))
+        self.assertIsNot(director.compile_schema(), plain.compile_schema())
+        self.assertIsNone(director.validate('5').get_all_errors())
+        self.assertEqual(len(self.cache), 2)
+
+    def test_without_cache(self):
+        CompiledRulesDirector.schema_cache = None
+        first = CompiledRulesDirector(logging_schema, CompiledRulesBuilder())
+        second = CompiledRulesDirector(logging_schema, CompiledRulesBuilder())
+        self.assertIsNot(first.compile_schema(), second.compile_schema())
+
+
+class DiskSchemaCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.disk_cache = DiskSchemaCache(os.path.join(self.directory,
+                                                       'cache'))
+        CompiledRulesDirector.schema_cache = None
+        CompiledRulesDirector.persistent_schema_cache = self.disk_cache
+
+    def tearDown(self):
+        del CompiledRulesDirector.schema_cache
+        del CompiledRulesDirector.persistent_schema_cache
+        shutil.rmtree(self.directory)
+
+    def compile(self, builder_class=CompiledRulesBuilder):
+        return CompiledRulesDirector(logging_schema,
+                                     builder_class()).compile_schema()
+
+    def test_load_compiled_schemas(self):
+        value = {'version': 1, 'root': {'level': ''}}
+        for builder_class in (CompiledRulesBuilder, CodegenRulesBuilder,
+                              OpcodeRulesBuilder):
+            compiled_schema = self.compile(builder_class)
+            loaded_schema = self.compile(builder_class)
+            self.assertIsNot(compiled_schema, loaded_schema)
+            self.assertIs(type(compiled_schema), type(loaded_schema))
+            self.assertEqual(loaded_schema.validate(value).errors,
+                             compiled_schema.validate(value).errors)
+        self.assertEqual(self.disk_cache.hits, 3)
+        self.assertEqual(self.disk_cache.misses, 3)
+
+    def test_stale_entry(self):
+        self.compile()
+        key_file = os.listdir(self.disk_cache.directory)[0]
+        with open(os.path.join(self.disk_cache.directory, key_file),
+                  'wb') as schema_file:
+            cPickle.dump({'version': 'old'}, schema_file)
+            cPickle.dump('old schema', schema_file)
+
+        self.assertIsInstance(self.compile(), RulesTreeSchema)
+        self.assertEqual(self.disk_cache.misses, 2)
+        self.assertIsInstance(self.compile(), RulesTreeSchema)
+        self.assertEqual(self.disk_cache.hits, 1)
+
+    def test_changed_sources(self):
+        self.compile()
+        sources_digest = schema_cache._sources_digest
+        schema_cache._sources_digest = 'digest of changed sources'
+        try:
+            self.compile()
+        finally:
+            schema_cache._sources_digest = sources_digest
+        self.assertEqual(self.disk_cache.misses, 2)
+        self.compile()
+        self.assertEqual(self.disk_cache.misses, 3)
+
+    def test_broken_entry(self):
+        self.compile()
+        key_file = os.listdir(self.disk_cache.directory)[0]
+        with open(os.path.join(self.disk_cache.directory, key_file),
+                  'wb') as schema_file:
+            schema_file.write('broken')
+
+        self.assertIsInstance(self.compile(), RulesTreeSchema)
+        self.assertEqual(self.disk_cache.misses, 2)
+
+    def test_unwritable_directory(self):
+        file_name = os.path.join(self.directory, 'file')
+        open(file_name, 'w').close()
+        CompiledRulesDirector.persistent_schema_cache = DiskSchemaCache(
+            os.path.join(file_name, 'cache'))
+        director = CompiledRulesDirector(logging_schema,
+                                         CompiledRulesBuilder())
+        self.assertTrue(director.is_valid({'version': 1}))
+
+    def test_unpicklable_schema(self):
+        self.assertFalse(self.disk_cache.put(('fingerprint',), lambda: 1))
+        self.assertEqual(os.listdir(self.disk_cache.directory), [])
+
+    def test_invalidate(self):
+        self.compile()
+        self.compile(OpcodeRulesBuilder)
+        self.disk_cache.invalidate({'type': 'integer'})
+        self.assertEqual(len(os.listdir(self.disk_cache.directory)), 2)
+        self.disk_cache.invalidate(logging_schema)
+        self.assertEqual(os.listdir(self.disk_cache.directory), [])
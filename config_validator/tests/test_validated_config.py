@@ -0,0 +1,151 @@
+import copy
+import unittest
+
+from ..basic_builder import BasicRulesBuilder
+from ..basic_director import BasicRulesDirector
+from ..logging_schema import logging_schema
+from ..validated_config import (ConfigDict, ConfigList, InvalidConfig,
+                                unwrap, validated_config)
+from .test_incremental import LOGGING_CONFIG
+
+
+SERVERS_SCHEMA = {
+    'type': 'dictionary',
+    'mandatory': {
+        'name': {'type': 'not_empty_string'},
+        'servers': {'type': 'list', 'min_length': 1, 'max_length': 3,
+                    'allowed': {'type': 'dictionary',
+                                'mandatory': {'host': {'type': 'string'}},
+                                'optional': {'port': {'type': 'integer'}}}},
+    },
+    'optional': {'debug': {'type': 'boolean'}},
+}
+
+
+class ValidatedConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.raw_config = {'name': 'app',
+                           'servers': [{'host': 'a', 'port': 1}]}
+        self.config = validated_config(
+            BasicRulesDirector(SERVERS_SCHEMA, BasicRulesBuilder()),
+            self.raw_config)
+
+    def assertInvalid(self, change, *args):
+        before = copy.deepcopy(self.raw_config)
+        self.assertRaises(InvalidConfig, change, *args)
+        self.assertEqual(self.raw_config, before)
+
+    def test_invalid_config(self):
+        with self.assertRaises(InvalidConfig) as context:
+            validated_config(
+                BasicRulesDirector(SERVERS_SCHEMA, BasicRulesBuilder()),
+                {'name': ''})
+        self.assertIn("Config Error at / : missing key(s): ['servers'].",
+                      context.exception.errors)
+        self.assertIsInstance(context.exception, ValueError)
+
+    def test_not_container(self):
+        self.assertRaises(
+            TypeError, validated_config,
+            BasicRulesDirector({'type': 'integer'}, BasicRulesBuilder()), 1)
+
+    def test_proxies(self):
+        self.assertIsInstance(self.config, ConfigDict)
+        self.assertIsInstance(self.config['servers'], ConfigList)
+        self.assertIsInstance(self.config['servers'][0], ConfigDict)
+        self.assertEqual(self.config['servers'][-1]['host'], 'a')
+        self.assertEqual(self.config, self.raw_config)
+        self.assertIs(unwrap(self.config['servers']),
+                      self.raw_config['servers'])
+        self.assertEqual(len(self.config), 2)
+        self.assertIn({'host': 'a', 'port': 1}, self.config['servers'])
+
+    def test_set_value(self):
+        self.config['debug'] = True
+        self.config['servers'][0]['port'] = 2
+        self.assertEqual(self.raw_config,
+                         {'name': 'app', 'debug': True,
+                          'servers': [{'host': 'a', 'port': 2}]})
+        self.assertInvalid(self.config.__setitem__, 'debug', 1)
+        self.assertInvalid(self.config['servers'][0].__setitem__,
+                           'port', 'x')
+        self.assertInvalid(self.config['servers'].__setitem__, 0, {})
+
+    def test_strict_keys(self):
+        self.assertInvalid(self.config.__setitem__, 'unknown', 1)
+
+    def test_mandatory_keys(self):
+        self.assertInvalid(self.config.__delitem__, 'name')
+        self.assertInvalid(self.config['servers'][0].pop, 'host')
+        self.assertEqual(self.config['servers'][0].pop('port'), 1)
+        self.assertEqual(self.config['servers'][0].pop('port', None), None)
+
+    def test_setdefault(self):
+        server = self.config['servers'][0]
+        self.assertEqual(server.setdefault('port', 2), 1)
+        del server['port']
+        self.assertEqual(server.setdefault('port', 2), 2)
+        self.assertEqual(self.raw_config['servers'][0]['port'], 2)
+        self.assertInvalid(server.setdefault, 'unknown', 1)
+
+    def test_list_length(self):
+        servers = self.config['servers']
+        servers.append({'host': 'b'})
+        servers.insert(0, {'host': 'c'})
+        self.assertEqual([server['host'] for server in servers],
+                         ['c', 'a', 'b'])
+        self.assertInvalid(servers.append, {'host': 'd'})
+        self.assertInvalid(servers.append, {'port': 1})
+        self.assertEqual(servers.pop(), {'host': 'b'})
+        del servers[0]
+        self.assertInvalid(servers.pop)
+        self.assertEqual(self.raw_config['servers'],
+                         [{'host': 'a', 'port': 1}])
+
+    def test_assigned_values_are_copied(self):
+        server = {'host': 'b'}
+        self.config['servers'][0] = server
+        server['host'] = 1
+        self.assertEqual(self.raw_config['servers'], [{'host': 'b'}])
+        self.config['servers'][0] = self.config['servers'][0]
+        self.assertEqual(self.raw_config['servers'], [{'host': 'b'}])
+
+    def test_detached_proxy(self):
+        server = self.config['servers'][0]
+        self.config['servers'][0] = {'host': 'b'}
+        self.assertRaises(ValueError, server.__setitem__, 'port', 2)
+        self.assertEqual(self.raw_config['servers'], [{'host': 'b'}])
+
+    def test_slices(self):
+        self.assertRaises(TypeError, self.config['servers'].__getitem__,
+                          slice(0, 1))
+
+    def test_logging_config(self):
+        config = validated_config(
+            BasicRulesDirector(logging_schema, BasicRulesBuilder()),
+            copy.deepcopy(LOGGING_CONFIG))
+        config['handlers']['h3'] = {'class': 'logging.NullHandler'}
+        config['loggers']['l0']['handlers'].append('h3')
+        with self.assertRaises(InvalidConfig) as context:
+            config['handlers']['h3']['level'] = 1
+        self.assertIn('Config Error at /handlers/h3(alt.#1)/level : '
+                      'value must be string.', context.exception.errors)
+        self.assertEqual(unwrap(config['handlers']['h3']),
+                         {'class': 'logging.NullHandler'})
+
+    def test_setdefault_returns_assigned_copy(self):
+        raw_config = copy.deepcopy(LOGGING_CONFIG)
+        config = validated_config(
+            BasicRulesDirector(logging_schema, BasicRulesBuilder()),
+            raw_config)
+        filters = ['a']
+        stored = config['loggers']['l0'].setdefault('filters', filters)
+        self.assertIsInstance(stored, ConfigList)
+        stored.append('b')
+        self.assertEqual(filters, ['a'])
+        self.assertEqual(raw_config['loggers']['l0']['filters'], ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..compiled_builder import CompiledRulesBuilder
+from ..compiled_director import CompiledRulesDirector
+from ..watch import ConfigWatcher, _require_yaml
+
+
+SCHEMA = {'type': 'dictionary',
+          'mandatory': {'name': {'type': 'string'}},
+          'optional': {'port': {'type': 'integer'}}}
+
+
+class ConfigWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json')
+        self.mtime = 1000000
+        self.write({'name': 'app'})
+        self.director = CompiledRulesDirector(SCHEMA, CompiledRulesBuilder())
+        self.watcher = ConfigWatcher([self.path], self.director,
+                                     load=json.loads, debounce=1.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, config, path=None):
+        path = path or self.path
+        with open(path, 'w') as config_file:
+            config_file.write(json.dumps(config))
+        # mtime of file system may be too coarse for fast writes
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+
+    def test_first_poll(self):
+        events = self.watcher.poll(now=0)
+        self.assertEqual(len(events), 1)
+        event = events[0]
+        self.assertEqual(event.path, self.path)
+        self.assertTrue(event.is_valid())
+        self.assertIsNone(event.get_all_errors())
+        self.assertEqual(self.watcher.poll(now=10), [])
+
+    def test_changed_file(self):
+        self.watcher.poll(now=0)
+        self.write({'name': 1})
+        self.assertEqual(self.watcher.poll(now=10), [])
+        events = self.watcher.poll(now=11)
+        self.assertEqual(len(events), 1)
+        self.assertFalse(events[0].is_valid())
+        self.assertIn('Config Error at /name : value must be string.',
+                      events[0].get_all_errors())
+        self.assertEqual(self.watcher.poll(now=20), [])
+
+    def test_burst_of_writes(self):
+        self.watcher.poll(now=0)
+        for port in range(5):
+            self.write({'name': 'app', 'port': port})
+            self.assertEqual(self.watcher.poll(now=10 + port * 0.5), [])
+        events = self.watcher.poll(now=13)
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].is_valid())
+
+    def test_same_content(self):
+        first_event, = self.watcher.poll(now=0)
+        self.write({'name': 'app'})
+        self.assertEqual(self.watcher.poll(now=10), [])
+        self.assertEqual(self.watcher.poll(now=20), [])
+        self.write({'name': 'other'})
+        self.watcher.poll(now=30)
+        event, = self.watcher.poll(now=40)
+        self.assertNotEqual(event.digest, first_event.digest)
+
+    def test_replaced_file(self):
+        self.watcher.poll(now=0)
+        new_path = os.path.join(self.directory, 'new.json')
+        self.write({'port': 1}, new_path)
+        os.rename(new_path, self.path)
+        self.watcher.poll(now=10)
+        event, = self.watcher.poll(now=20)
+        self.assertFalse(event.is_valid())
+
+    def test_missing_and_bad_file(self):
+        self.watcher.poll(now=0)
+        os.remove(self.path)
+        self.watcher.poll(now=10)
+        event, = self.watcher.poll(now=20)
+        self.assertIsNone(event.result)
+        self.assertFalse(event.is_valid())
+        self.assertEqual(len(event.get_all_errors()), 1)
+
+        with open(self.path, 'w') as config_file:
+            config_file.write('{')
+        self.watcher.poll(now=30)
+        event, = self.watcher.poll(now=40)
+        self.assertIsNone(event.result)
+        self.assertIn('can not load config', event.error)
+
+    def test_default_loader(self):
+        try:
+            _require_yaml()
+        except ImportError:
+            self.assertRaises(ImportError, ConfigWatcher, [self.path],
+                              self.director)
+        else:
+            # JSON is YAML too
+            event, = ConfigWatcher([self.path], self.director).poll(now=0)
+            self.assertTrue(event.is_valid())
+
+    def test_import_error_of_loader(self):
+        def load(data):
+            raise ImportError('No module named toml')
+
+        watcher = ConfigWatcher([self.path], self.director, load=load)
+        self.assertRaises(ImportError, watcher.poll, 0)
+
+    def test_schema_is_compiled_once(self):
+        schema = self.director.compile_schema()
+        watcher = ConfigWatcher([self.path], schema, load=json.loads)
+        self.assertIs(watcher._schema, schema)
+        self.assertIs(self.watcher._schema, schema)
+
+    def test_watch(self):
+        events = list(ConfigWatcher([self.path], self.director,
+                                    load=json.loads,
+                                    interval=0).watch(max_polls=2))
+        self.assertEqual(len(events), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+# A program may change its config at runtime, and a change may break
+# the config, that was validated at start. Validating the whole config after
+# each change is too slow for large configs, and validating it later reports
+# the error far from the code, that made it.
+# Here we introduce proxies of config dictionaries and lists, that check each
+# change as it happens: the change is validated incrementally (see
+# 'incremental'), so keys of the changed dictionary are checked by its
+# DictNode and length of the changed list by its ListNode, and nested rules
+# are built only for the new value. An invalid change is undone and raises
+# InvalidConfig, so the config behind proxies is always valid.
+
+import collections
+import copy
+
+from incremental import IncrementalValidation
+
+
+class InvalidConfig(ValueError):
+    """The config (or the config after a change) is not valid. 'errors' are
+    error messages of the invalid config."""
+
+    def __init__(self, errors):
+        super(InvalidConfig, self).__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def validated_config(director, config):
+    """Returns the proxy of the config dictionary or list, that validates
+    changes of the config. The director should build basic rules trees, like
+    BasicRulesDirector. Raises InvalidConfig, if the config is not valid."""
+    if not isinstance(config, (dict, list)):
+        raise TypeError('Config should be a dictionary or a list, got %r.'
+                        % (config,))
+    validation = IncrementalValidation(director, config)
+    if not validation.is_valid():
+        raise InvalidConfig(validation.get_all_errors())
+    return _proxy(validation, (), config)
+
+
+def unwrap(value):
+    """Returns the config value behind the proxy. Other values are returned
+    as is."""
+    if isinstance(value, _ConfigProxy):
+        return value._value
+    return value
+
+
+def _proxy(validation, keys, value):
+    if isinstance(value, dict):
+        return ConfigDict(validation, keys, value)
+    if isinstance(value, list):
+        return ConfigList(validation, keys, value)
+    return value
+
+
+class _ConfigProxy(object):
+    """Base class of proxies: keeps the validation of the whole config and
+    keys of the proxied value in it."""
+
+    __slots__ = ('_validation', '_keys', '_value')
+
+    __hash__ = None
+
+    def __init__(self, validation, keys, value):
+        self._validation = validation
+        self._keys = keys
+        self._value = value
+
+    def __len__(self):
+        return len(self._value)
+
+    def __eq__(self, other):
+        return self._value == unwrap(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self._value)
+
+    def _nested(self, key):
+        return _proxy(self._validation, self._keys + (key,),
+                      self._value[key])
+
+    def _change(self, key, change, undo):
+        """Changes the value and validates the change: the nested value at
+        the key is changed (or added, or removed) by 'change()'. If the
+        config becomes invalid, 'undo()' restores the value and
+        InvalidConfig is raised."""
+        validation = self._validation
+        if validation._get(self._keys) is not self._value:
+            raise ValueError('The value is not in the config any more: %r.'
+                             % (list(self._keys),))
+        keys = [self._keys + (key,)]
+        change()
+        try:
+            result = validation.update(keys)
+        except Exception:
+            undo()
+            validation.update(keys)
+            raise
+        if not result:
+            errors = result.get_all_errors()
+            undo()
+            validation.update(keys)
+            raise InvalidConfig(errors)
+
+
+class ConfigDict(_ConfigProxy, collections.MutableMapping):
+    """Proxy of config dictionary. Nested dictionaries and lists are returned
+    as proxies too. Assigned values are copied, so they can not be changed
+    bypassing the proxies."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return self._nested(key)
+
+    def __iter__(self):
+        return iter(self._value)
+
+    def __contains__(self, key):
+        return key in self._value
+
+    def __setitem__(self, key, value):
+        container = self._value
+        value = copy.deepcopy(unwrap(value))
+        if key in container:
+            old_value = container[key]
+            undo = lambda: container.__setitem__(key, old_value)
+        else:
+            undo = lambda: container.__delitem__(key)
+        self._change(key, lambda: container.__setitem__(key, value), undo)
+
+    def __delitem__(self, key):
+        container = self._value
+        old_value = container[key]
+        self._change(key, lambda: container.__delitem__(key),
+                     lambda: container.__setitem__(key, old_value))
+
+    def pop(self, key, *default):
+        """Removes the key and returns its value (not a proxy)."""
+        if key not in self._value and default:
+            return default[0]
+        value = self._value[key]
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        """Assigns the default, if there is no key, and returns the value
+        at the key (a proxy of the assigned copy, not the default)."""
+        if key not in self._value:
+            self[key] = default
+        return self[key]
+
+
+class ConfigList(_ConfigProxy, collections.MutableSequence):
+    """Proxy of config list, like ConfigDict. Items are appended and
+    the last item is removed with the new (or removed) item only, other
+    insertions and deletions validate the whole list again, because
+    indexes of the rest of items are changed. Slices are not supported."""
+
+    __slots__ = ()
+
+    def _index(self, index, length):
+        if isinstance(index, slice):
+            raise TypeError('Slices of config lists are not supported.')
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('list index out of range')
+        return index
+
+    def __getitem__(self, index):
+        return self._nested(self._index(index, len(self._value)))
+
+    def __contains__(self, value):
+        return unwrap(value) in self._value
+
+    def __setitem__(self, index, value):
+        container = self._value
+        index = self._index(index, len(container))
+        value = copy.deepcopy(unwrap(value))
+        old_value = container[index]
+        self._change(index, lambda: container.__setitem__(index, value),
+                     lambda: container.__setitem__(index, old_value))
+
+    def __delitem__(self, index):
+        container = self._value
+        index = self._index(index, len(container))
+        old_value = container[index]
+        self._change(index, lambda: container.__delitem__(index),
+                     lambda: container.insert(index, old_value))
+
+    def insert(self, index, value):
+        container = self._value
+        length = len(container)
+        if index < 0:
+            index = max(index + length, 0)
+        index = min(index, length)
+        value = copy.deepcopy(unwrap(value))
+        self._change(index, lambda: container.insert(index, value),
+                     lambda: container.__delitem__(index))
+
+    def pop(self, index=-1):
+        """Removes the item and returns it (not a proxy)."""
+        value = self._value[self._index(index, len(self._value))]
+        del self[index]
+        return value
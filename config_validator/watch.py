@@ -0,0 +1,169 @@
+# A sidecar may check config files each time deployment tooling rewrites
+# them. Starting a new interpreter for each check costs more than the check
+# itself, so here we introduce the watcher: it keeps the compiled schema,
+# polls stats of config files (modification time, size and inode, so files
+# replaced by rename are noticed too) and validates a file again, when its
+# writes are settled for a while and hash of its content is changed.
+# Each validation is reported as a WatchEvent.
+
+import hashlib
+import os
+import time
+
+
+# Stat and digest of files, that are not polled yet.
+_NOT_POLLED = object()
+
+
+def _require_yaml():
+    """Returns the PyYAML module. It is imported only when it is used,
+    raises ImportError if it is not installed."""
+    import yaml
+    return yaml
+
+
+def load_yaml(data):
+    """Loads the config from text of YAML file."""
+    return _require_yaml().safe_load(data)
+
+
+def _file_stat(path):
+    """Returns the stat of file, that tells whether it is changed, or None
+    if there is no file."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size, stat.st_dev, stat.st_ino)
+
+
+class WatchEvent(object):
+    """Result of validation of a changed config file. 'result' is
+    ValidationResult of the config or None, if the file could not be read
+    or loaded, then 'error' is the reason."""
+
+    __slots__ = ('path', 'digest', 'result', 'error')
+
+    def __init__(self, path, digest, result=None, error=None):
+        self.path = path
+        self.digest = digest
+        self.result = result
+        self.error = error
+
+    def is_valid(self):
+        return self.result is not None and bool(self.result)
+
+    def get_all_errors(self):
+        """Returns error messages of the config or None, like
+        'ValidationResult.get_all_errors()'. Errors of reading or loading
+        of the file are returned as the only message."""
+        if self.result is None:
+            return ['Config Error at %s : %s' % (self.path, self.error)]
+        return self.result.get_all_errors()
+
+    def get_all_error_records(self):
+        if self.result is None:
+            return None
+        return self.result.get_all_error_records()
+
+    def __repr__(self):
+        return 'WatchEvent(%r, valid=%r)' % (self.path, self.is_valid())
+
+
+class ConfigWatcher(object):
+    """Validates config files again, when they are changed.
+    'schema' is a compiled schema, or a director with 'compile_schema()'
+    (like CompiledRulesDirector), the schema is compiled once. 'load'
+    makes the config of file content, YAML by default. A file is validated,
+    when its stat is not changed for 'debounce' seconds, so a burst of
+    writes is validated once; files are polled every 'interval' seconds by
+    'watch()'. 'max_errors' is passed to 'validate()' of the schema.
+    Raises ImportError, if PyYAML is not installed and 'load' is not
+    given."""
+
+    def __init__(self, paths, schema, load=load_yaml, interval=1.0,
+                 debounce=0.5, max_errors=None):
+        if load is load_yaml:
+            # fail now, not with an error event for each file
+            _require_yaml()
+        if hasattr(schema, 'compile_schema'):
+            schema = schema.compile_schema()
+        self._schema = schema
+        self._load = load
+        self.interval = interval
+        self.debounce = debounce
+        self.max_errors = max_errors
+        # path -> [stat, time of the last change of stat or None, if
+        # the file is validated since then, digest of validated content]
+        self._files = dict(
+            (path, [_NOT_POLLED, float('-inf'), _NOT_POLLED])
+            for path in paths)
+
+    @property
+    def paths(self):
+        return sorted(self._files)
+
+    def poll(self, now=None):
+        """Checks the files once. Returns WatchEvents of the files, that are
+        changed and settled since the last validation."""
+        if now is None:
+            now = time.time()
+        events = []
+        for path in sorted(self._files):
+            state = self._files[path]
+            stat = _file_stat(path)
+            if stat != state[0]:
+                if state[0] is not _NOT_POLLED:
+                    state[1] = now
+                state[0] = stat
+            if state[1] is None or now - state[1] < self.debounce:
+                continue
+            event = self._check(path, state, stat)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def watch(self, max_polls=None):
+        """Polls the files every 'interval' seconds and yields WatchEvents
+        of changed files. The first poll validates all of the files."""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            if polls:
+                time.sleep(self.interval)
+            for event in self.poll():
+                yield event
+            polls += 1
+
+    def _check(self, path, state, stat):
+        """Validates the settled file, if its content is changed."""
+        if stat is None:
+            data = None
+            digest = None
+        else:
+            try:
+                with open(path, 'rb') as config_file:
+                    data = config_file.read()
+            except (IOError, OSError):
+                # removed after the stat
+                return None
+            if _file_stat(path) != stat:
+                # the file is written again, wait for the next poll
+                return None
+            digest = hashlib.sha1(data).hexdigest()
+        state[1] = None
+        if digest == state[2]:
+            return None
+        state[2] = digest
+
+        if data is None:
+            return WatchEvent(path, None, error='file is not found.')
+        try:
+            config = self._load(data)
+        except ImportError:
+            # the loader is broken, not the file
+            raise
+        except Exception as error:
+            return WatchEvent(path, digest,
+                              error='can not load config: %s' % (error,))
+        result = self._schema.validate(config, self.max_errors)
+        return WatchEvent(path, digest, result)